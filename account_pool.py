@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+from metrics import ACCOUNT_GENERATIONS
+from rate_limiter import CircuitBreaker
+
+
+class AccountPool:
+    """
+    In-memory view of the saved Suno accounts file. The file is re-read only
+    when its modification time or size changes, and writes are atomic.
+
+    The pool also routes generations across accounts: `choose()` picks the
+    account with the most rate-limit headroom, breaking ties by remaining
+    credits, and skips accounts whose circuit breaker is open or whose known
+    credits are below `min_credits`. Each choice reserves one unit of the
+    account's headroom until `record()` reports the outcome, so concurrent
+    workers spread out instead of all picking the same account. `record()`
+    also keeps per-account throughput statistics for `stats()`.
+    """
+
+    def __init__(self, path, limiter_for=None, credits_for=None, min_credits=0, window=300.0):
+        self.path = path
+        self.limiter_for = limiter_for  # api_key -> rate_limiter.KeyLimiter
+        self.credits_for = credits_for  # api_key -> remaining credits (may raise)
+        self.min_credits = min_credits
+        self.window = window  # Seconds of history used for throughput
+        self._accounts = {}
+        self._signature = None
+        self._lock = threading.Lock()
+        self._history = {}  # name -> deque of (timestamp, ok)
+        self._totals = {}  # name -> {'submitted': n, 'failed': n}
+        self._reserved = {}  # name -> generations chosen but not yet recorded
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def accounts(self):
+        """Returns a copy of the saved accounts, reloading the file only if it changed."""
+        signature = self._file_signature()
+        with self._lock:
+            if signature != self._signature:
+                self._accounts = self._read() if signature else {}
+                self._signature = signature
+            return json.loads(json.dumps(self._accounts))
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                accounts = json.load(f)
+            return accounts if isinstance(accounts, dict) else {}
+        except (IOError, json.JSONDecodeError):
+            return {}
+
+    def save(self, accounts):
+        """Writes the accounts file atomically and updates the in-memory copy."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(prefix='.accounts-', suffix='.json', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(accounts, f, indent=4)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._accounts = json.loads(json.dumps(accounts))
+            self._signature = self._file_signature()
+
+    def _headroom(self, api_key):
+        """(whole tokens available, circuit closed) for an account, or optimistic defaults without limiters."""
+        if self.limiter_for is None:
+            return 1, True
+        limiter = self.limiter_for(api_key)
+        return int(limiter.bucket.available()), limiter.breaker.state != CircuitBreaker.OPEN
+
+    def _credits(self, api_key):
+        if self.credits_for is None:
+            return None
+        try:
+            return self.credits_for(api_key)
+        except Exception as e:
+            logging.warning(f"Could not read credits while routing: {e}")
+            return None
+
+    def owns(self, api_key):
+        """Whether an API key belongs to one of the saved accounts."""
+        return bool(api_key) and any(data.get('api_key') == api_key for data in self.accounts().values())
+
+    def candidates(self):
+        """Every usable account as (name, api_key, headroom, credits), best first."""
+        candidates = self._usable()
+        with self._lock:
+            return self._rank(candidates)
+
+    def _usable(self):
+        usable = []
+        for name, data in self.accounts().items():
+            api_key = data.get('api_key')
+            if not api_key:
+                continue
+            headroom, circuit_closed = self._headroom(api_key)
+            if not circuit_closed:
+                continue
+            credits = self._credits(api_key)
+            if credits is not None and credits < self.min_credits:
+                continue
+            usable.append((name, api_key, headroom, credits))
+        return usable
+
+    def _rank(self, candidates):
+        """Sorts candidates best first, net of outstanding reservations (caller holds the lock)."""
+        ranked = [(name, api_key, headroom - self._reserved.get(name, 0), credits)
+                  for name, api_key, headroom, credits in candidates]
+        # Unknown credits rank below any known balance
+        ranked.sort(key=lambda c: (c[2], c[3] if c[3] is not None else -1), reverse=True)
+        return ranked
+
+    def choose(self):
+        """
+        Returns (name, api_key) of the best account for the next generation and
+        reserves its headroom until `record()`. Raises ValueError if none is usable.
+        """
+        candidates = self._usable()  # Credit lookups may call the API, so not under the lock
+        with self._lock:
+            ranked = self._rank(candidates)
+            if not ranked:
+                raise ValueError("No saved Suno account has credits and rate-limit headroom left.")
+            name, api_key, _, _ = ranked[0]
+            self._reserved[name] = self._reserved.get(name, 0) + 1
+        return name, api_key
+
+    def record(self, name, ok):
+        """Records the outcome of a generation submitted with an account and releases its reservation."""
+        now = time.time()
+        with self._lock:
+            if self._reserved.get(name, 0) > 1:
+                self._reserved[name] -= 1
+            else:
+                self._reserved.pop(name, None)
+            history = self._history.setdefault(name, deque())
+            history.append((now, ok))
+            while history and now - history[0][0] > self.window:
+                history.popleft()
+            totals = self._totals.setdefault(name, {'submitted': 0, 'failed': 0})
+            totals['submitted' if ok else 'failed'] += 1
+        ACCOUNT_GENERATIONS.inc(account=name, result='submitted' if ok else 'failed')
+
+    def stats(self):
+        """Per-account totals, recent throughput, rate-limit headroom and circuit state (never the API keys)."""
+        now = time.time()
+        stats = {}
+        for name, data in self.accounts().items():
+            with self._lock:
+                recent = [ok for ts, ok in self._history.get(name, ()) if now - ts <= self.window]
+                totals = dict(self._totals.get(name, {'submitted': 0, 'failed': 0}))
+            entry = dict(totals, default=data.get('default', False),
+                         per_minute=round(sum(recent) * 60.0 / self.window, 2))
+            if self.limiter_for is not None and data.get('api_key'):
+                limiter = self.limiter_for(data['api_key'])
+                entry['rate_limit_headroom'] = round(limiter.bucket.available(), 2)
+                entry['circuit'] = limiter.breaker.state
+            stats[name] = entry
+        return stats
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import threading
+import uuid
+
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a seekable stream and rewinds it."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file on disk."""
+    with open(file_path, 'rb') as f:
+        return hash_stream(f, chunk_size)
+
+
+def analysis_key(content_hash, options):
+    """Builds the deduplication key for an analysis from the audio content and its options."""
+    payload = json.dumps({'content': content_hash, 'options': options}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnalysisJob:
+    """A running analysis whose progress events can be followed by any number of clients."""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.events = []
+        self.done = False
+        self._condition = threading.Condition()
+
+    def publish(self, event):
+        """Appends a progress event and wakes up every attached client."""
+        with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    def finish(self):
+        """Marks the job as finished so attached streams terminate."""
+        with self._condition:
+            self.done = True
+            self._condition.notify_all()
+
+    def stream(self, poll_interval=1.0):
+        """
+        Yields every event published so far, then new events as they arrive,
+        until the job finishes. Late subscribers therefore see the full history.
+        """
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self.events) and not self.done:
+                    self._condition.wait(poll_interval)
+                pending = self.events[index:]
+                index += len(pending)
+                finished = self.done and index >= len(self.events)
+            for event in pending:
+                yield event
+            if finished:
+                return
+
+
+class AnalysisJobRegistry:
+    """
+    Single-flight registry for analyses. The first submission for a key starts
+    the work in a background thread; identical submissions made while it is
+    running attach to the same job instead of starting a new pipeline.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, target, prepare=None):
+        """
+        Returns (job, created). For a new key, `prepare()` runs in the calling
+        thread (e.g. to persist the upload) before `target(job)` is started.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job, False
+            job = AnalysisJob(key)
+            self._jobs[key] = job
+
+        if prepare is not None:
+            try:
+                prepare()
+            except Exception as e:
+                self._discard(job)
+                # Clients that attached in the meantime get the error instead of waiting forever
+                job.publish({'error': f'Error analyzing audio: {str(e)}'})
+                job.finish()
+                raise
+
+        thread = threading.Thread(target=self._run, args=(job, target), daemon=True)
+        thread.start()
+        return job, True
+
+    def get(self, key):
+        """Returns the in-flight job for a key, or None."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def in_flight(self):
+        """Returns the number of analyses currently running."""
+        with self._lock:
+            return len(self._jobs)
+
+    def _run(self, job, target):
+        try:
+            target(job)
+        except Exception as e:
+            logging.error(f"Analysis job {job.id} failed: {e}")
+            job.publish({'error': f'Error analyzing audio: {str(e)}'})
+        finally:
+            self._discard(job)
+            job.finish()
+
+    def _discard(self, job):
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
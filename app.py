@@ -1,16 +1,39 @@
-from flask import Flask, request, jsonify, Response, stream_with_context, render_template, url_for
+from flask import Flask, request, jsonify, Response, stream_with_context, render_template, url_for, g, send_from_directory, send_file
 import json
 from werkzeug.utils import secure_filename
 import os
 import sys
 import traceback
-import torch
-import cpuinfo
+import time
+import hmac
+import hashlib
+import ipaddress
+import socket
 import logging
+import math
 import multiprocessing
+import tempfile
+import queue
+from urllib.parse import urljoin, urlparse
 from audio_analyzer import AudioAnalyzer
 from prompt_generator import PromptGenerator
-from suno_client import SunoClient
+from async_suno_client import AsyncSunoClient
+from suno_client import RATE_LIMITERS, SunoClientPool, SunoRateLimitError, SunoUnavailableError, pooled_session, open_audio_stream
+from generation_poller import GenerationPoller, TrackingLimitError
+from audio_cache import AudioCache, is_valid_clip_id
+from credits_cache import CreditsCache
+from account_pool import AccountPool
+from history_store import FACETS, HistoryStore
+from feature_index import FeatureIndex, feature_vector
+from genre_registry import DuplicateGenreError, GENRE_RULES
+from generation_batches import GenerationBatches, IdempotencyCache, client_idempotency_key, idempotency_key
+from analysis_jobs import AnalysisJobRegistry, analysis_key, hash_stream
+from lazy_imports import lazy_import, preload
+import hardware_profile
+from instrumentation import StageProgress, timed
+from model_cache import ModelCache
+from profiling import profiled, PROFILE_MODES
+import metrics
 import pprint
 
 app = Flask(__name__)
@@ -18,24 +41,30 @@ app = Flask(__name__)
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- Globals ---
-GENRE_RULES = []
-
-def load_genre_rules():
-    """Loads genre rules from the JSON file."""
-    global GENRE_RULES
-    try:
-        with open('genre_rules.json', 'r') as f:
-            GENRE_RULES = json.load(f)
-        logging.info(f"Successfully loaded {len(GENRE_RULES)} genre rules.")
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logging.error(f"Could not load or parse genre_rules.json: {e}")
-        GENRE_RULES = []
-
 # --- Hardware Detection & Model Cache ---
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-MODEL_CACHE = {}
-logging.info(f"Application starting. AI processing device set to: {DEVICE.upper()}")
+# torch is only imported when the device is first needed (or by the background
+# warm-up), so the server can answer requests immediately after start.
+torch = lazy_import('torch')
+DEVICE = None
+MODEL_CACHE = ModelCache()
+ANALYSIS_JOBS = AnalysisJobRegistry()
+metrics.ANALYSIS_JOBS_IN_FLIGHT.set_function(ANALYSIS_JOBS.in_flight)
+
+def get_device():
+    """Returns the AI processing device from the hardware profile, detecting it on first use."""
+    global DEVICE
+    if DEVICE is None:
+        DEVICE = hardware_profile.recommended_settings()['device']
+        hardware_profile.apply_thread_settings()
+        logging.info(f"AI processing device set to: {DEVICE.upper()}")
+    return DEVICE
+
+def warm_up():
+    """Imports the ML stack, profiles the hardware and calibrates default settings in the background."""
+    def _on_preloaded():
+        get_device()
+        hardware_profile.start_calibration(model_cache=MODEL_CACHE)
+    preload(on_complete=_on_preloaded)
 
 import config
 
@@ -45,73 +74,236 @@ app.config['MAX_CONTENT_LENGTH'] = config.MAX_FILE_SIZE
 # Create upload folder if it doesn't exist
 os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """Observes the request latency once the response, including any streamed body, has been sent."""
+    start = g.get('request_start')
+    if start is not None:
+        labels = {
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else 'unmatched',
+            'status': response.status_code
+        }
+        response.call_on_close(
+            lambda: metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, **labels)
+        )
+    return response
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in config.ALLOWED_EXTENSIONS
 
-HISTORY_FILE = os.path.join(os.path.dirname(__file__), 'analysis_history.json')
-GENERATION_HISTORY_FILE = os.path.join(os.path.dirname(__file__), 'generation_history.json')
+# History lives in SQLite; the legacy JSON files are imported once and renamed to *.imported
+HISTORY = HistoryStore(config.HISTORY_DB)
+HISTORY.import_json('analysis', config.HISTORY_FILE)
+HISTORY.import_json('generation', config.GENERATION_HISTORY_FILE)
 
-def read_history(file_path=HISTORY_FILE):
-    """Reads a history file from the given path."""
-    if not os.path.exists(file_path):
-        return []
-    try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    except (IOError, json.JSONDecodeError):
-        return []
+# Feature vectors of saved analyses, picked up from the history on each query
+FEATURE_INDEX = FeatureIndex(lambda after_rowid: HISTORY.feature_rows(after_rowid))
 
-def write_history(data, file_path=HISTORY_FILE):
-    """Writes data to a history file."""
+def history_page(kind):
+    """Returns one page of a history for the request's `cursor` and `limit` query parameters."""
     try:
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4)
-    except IOError:
-        logging.error(f"Could not write to history file: {file_path}")
+        limit = int(request.args.get('limit', config.HISTORY_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer.'}), 400
+    limit = max(1, min(limit, config.HISTORY_MAX_PAGE_SIZE))
+    try:
+        items, next_cursor = HISTORY.page(kind, cursor=request.args.get('cursor'), limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': items, 'next_cursor': next_cursor})
 
 ACCOUNTS_FILE = os.path.join(os.path.dirname(__file__), 'suno_accounts.json')
 
+# Accounts stay in memory and the file is only re-read when it changes. The pool also
+# routes distributed batches by rate-limit headroom and remaining credits.
+ACCOUNT_POOL = AccountPool(
+    ACCOUNTS_FILE,
+    limiter_for=RATE_LIMITERS.get,
+    credits_for=lambda api_key: CREDITS_CACHE.get(api_key)['credits'],
+    min_credits=config.ACCOUNT_MIN_CREDITS
+)
+
 def load_accounts():
     """Loads Suno accounts from the JSON file."""
-    if not os.path.exists(ACCOUNTS_FILE):
-        return {}
-    try:
-        with open(ACCOUNTS_FILE, 'r') as f:
-            return json.load(f)
-    except (IOError, json.JSONDecodeError):
-        return {}
+    return ACCOUNT_POOL.accounts()
 
 def save_accounts(data):
     """Saves Suno accounts to the JSON file."""
     try:
-        with open(ACCOUNTS_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
+        ACCOUNT_POOL.save(data)
     except IOError:
         logging.error("Could not write to accounts file.")
 
-def get_suno_client_from_request():
-    """Helper to get Suno client from request headers."""
+# One pooled client per API key, so polls and downloads reuse keep-alive connections
+SUNO_CLIENTS = SunoClientPool()
+metrics.SUNO_CLIENT_POOL_SIZE.set_function(lambda: len(SUNO_CLIENTS))
+
+def get_api_key_from_request():
+    """Returns the Suno API key from the request's Bearer token."""
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         raise ValueError("Authorization header with Bearer token is required.")
-    api_key = auth_header.split(' ')[1]
-    return SunoClient(api_key=api_key, base_url=config.SUNO_API_URL)
+    api_key = auth_header[len('Bearer '):].strip()
+    if not api_key:
+        raise ValueError("Authorization header with Bearer token is required.")
+    return api_key
+
+def get_suno_client_from_request():
+    """Helper to get the pooled Suno client for the API key in the request headers."""
+    return SUNO_CLIENTS.get(get_api_key_from_request(), base_url=config.SUNO_API_URL)
+
+def save_completed_generation(generation):
+    """Adds the tracks of a completed generation to the generation history (called once per generation)."""
+    HISTORY.add_generations(generation.get('results', []))
+
+# Open tabs poll credits every minute; they share one cached, single-flight lookup per key
+CREDITS_CACHE = CreditsCache(lambda api_key: SUNO_CLIENTS.get(api_key, base_url=config.SUNO_API_URL).get_credits())
+
+def callback_token(api_key):
+    """Per-account token embedded in callback URLs; proves a callback came from a URL we handed out."""
+    return hmac.new(config.SUNO_CALLBACK_SECRET.encode(), api_key.encode(), hashlib.sha256).hexdigest()
+
+def suno_callback_url(api_key):
+    """Returns the callback URL for an account's generations, or None when callbacks are disabled."""
+    if not config.SUNO_CALLBACK_BASE_URL:
+        return None
+    return f"{config.SUNO_CALLBACK_BASE_URL.rstrip('/')}/api/suno-callback/{callback_token(api_key)}"
+
+# A single background poller checks all outstanding generations in batched calls
+GENERATION_POLLER = GenerationPoller(
+    lambda api_key: SUNO_CLIENTS.get(api_key, base_url=config.SUNO_API_URL),
+    on_complete=save_completed_generation
+)
+metrics.GENERATIONS_OUTSTANDING.set_function(GENERATION_POLLER.outstanding)
+
+# Downloaded clips on disk; finished clips are fetched as soon as the poller reports them
+AUDIO_CACHE = AudioCache()
+GENERATION_POLLER.subscribe(None, AUDIO_CACHE.prefetch_generation)
 
 @app.route('/')
 def index():
     """Serve the main page"""
-    # Detect CPU and GPU hardware
-    cpu_model = cpuinfo.get_cpu_info().get('brand_raw', 'N/A')
-    
-    # Check for PyTorch (Whisper & Demucs) GPU support
-    pytorch_gpu = torch.cuda.is_available()
-    
-    gpu_model = "N/A"
-    if pytorch_gpu:
-        gpu_model = torch.cuda.get_device_name(0)
-
-    return render_template('index.html', cpu_model=cpu_model, gpu_model=gpu_model, pytorch_gpu=pytorch_gpu)
+    # Hardware is profiled by the background warm-up; page loads only read the cached result
+    profile = hardware_profile.cached_profile()
+    system = profile['system']
+    return render_template(
+        'index.html',
+        cpu_model=system['cpu_model'],
+        gpu_model=system['gpu_model'],
+        pytorch_gpu=system['cuda_available'],
+        recommended=profile['recommended'],
+        profiling_enabled=config.ENABLE_PROFILING
+    )
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Exposes service metrics in the Prometheus text exposition format."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/system', methods=['GET'])
+def system_info():
+    """Returns the cached hardware profile, calibration results and recommended settings."""
+    profile = hardware_profile.cached_profile()
+    return jsonify({
+        'system': profile['system'],
+        'calibration': profile['calibration'],
+        'calibration_status': hardware_profile.calibration_status(),
+        'recommended': profile['recommended']
+    })
+
+def analyze_for_job(job, filepath, options):
+    """Runs the analysis pipeline for a job, publishing progress events, and returns the response payload."""
+    total_start = time.perf_counter()
+    progress = StageProgress(lambda value, status: job.publish({'status': status, 'progress': value}))
+    analyzer = AudioAnalyzer(filepath, device=get_device(), model_cache=MODEL_CACHE, progress_callback=progress)
+    features = analyzer.analyze()
+    timings = analyzer.timings
+
+    job.publish({'status': 'Classifying genre and mood...', 'progress': 30})
+    with timed(timings, 'classification'):
+        genre = analyzer.classify_genre(selected_genre=options['selected_genre'])
+        mood = analyzer.classify_mood()
+        instruments = analyzer.detect_instruments(genre)
+        has_vocals = analyzer.detect_vocals()
+
+    lyrics, vocal_gender = None, None
+    if has_vocals:
+        vocal_info = analyzer.extract_lyrics(
+            model_quality=options['model_quality'],
+            demucs_model=options['demucs_model'],
+            save_vocals=options['save_vocals'],
+            output_dir=app.config['UPLOAD_FOLDER']
+        )
+        lyrics = vocal_info.get('lyrics')
+        vocal_gender = vocal_info.get('gender')
+
+    job.publish({'status': 'Generating prompts...', 'progress': 90})
+    with timed(timings, 'prompt_generation'):
+        generator = PromptGenerator(features, genre, mood, instruments, has_vocals, lyrics, vocal_gender,
+                                    genre_candidates=analyzer.genre_candidates)
+        variations = generator.generate_variations()
+    timings['total'] = round(time.perf_counter() - total_start, 4)
+    for stage, seconds in timings.items():
+        metrics.ANALYSIS_STAGE_DURATION.observe(seconds, stage=stage)
+    logging.info(f"Analysis timings for {os.path.basename(filepath)}: {timings}")
+
+    return {
+        'success': True,
+        'analysis': {
+            'genre': genre,
+            'mood': mood,
+            'instruments': instruments,
+            'has_vocals': has_vocals,
+            'lyrics': lyrics,
+            'vocal_gender': vocal_gender,
+            'tempo': features.get('tempo'),
+            'key': features.get('key'),
+            'energy': features.get('energy'),
+            'genre_candidates': [{'genre': g, 'score': score} for g, score in analyzer.genre_candidates],
+            'full_analysis_data': features
+        },
+        'prompts': variations,
+        'timings': timings
+    }
+
+def run_analysis_job(job, filepath, options):
+    """Runs the full analysis for a job, under the profiler when requested, and publishes the result."""
+    try:
+        if not options['model_quality'] or not options['demucs_model']:
+            recommended = hardware_profile.recommended_settings()  # Waits for detection in this job thread
+            options = dict(options, model_quality=options['model_quality'] or recommended['model_quality'],
+                           demucs_model=options['demucs_model'] or recommended['demucs_model'])
+        if options.get('profile'):
+            output_dir = os.path.join(config.PROFILE_FOLDER, job.id)
+            with profiled(output_dir, mode=options['profile_mode']) as profile:
+                response = analyze_for_job(job, filepath, options)
+            profile['job_id'] = job.id
+            profile['files'] = {name: f"/api/profiles/{job.id}/{name}" for name in profile.get('files', [])}
+            response['profile'] = profile
+        else:
+            response = analyze_for_job(job, filepath, options)
+        # For simplicity, we just pass the result back to the client(s) to be exported
+        job.publish({'status': 'Complete!', 'progress': 100, 'result': response})
+
+    except Exception as e:
+        logging.error(f"Error analyzing audio: {str(e)}")
+        logging.error(traceback.format_exc())
+        job.publish({'error': f'Error analyzing audio: {str(e)}'})
+
+    finally:
+        # The upload is private to this job (see analyze_audio), so it can go now
+        try:
+            os.remove(filepath)
+        except OSError as e:
+            logging.warning(f"Could not delete upload {filepath}: {e}")
+        if get_device() == 'cuda':
+            torch.cuda.empty_cache()
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_audio():
@@ -131,75 +323,58 @@ def analyze_audio():
                 yield f"data: {json.dumps({'error': 'Invalid file'})}\n\n"
                 return
             
-            # Save file
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            logging.info(f"File saved to: {filepath}")
-            
-            try:
-                yield f"data: {json.dumps({'status': 'Analyzing audio features...', 'progress': 10})}\n\n"
-                analyzer = AudioAnalyzer(filepath, device=DEVICE, model_cache=MODEL_CACHE)
-                features = analyzer.analyze()
-                
-                yield f"data: {json.dumps({'status': 'Detecting tempo and key...', 'progress': 25})}\n\n"
-                selected_genre = request.form.get('selected_genre', None)
-                
-                yield f"data: {json.dumps({'status': 'Classifying genre and mood...', 'progress': 30})}\n\n"
-                genre = analyzer.classify_genre(selected_genre=selected_genre)
-                mood = analyzer.classify_mood()
-                
-                yield f"data: {json.dumps({'status': 'Analyzing instruments...', 'progress': 35})}\n\n"
-                instruments = analyzer.detect_instruments(genre)
-                has_vocals = analyzer.detect_vocals()
-                
-                lyrics, vocal_gender = None, None
-                if has_vocals:
-                    yield f"data: {json.dumps({'status': 'Separating vocals (can be slow)...', 'progress': 40})}\n\n"
-                    model_quality = request.form.get('model_quality', 'base')
-                    demucs_model = request.form.get('demucs_model', 'htdemucs_ft')
-                    save_vocals = request.form.get('save_vocals') == 'true'
-                    
-                    yield f"data: {json.dumps({'status': f'Transcribing lyrics with Whisper ({model_quality})...', 'progress': 60})}\n\n"
-                    vocal_info = analyzer.extract_lyrics(
-                        model_quality=model_quality,
-                        demucs_model=demucs_model,
-                        save_vocals=save_vocals,
-                        output_dir=app.config['UPLOAD_FOLDER']
-                    )
-                    lyrics = vocal_info.get('lyrics')
-                    vocal_gender = vocal_info.get('gender')
-                
-                yield f"data: {json.dumps({'status': 'Generating prompts...', 'progress': 90})}\n\n"
-                generator = PromptGenerator(features, genre, mood, instruments, has_vocals, lyrics, vocal_gender)
-                variations = generator.generate_variations()
-                
-                # Prepare final response
-                response = {
-                    'success': True,
-                    'analysis': {
-                        'genre': genre,
-                        'mood': mood,
-                        'instruments': instruments,
-                        'has_vocals': has_vocals,
-                        'lyrics': lyrics,
-                        'vocal_gender': vocal_gender,
-                        'tempo': features.get('tempo'),
-                        'key': features.get('key'),
-                        'energy': features.get('energy'),
-                        'full_analysis_data': features
-                    },
-                    'prompts': variations
-                }
-                # Store the final result in a session or a temporary cache
-                # For simplicity, we'll just pass it back to the client to be exported
-                yield f"data: {json.dumps({'status': 'Complete!', 'progress': 100, 'result': response})}\n\n"
-                
-            finally:
-                # In the new flow, we might not want to clean up immediately
-                # The client will tell us when it's okay to delete the file
-                if DEVICE == 'cuda':
-                    torch.cuda.empty_cache()
+            # Omitted model options use this machine's recommendations. While the hardware is
+            # still being profiled they are left open and resolved by the job itself.
+            profile = hardware_profile.cached_profile()
+            recommended = {} if profile.get('provisional') else profile['recommended']
+            options = {
+                'selected_genre': request.form.get('selected_genre', None),
+                'model_quality': request.form.get('model_quality') or recommended.get('model_quality'),
+                'demucs_model': request.form.get('demucs_model') or recommended.get('demucs_model'),
+                'save_vocals': request.form.get('save_vocals') == 'true',
+                'profile': False
+            }
+            if request.form.get('profile') == 'true':
+                if not config.ENABLE_PROFILING:
+                    yield f"data: {json.dumps({'error': 'Profiling is disabled on this server (set ENABLE_PROFILING=true).'})}\n\n"
+                    return
+                profile_mode = request.form.get('profile_mode') or config.PROFILING_MODE
+                if profile_mode not in PROFILE_MODES:
+                    yield f"data: {json.dumps({'error': f'Invalid profile_mode. Use one of {list(PROFILE_MODES)}.'})}\n\n"
+                    return
+                # Profiled runs never coalesce with unprofiled ones, so the artefact always exists.
+                options.update({'profile': True, 'profile_mode': profile_mode})
+
+            # Identical uploads with identical options share a single pipeline run.
+            # Only the first submission saves the file, under a private name, so
+            # a running job never sees its input overwritten by another upload.
+            upload = {}
+
+            def save_upload():
+                fd, upload['path'] = tempfile.mkstemp(prefix='analysis-', suffix='_' + filename,
+                                                      dir=app.config['UPLOAD_FOLDER'])
+                os.close(fd)
+                try:
+                    file.save(upload['path'])
+                except BaseException:
+                    os.remove(upload['path'])
+                    raise
+
+            key = analysis_key(hash_stream(file.stream), options)
+            job, created = ANALYSIS_JOBS.submit(
+                key,
+                lambda job: run_analysis_job(job, upload['path'], options),
+                prepare=save_upload
+            )
+            if created:
+                logging.info(f"File saved to: {upload['path']}")
+            else:
+                metrics.ANALYSIS_JOBS_COALESCED.inc()
+                logging.info(f"Identical analysis already in progress, attaching to job {job.id}")
+
+            for event in job.stream():
+                yield f"data: {json.dumps(event)}\n\n"
         
         except Exception as e:
             logging.error(f"Error analyzing audio: {str(e)}")
@@ -209,6 +384,16 @@ def analyze_audio():
 
     return Response(stream_with_context(generate_progress()), content_type='text/event-stream')
 
+@app.route('/api/profiles/<job_id>/<filename>', methods=['GET'])
+def download_profile(job_id, filename):
+    """Downloads a profiling artefact (collapsed stacks, pstats or top functions) of an analysis job."""
+    if not config.ENABLE_PROFILING:
+        return jsonify({'error': 'Profiling is disabled on this server'}), 404
+    job_dir = os.path.join(os.path.abspath(config.PROFILE_FOLDER), secure_filename(job_id))
+    if not os.path.isfile(os.path.join(job_dir, secure_filename(filename))):
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_from_directory(job_dir, secure_filename(filename), as_attachment=True)
+
 @app.route('/api/preprocess', methods=['POST'])
 def preprocess_audio():
     """Extracts basic metadata from the audio file without full analysis."""
@@ -224,7 +409,7 @@ def preprocess_audio():
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         
-        analyzer = AudioAnalyzer(filepath, device=DEVICE, model_cache=MODEL_CACHE)
+        analyzer = AudioAnalyzer(filepath, device=get_device(), model_cache=MODEL_CACHE)
         metadata = analyzer.extract_metadata()
         
         # --- Also perform a quick analysis for more detailed info ---
@@ -259,7 +444,44 @@ def health_check():
 @app.route('/api/genres', methods=['GET'])
 def get_genres():
     """Return the current list of genre rules."""
-    return jsonify(GENRE_RULES)
+    return jsonify(GENRE_RULES.current().rules)
+
+@app.route('/api/add_genre', methods=['POST'])
+def add_genre():
+    """
+    Adds a custom genre with a tempo range (genre_name, min_bpm, max_bpm; one bound may be
+    empty) and optional typical_instruments, texture and notes. It is used by the next analysis.
+    """
+    try:
+        data = request.get_json() or {}
+        name = str(data.get('genre_name') or '').strip()
+        if not name:
+            return jsonify({'error': 'A genre name is required.'}), 400
+        tempo = {}
+        for bound, field in (('min', 'min_bpm'), ('max', 'max_bpm')):
+            if data.get(field) not in (None, ''):
+                try:
+                    tempo[bound] = float(data[field])
+                except (TypeError, ValueError):
+                    tempo[bound] = math.nan
+                if not math.isfinite(tempo[bound]):
+                    return jsonify({'error': 'min_bpm and max_bpm must be finite numbers.'}), 400
+        if not tempo:  # A genre without any bound would fit every track perfectly
+            return jsonify({'error': 'At least one of min_bpm and max_bpm is required.'}), 400
+        entry = {'genre': name, 'rules': {'tempo': tempo}}
+        for field in ('typical_instruments', 'texture', 'notes'):
+            if field in data:
+                entry[field] = data[field]
+        GENRE_RULES.add(entry)
+        logging.info(f"Added custom genre '{name}'")
+        return jsonify({'success': True, 'message': f"Genre '{name}' added."})
+    except DuplicateGenreError:
+        return jsonify({'error': f"Genre '{name}' already exists."}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error adding genre: {str(e)}")
+        return jsonify({'error': 'An internal error occurred.'}), 500
 
 @app.route('/api/export', methods=['POST'])
 def export_results():
@@ -280,6 +502,66 @@ def export_results():
         logging.error(f"Error exporting results: {str(e)}")
         return jsonify({'error': 'An internal error occurred.'}), 500
 
+def build_prompt_data(data):
+    """Turns a generate-music request body into the payload for the Suno client."""
+    prompt_data = {
+        'prompt': data.get('prompt'),
+        'is_custom': data.get('is_custom', False),
+        'instrumental': data.get('instrumental', False),
+        'title': data.get('title'),
+        'tags': data.get('tags')
+    }
+
+    # Handle the structure of the 'prompt' field for custom generations
+    if prompt_data['is_custom'] and isinstance(data.get('prompt'), dict):
+        prompt_dict = data.get('prompt', {})
+        prompt_data['prompt'] = prompt_dict.get('lyrics_prompt', '')
+        # If tags are not provided directly, use style_prompt
+        if not prompt_data['tags']:
+            prompt_data['tags'] = prompt_dict.get('style_prompt', '')
+    return prompt_data
+
+def submit_generation(api_key, prompt_data):
+    """Starts one generation with the shared client and hands its clips to the central poller."""
+    client = SUNO_CLIENTS.get(api_key, base_url=config.SUNO_API_URL)
+    callback_url = suno_callback_url(api_key)
+    return record_generation(api_key, client.generate_music(prompt_data, callback_url=callback_url), callback_url)
+
+async def submit_generation_async(api_key, prompt_data):
+    """Coroutine version of submit_generation used by batches, which run on the shared event loop."""
+    client = AsyncSunoClient(api_key, base_url=config.SUNO_API_URL)
+    callback_url = suno_callback_url(api_key)
+    return record_generation(api_key, await client.generate_music(prompt_data, callback_url=callback_url), callback_url)
+
+def record_generation(api_key, response, callback_url):
+    """Charges a started generation to the credits cache and hands its clips to the central poller."""
+    CREDITS_CACHE.spend(api_key, config.GENERATION_CREDIT_COST)  # No upstream credits call per generation
+
+    # Clients follow the clips via /api/generation-events.
+    # With callbacks enabled the poller only checks in occasionally as a fallback.
+    if isinstance(response, list):
+        try:
+            GENERATION_POLLER.track(
+                api_key, [clip['id'] for clip in response if clip.get('id')],
+                poll_interval=config.SUNO_CALLBACK_POLL_INTERVAL if callback_url else None
+            )
+        except TrackingLimitError as e:
+            logging.warning(f"Generation started but is not tracked: {e}")  # It was paid for; still return it
+    return response
+
+# Identical submissions from the same account within the window (e.g. a double-click)
+# reuse the first generation instead of spending credits again
+GENERATION_IDEMPOTENCY = IdempotencyCache()
+GENERATION_BATCHES = GenerationBatches(submit_generation_async, GENERATION_IDEMPOTENCY)
+
+def batch_status(batch):
+    """A batch snapshot with the poller's current status for each submitted generation."""
+    status = batch.snapshot()
+    for item, owner in zip(status['items'], batch.owners):
+        generation = GENERATION_POLLER.get(owner, ','.join(item['clip_ids'])) if item['clip_ids'] else None
+        item['generation_status'] = generation['status'] if generation else None
+    return status
+
 @app.route('/api/generate-music', methods=['POST'])
 def generate_music():
     """Triggers music generation using the Suno API."""
@@ -288,87 +570,263 @@ def generate_music():
         if not data:
             return jsonify({'error': 'Invalid payload.'}), 400
 
-        # Prepare the payload for the Suno client
-        prompt_data = {
-            'prompt': data.get('prompt'),
-            'is_custom': data.get('is_custom', False),
-            'instrumental': data.get('instrumental', False),
-            'title': data.get('title'),
-            'tags': data.get('tags')
-        }
+        prompt_data = build_prompt_data(data)
+        api_key = get_api_key_from_request()
+        client_key = request.headers.get('Idempotency-Key')
+        key = client_idempotency_key(api_key, client_key) if client_key else idempotency_key(api_key, prompt_data)
+        response, replayed = GENERATION_IDEMPOTENCY.run(key, lambda: submit_generation(api_key, prompt_data))
+        if replayed:
+            logging.info("Duplicate generation request; returning the earlier generation")
 
-        # Handle the structure of the 'prompt' field for custom generations
-        if prompt_data['is_custom'] and isinstance(data.get('prompt'), dict):
-            prompt_dict = data.get('prompt', {})
-            prompt_data['prompt'] = prompt_dict.get('lyrics_prompt', '')
-            # If tags are not provided directly, use style_prompt
-            if not prompt_data['tags']:
-                prompt_data['tags'] = prompt_dict.get('style_prompt', '')
-
-        client = get_suno_client_from_request()
-        response = client.generate_music(prompt_data)
-        
         return jsonify(response)
 
     except ValueError as e:
         return jsonify({'error': str(e)}), 401
+    except (SunoRateLimitError, SunoUnavailableError) as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         logging.error(f"Error generating music: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/generate-batch', methods=['POST'])
+def generate_batch():
+    """
+    Submits many generation requests at once. The body is
+    {"items": [<generate-music payload>, ...], "concurrency": n}; items are
+    sent with at most `concurrency` in flight (capped by the server) and the
+    response is the batch with a status per item. Each item's idempotency key
+    is derived from its payload and account, so resubmitting an item within
+    the idempotency window returns the earlier generation ('duplicate').
+    With "distribute": true the items are spread across the saved accounts
+    instead of all using the caller's key; this requires the caller's key to
+    be a saved account (or ALLOW_ACCOUNT_DISTRIBUTION).
+    """
+    try:
+        api_key = get_api_key_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 401
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': "'items' must be a non-empty list of generation payloads."}), 400
+    if len(items) > config.BATCH_GENERATION_MAX_ITEMS:
+        return jsonify({'error': f"A batch can contain at most {config.BATCH_GENERATION_MAX_ITEMS} items."}), 400
+    try:
+        concurrency = int(data['concurrency']) if data.get('concurrency') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': "'concurrency' must be an integer."}), 400
+
+    accounts = ACCOUNT_POOL if data.get('distribute') else None
+    if accounts is not None and not (config.ALLOW_ACCOUNT_DISTRIBUTION or accounts.owns(api_key)):
+        return jsonify({'error': 'Only saved accounts may distribute a batch across the saved accounts.'}), 403
+    if accounts is not None and not accounts.candidates():
+        return jsonify({'error': 'No saved Suno account has credits and rate-limit headroom left.'}), 409
+    batch = GENERATION_BATCHES.start(api_key, [build_prompt_data(item) for item in items], concurrency, accounts)
+    return jsonify(batch_status(batch)), 202
+
+@app.route('/api/generate-batch/<batch_id>', methods=['GET'])
+def get_generation_batch(batch_id):
+    """Returns the submission status of every item of a batch, plus each generation's progress."""
+    try:
+        api_key = get_api_key_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 401
+
+    batch = GENERATION_BATCHES.get(batch_id)
+    if batch is None or batch.api_key != api_key:
+        return jsonify({'error': 'Batch not found.'}), 404
+    return jsonify(batch_status(batch))
+
 @app.route('/api/generation-status/<request_id>', methods=['GET'])
 def generation_status(request_id):
-    """Checks the status of a music generation request."""
+    """
+    Returns the status of a generation request. The request is tracked by the
+    central poller, so repeated calls are answered from memory instead of
+    each hitting the Suno API. Snapshots are kept per API key, so a caller
+    only ever sees results fetched with its own key.
+    """
     try:
-        client = get_suno_client_from_request()
-        response = client.check_generation_status(request_id.split(','))
-
-        # If the generation is complete, save it to history
-        if response.get('status') == 'completed':
-            try:
-                history = read_history(GENERATION_HISTORY_FILE)
-                # Prevent duplicates by checking existing IDs
-                existing_ids = {item['id'] for item in history}
-                
-                for track in response.get('results', []):
-                    if track['id'] not in existing_ids:
-                        import datetime
-                        import uuid
-                        track['generation_id'] = str(uuid.uuid4())
-                        track['timestamp'] = datetime.datetime.now().isoformat()
-                        history.insert(0, track)
-
-                write_history(history, GENERATION_HISTORY_FILE)
-            except Exception as e:
-                logging.error(f"Could not save generation to history: {e}")
+        api_key = get_api_key_from_request()
+        return jsonify(GENERATION_POLLER.track(api_key, request_id.split(',')))
 
-        return jsonify(response)
-        
     except ValueError as e:
         return jsonify({'error': str(e)}), 401
+    except TrackingLimitError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         logging.error(f"Error checking generation status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/generation-events', methods=['GET'])
+def generation_events():
+    """
+    Server-sent event stream of status changes for every generation of the
+    caller's API key. The current state of each tracked generation is sent
+    first, so a reconnecting client catches up immediately.
+    """
+    try:
+        api_key = get_api_key_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 401
+
+    events = queue.Queue()
+    unsubscribe = GENERATION_POLLER.subscribe(api_key, events.put)
+
+    def stream():
+        try:
+            for snapshot in GENERATION_POLLER.snapshots(api_key):
+                yield f"data: {json.dumps(snapshot)}\n\n"
+            while True:
+                try:
+                    event = events.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            unsubscribe()
+
+    return Response(stream_with_context(stream()), content_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/suno-callback/<token>', methods=['POST'])
+def suno_callback(token):
+    """
+    Receives clip updates pushed by Suno for generations started with a
+    callback URL. Accepts a list of clips or a single clip, optionally wrapped
+    in 'data' envelopes, and forwards them to the poller, which updates the history
+    and the event streams.
+    """
+    data = request.get_json(silent=True)
+    while isinstance(data, dict) and 'data' in data:  # Unwrap {"code": ..., "data": {...}} envelopes
+        data = data['data']
+    tracks = data if isinstance(data, list) else [data]
+    if not any(isinstance(track, dict) and track.get('id') for track in tracks):
+        metrics.SUNO_CALLBACKS.inc(result='rejected')
+        return jsonify({'error': 'Callback payload contains no clips'}), 400
+
+    updated, rejected = GENERATION_POLLER.push(
+        tracks, authorize=lambda api_key: hmac.compare_digest(token, callback_token(api_key))
+    )
+    if rejected and not updated:
+        logging.warning("Rejected a Suno callback with an invalid token")
+        metrics.SUNO_CALLBACKS.inc(result='rejected')
+        return jsonify({'error': 'Invalid callback token'}), 403
+
+    # Unknown clips are acknowledged too (e.g. generations finished long ago) so the sender does not retry
+    metrics.SUNO_CALLBACKS.inc(result='accepted' if updated else 'ignored')
+    return jsonify({'success': True, 'updated': updated})
 
 @app.route('/api/credits', methods=['GET'])
 def get_credits():
-    """Gets the remaining credits for the Suno API key."""
+    """Gets the remaining credits for the Suno API key (cached for CREDITS_CACHE_TTL seconds)."""
     try:
-        client = get_suno_client_from_request()
-        credits_info = client.get_credits()
+        credits_info = CREDITS_CACHE.get(get_api_key_from_request())
         return jsonify(credits_info)
     except ValueError as e:
         return jsonify({'error': str(e)}), 401
+    except (SunoRateLimitError, SunoUnavailableError) as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         logging.error(f"Error fetching credits: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """Returns the analysis history."""
-    history = read_history()
-    return jsonify(history)
+    """Returns a page of the analysis history, newest first (`?cursor=&limit=`)."""
+    return history_page('analysis')
+
+@app.route('/api/history/search', methods=['GET'])
+def search_history():
+    """
+    Searches saved analyses, newest first. Facets (genre, mood, key, energy,
+    has_vocals) can be repeated to accept several values; tempo_min/tempo_max
+    bound the tempo and `q` matches words in the lyrics or prompts. Paginated
+    like /api/history; `facets=true` adds per-value counts for the matches.
+    """
+    try:
+        limit = int(request.args.get('limit', config.HISTORY_PAGE_SIZE))
+        filters = {facet: request.args.getlist(facet) for facet in FACETS}
+        filters['has_vocals'] = [value.lower() in ('1', 'true', 'yes') for value in filters['has_vocals']]
+        for bound in ('tempo_min', 'tempo_max'):
+            filters[bound] = float(request.args[bound]) if request.args.get(bound) else None
+    except ValueError:
+        return jsonify({'error': 'limit, tempo_min and tempo_max must be numbers.'}), 400
+    limit = max(1, min(limit, config.HISTORY_MAX_PAGE_SIZE))
+    text = request.args.get('q')
+    try:
+        items, next_cursor = HISTORY.search(filters, text=text, cursor=request.args.get('cursor'), limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = {'items': items, 'next_cursor': next_cursor}
+    if request.args.get('facets', 'false').lower() == 'true':
+        result['facets'] = HISTORY.facet_counts(filters, text=text)
+    return jsonify(result)
+
+def similar_analyses(vector, k, exclude=None):
+    """The k saved analyses closest to a feature vector, without their raw feature data."""
+    matches = FEATURE_INDEX.search(vector, k=k, exclude=exclude)
+    items = HISTORY.get_many('analysis', [item_id for item_id, _ in matches])
+    results = []
+    for item_id, distance in matches:
+        item = items.get(item_id)
+        if item is None:
+            continue
+        analysis = {key: value for key, value in (item.get('analysis') or {}).items() if key != 'full_analysis_data'}
+        results.append({
+            'id': item_id,
+            'timestamp': item.get('timestamp'),
+            'distance': round(distance, 4),
+            'analysis': analysis,
+            'prompts': item.get('prompts', [])
+        })
+    return results
+
+@app.route('/api/similar', methods=['GET', 'POST'])
+def find_similar():
+    """
+    Finds saved analyses that sound like a track, so their prompts can be
+    reused. GET takes the `id` of a saved analysis; POST takes an `audio`
+    upload, which only goes through feature extraction. `k` sets the number
+    of results.
+    """
+    try:
+        k = max(1, min(int(request.values.get('k', 10)), config.SIMILAR_MAX_RESULTS))
+    except ValueError:
+        return jsonify({'error': 'k must be an integer.'}), 400
+    try:
+        if request.method == 'GET':
+            analysis_id = request.args.get('id')
+            if not analysis_id:
+                return jsonify({'error': 'An analysis id is required.'}), 400
+            vector = FEATURE_INDEX.vector_for(analysis_id)
+            if vector is None:
+                return jsonify({'error': 'Analysis not found or it has no feature data.'}), 404
+            return jsonify({'success': True, 'items': similar_analyses(vector, k, exclude=analysis_id)})
+
+        if 'audio' not in request.files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        file = request.files['audio']
+        if file.filename == '' or not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file'}), 400
+        # A private name, so a concurrent analysis of a file with the same name is not disturbed
+        fd, filepath = tempfile.mkstemp(prefix='similar-', suffix='_' + secure_filename(file.filename),
+                                        dir=app.config['UPLOAD_FOLDER'])
+        os.close(fd)
+        try:
+            file.save(filepath)
+            analyzer = AudioAnalyzer(filepath, device=get_device(), model_cache=MODEL_CACHE)
+            vector = feature_vector(analyzer.analyze())
+        finally:
+            os.remove(filepath)
+        if vector is None:
+            return jsonify({'error': 'Could not extract features from the audio.'}), 422
+        return jsonify({'success': True, 'items': similar_analyses(vector, k)})
+
+    except Exception as e:
+        logging.error(f"Error finding similar tracks: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': 'An internal error occurred.'}), 500
 
 @app.route('/api/history', methods=['POST'])
 def save_to_history():
@@ -378,17 +836,9 @@ def save_to_history():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        history = read_history()
-        # Add a timestamp and a unique ID
-        import datetime
-        import uuid
-        data['id'] = str(uuid.uuid4())
-        data['timestamp'] = datetime.datetime.now().isoformat()
+        item = HISTORY.add_analysis(data)
         
-        history.insert(0, data) # Add to the beginning of the list
-        write_history(history)
-        
-        return jsonify({'success': True, 'message': 'Analysis saved to history.'})
+        return jsonify({'success': True, 'message': 'Analysis saved to history.', 'id': item['id']})
         
     except Exception as e:
         logging.error(f"Error saving to history: {str(e)}")
@@ -396,9 +846,8 @@ def save_to_history():
 
 @app.route('/api/generation-history', methods=['GET'])
 def get_generation_history():
-    """Returns the music generation history."""
-    history = read_history(GENERATION_HISTORY_FILE)
-    return jsonify(history)
+    """Returns a page of the music generation history, newest first (`?cursor=&limit=`)."""
+    return history_page('generation')
 
 @app.route('/api/generation-history', methods=['POST'])
 def save_generation_to_history():
@@ -408,19 +857,9 @@ def save_generation_to_history():
         if not data or 'id' not in data:
             return jsonify({'error': 'Invalid data provided.'}), 400
         
-        history = read_history(GENERATION_HISTORY_FILE)
-        
-        # Avoid duplicates
-        if any(item['id'] == data['id'] for item in history):
+        # Tracks are keyed by clip ID, so saving one twice is a no-op
+        if not HISTORY.add_generations([data]):
             return jsonify({'success': False, 'message': 'Item already in history.'})
-
-        import datetime
-        import uuid
-        data['generation_id'] = str(uuid.uuid4())
-        data['timestamp'] = datetime.datetime.now().isoformat()
-        
-        history.insert(0, data)
-        write_history(history, GENERATION_HISTORY_FILE)
         
         return jsonify({'success': True, 'message': 'Generation saved to history.'})
         
@@ -481,6 +920,7 @@ def remove_account():
             return jsonify({'error': 'Account not found.'}), 404
 
         was_default = accounts[name].get('default', False)
+        removed_key = accounts[name].get('api_key')
         del accounts[name]
 
         # If the deleted account was the default, and there are other accounts,
@@ -490,12 +930,19 @@ def remove_account():
             accounts[first_account_name]['default'] = True
 
         save_accounts(accounts)
+        if removed_key:
+            SUNO_CLIENTS.discard(removed_key)
         return jsonify({'success': True, 'message': f"Account '{name}' removed."})
 
     except Exception as e:
         logging.error(f"Error removing account: {str(e)}")
         return jsonify({'error': 'An internal error occurred.'}), 500
 
+@app.route('/api/accounts/stats', methods=['GET'])
+def get_account_stats():
+    """Returns per-account generation throughput, rate-limit headroom and circuit state."""
+    return jsonify(ACCOUNT_POOL.stats())
+
 @app.route('/api/accounts/default', methods=['POST'])
 def set_default_account():
     """Sets a specific Suno account as the default."""
@@ -519,31 +966,152 @@ def set_default_account():
         logging.error(f"Error setting default account: {str(e)}")
         return jsonify({'error': 'An internal error occurred.'}), 500
 
+# Audio files are public, so one pooled session serves every proxied download
+AUDIO_SESSION = pooled_session()
+AUDIO_CHUNK_SIZE = 64 * 1024
+AUDIO_PASSTHROUGH_HEADERS = ('Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+MAX_AUDIO_REDIRECTS = 5
+
+def cached_audio_response(clip_id, audio_url, title):
+    """
+    Serves a clip through the audio cache. A missing clip requested for inline
+    playback is streamed to the player while it is written to the cache, so
+    playback starts at once; returns None when the request should be streamed
+    from upstream uncached instead (a seek into a clip that is still downloading).
+    """
+    inline = request.args.get('inline') == '1'  # For <audio> previews
+    if inline and clip_id not in AUDIO_CACHE:
+        byte_range = request.headers.get('Range')
+        opened = None
+        if not byte_range or byte_range.strip() == 'bytes=0-':
+            try:
+                opened = AUDIO_CACHE.open_stream(clip_id, audio_url, AUDIO_CHUNK_SIZE)
+            except Exception as e:
+                logging.error(f"Error downloading audio: {str(e)}")
+                return jsonify({'error': 'Failed to download audio.'}), 502
+        if opened is not None:
+            upstream, body = opened
+            extension = os.path.splitext(urlparse(audio_url).path)[1] or '.mp3'
+            headers = {'Content-Disposition': f'inline;filename={secure_filename(title)}{extension}'}
+            if 'Content-Length' in upstream.headers:
+                headers['Content-Length'] = upstream.headers['Content-Length']
+            return Response(body, content_type=upstream.headers.get('Content-Type', 'audio/mpeg'), headers=headers)
+        if AUDIO_CACHE.get(clip_id) is None:
+            return None
+
+    try:
+        path = AUDIO_CACHE.fetch(clip_id, audio_url)
+    except Exception as e:
+        logging.error(f"Error downloading audio: {str(e)}")
+        return jsonify({'error': 'Failed to download audio.'}), 502
+    return send_file(path, as_attachment=not inline, download_name=f"{secure_filename(title)}{os.path.splitext(path)[1]}", conditional=True)
+
+def known_audio_url(clip_id):
+    """The audio URL Suno reported for a clip, from the poller or the generation history, or None."""
+    audio_url = GENERATION_POLLER.audio_url(clip_id)
+    if audio_url is None:
+        item = HISTORY.get_many('generation', [clip_id]).get(clip_id)
+        audio_url = item.get('audio_url') if item else None
+    return audio_url
+
+def is_public_http_url(url):
+    """True for an http(s) URL whose host resolves only to public addresses (no loopback, private, link-local or reserved)."""
+    parsed = urlparse(url)
+    try:
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            return False
+        infos = socket.getaddrinfo(parsed.hostname, parsed.port or 443, proto=socket.IPPROTO_TCP)
+        addresses = [ipaddress.ip_address(info[4][0].split('%')[0]) for info in infos]
+    except (OSError, UnicodeError, ValueError):
+        return False
+    return bool(addresses) and all(address.is_global for address in addresses)
+
+def open_public_audio_stream(audio_url, byte_range):
+    """
+    Opens a caller-supplied audio URL, following redirects by hand so that
+    every hop is checked with is_public_http_url. Returns the response, or
+    None if a hop points at a non-public address or there are too many hops.
+    """
+    for _ in range(MAX_AUDIO_REDIRECTS + 1):
+        if not is_public_http_url(audio_url):
+            return None
+        upstream = open_audio_stream(AUDIO_SESSION, audio_url, byte_range, allow_redirects=False)
+        if not upstream.is_redirect:
+            return upstream
+        audio_url = urljoin(audio_url, upstream.headers['Location'])
+        upstream.close()
+    return None
+
 @app.route('/api/download-audio', methods=['GET'])
 def download_audio():
-    """Downloads the audio from a given URL."""
-    audio_url = request.args.get('url')
+    """
+    Sends the audio of a clip. With a `clip_id` whose audio URL is known from
+    the poller or the history, the file comes from the local audio cache
+    (downloaded once, then served from disk). Any other `url` needs a Bearer
+    token and a publicly routable host, and is streamed chunk by chunk and
+    never cached. Range requests are supported either way, so players can
+    seek and downloads can resume.
+    """
     title = request.args.get('title', 'suno_generation')
-
-    if not audio_url:
-        return jsonify({'error': 'Audio URL is required.'}), 400
+    clip_id = request.args.get('clip_id')
+    if clip_id and not is_valid_clip_id(clip_id):
+        return jsonify({'error': 'Invalid clip ID.'}), 400
+    known_url = known_audio_url(clip_id) if clip_id else None
+    byte_range = request.headers.get('Range')
+
+    if known_url:
+        if urlparse(known_url).scheme not in ('http', 'https'):
+            return jsonify({'error': 'Audio URL must be an http(s) URL.'}), 400
+        response = cached_audio_response(clip_id, known_url, title)
+        if response is not None:
+            return response
+        open_upstream = lambda: open_audio_stream(AUDIO_SESSION, known_url, byte_range)  # Reported by Suno
+    else:
+        # Any other URL is fetched on the caller's behalf, so it is limited to signed-in callers
+        # and public hosts; otherwise this would be an open proxy into the local network.
+        try:
+            get_api_key_from_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 401
+        audio_url = request.args.get('url')
+        if not audio_url:
+            return jsonify({'error': 'Audio URL is required.'}), 400
+        if urlparse(audio_url).scheme not in ('http', 'https'):
+            return jsonify({'error': 'Audio URL must be an http(s) URL.'}), 400
+        open_upstream = lambda: open_public_audio_stream(audio_url, byte_range)
 
     try:
-        # We need a client to download, but the key isn't strictly needed for a public URL.
-        # However, it's good practice to use the client's session.
-        client = get_suno_client_from_request()
-        audio_data = client.download_audio(audio_url)
-        
-        return Response(
-            audio_data,
-            mimetype='audio/mpeg',
-            headers={'Content-Disposition': f'attachment;filename={secure_filename(title)}.mp3'}
-        )
-    except ValueError as e: # Handles auth errors from get_suno_client_from_request
-        return jsonify({'error': str(e)}), 401
+        upstream = open_upstream()
     except Exception as e:
         logging.error(f"Error downloading audio: {str(e)}")
-        return jsonify({'error': 'Failed to download audio.'}), 500
+        return jsonify({'error': 'Failed to download audio.'}), 502
+    if upstream is None:
+        return jsonify({'error': 'Audio URL must point to a public host.'}), 400
+
+    if upstream.status_code not in (200, 206):
+        status = upstream.status_code
+        upstream.close()
+        logging.error(f"Error downloading audio: upstream returned {status}")
+        if status == 416:
+            return jsonify({'error': 'Requested range not satisfiable.'}), 416
+        return jsonify({'error': 'Failed to download audio.'}), 502
+
+    headers = {name: upstream.headers[name] for name in AUDIO_PASSTHROUGH_HEADERS if name in upstream.headers}
+    headers['Content-Disposition'] = f'attachment;filename={secure_filename(title)}.mp3'
+
+    def stream():
+        try:
+            for chunk in upstream.iter_content(AUDIO_CHUNK_SIZE):
+                yield chunk
+        finally:
+            upstream.close()
+
+    return Response(
+        stream_with_context(stream()),
+        status=upstream.status_code,
+        content_type=upstream.headers.get('Content-Type', 'audio/mpeg'),
+        headers=headers
+    )
 
 
 if __name__ == '__main__':
@@ -585,7 +1153,8 @@ if __name__ == '__main__':
             except (ImportError, RuntimeError):
                 pass # Not running in a PyInstaller bundle
         
-        load_genre_rules()
-        serve(app, host='0.0.0.0', port=5001)
+        GENRE_RULES.current()  # Parse the rules before the first request
+        warm_up()
+        serve(app, host='0.0.0.0', port=5001, threads=config.SERVER_THREADS)
 
     start_app()
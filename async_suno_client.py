@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Optional, Dict, Any
+
+import config
+from lazy_imports import lazy_import
+from metrics import SUNO_REQUEST_DURATION, SUNO_ERRORS, SUNO_RATE_LIMIT_WAIT, SUNO_CIRCUIT_REJECTIONS
+from suno_client import (
+    RATE_LIMITERS, SunoError, SunoAuthError, SunoRateLimitError, SunoUnavailableError, APIParsingError,
+    build_generate_payload, summarize_tracks, _metric_endpoint, _retry_after,
+)
+
+aiohttp = lazy_import('aiohttp')
+
+_SESSIONS = {}  # event loop -> shared aiohttp.ClientSession
+_SESSIONS_LOCK = threading.Lock()
+
+
+def shared_session() -> "aiohttp.ClientSession":
+    """
+    Returns the ClientSession shared by every AsyncSunoClient on the running
+    event loop, so all keys and calls draw from one keep-alive connection pool.
+    """
+    loop = asyncio.get_running_loop()
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=config.SUNO_ASYNC_CONNECTION_LIMIT, ttl_dns_cache=300)
+            session = _SESSIONS[loop] = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=60))
+        return session
+
+
+async def close_shared_session():
+    """Closes the running loop's shared session (call before the loop shuts down)."""
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+class AsyncSunoClient:
+    """
+    asyncio counterpart of SunoClient with the same methods as coroutines.
+    Requests go through the same per-key rate limiter and circuit breaker as
+    the synchronous client, and retries wait with asyncio.sleep, so hundreds
+    of concurrent calls need neither threads nor blocked workers.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, session=None):
+        if not api_key:
+            raise SunoAuthError("API key is required for authentication.")
+        self.api_key = api_key
+        self.base_url = base_url or config.SUNO_API_URL
+        self.limiter = RATE_LIMITERS.get(api_key)
+        self._session = session
+
+    @property
+    def session(self):
+        return self._session or shared_session()
+
+    async def _acquire_token(self, metric_endpoint):
+        breaker = self.limiter.breaker
+        if not breaker.allow():
+            SUNO_CIRCUIT_REJECTIONS.inc(endpoint=metric_endpoint)
+            raise SunoUnavailableError(f"Suno API is failing; not retrying for another {breaker.retry_in():.0f}s.")
+        start = time.monotonic()
+        while True:
+            wait = self.limiter.bucket.try_acquire()
+            if not wait:
+                break
+            if time.monotonic() - start + wait > config.SUNO_RATE_LIMIT_MAX_WAIT:
+                breaker.release_trial()  # Nothing was sent
+                raise SunoRateLimitError("Rate limit exceeded. Please try again later.")
+            await asyncio.sleep(wait)
+        SUNO_RATE_LIMIT_WAIT.observe(time.monotonic() - start)
+
+    async def _request(self, method: str, endpoint: str, **kwargs) -> Any:
+        """Async version of SunoClient._request, with the same retry, rate-limit and breaker rules."""
+        url = f"{self.base_url}{endpoint}"
+        max_retries = 5
+        initial_delay = 1.0
+        backoff_factor = 2.0
+        max_delay = 30.0
+        metric_endpoint = _metric_endpoint(endpoint)
+        breaker = self.limiter.breaker
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+
+        for attempt in range(max_retries):
+            delay = random.uniform(0, min(max_delay, initial_delay * (backoff_factor ** attempt)))
+            await self._acquire_token(metric_endpoint)
+
+            start = time.perf_counter()
+            try:
+                async with self.session.request(method, url, headers=headers, **kwargs) as response:
+                    status = response.status
+                    if status == 200:
+                        if 'application/json' in response.headers.get('Content-Type', ''):
+                            body = await response.json()
+                        else:
+                            body = await response.read()
+                    else:
+                        body = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                SUNO_ERRORS.inc(endpoint=metric_endpoint, status='network')
+                breaker.record_failure()
+                logging.warning(f"Network connection error on attempt {attempt + 1}. Retrying in {delay:.2f} seconds...")
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                SUNO_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, endpoint=metric_endpoint)
+
+            if status >= 400:
+                SUNO_ERRORS.inc(endpoint=metric_endpoint, status=status)
+            if status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if status == 200:
+                return body
+            if status in (429, 503):
+                retry_after = _retry_after(response)
+                if retry_after is not None:
+                    delay = retry_after + random.uniform(0, initial_delay)
+                if status == 429:
+                    self.limiter.bucket.pause(delay)
+                if attempt + 1 < max_retries:
+                    logging.warning(f"Attempt {attempt + 1}: {endpoint} returned {status}. Retrying in {delay:.2f}s...")
+                    if status == 503:
+                        await asyncio.sleep(delay)
+                    continue
+                if status == 429:
+                    raise SunoRateLimitError("Rate limit exceeded. Please try again later.")
+            if status == 401:
+                raise SunoAuthError("Unauthorized access. Check your API key.")
+            logging.error(f"HTTP Error Response: {body}")
+            raise SunoError(f"HTTP Error: {status} {response.reason}")
+
+        raise SunoError(f"Request failed after {max_retries} attempts.")
+
+    async def generate_music(self, prompt_data: Dict[str, Any], callback_url: Optional[str] = None) -> Dict[str, Any]:
+        """Generates music using the Suno API v1."""
+        return await self._request("POST", "/api/v1/generate", json=build_generate_payload(prompt_data, callback_url))
+
+    async def fetch_generation_tracks(self, generation_ids: list[str]) -> Any:
+        """Returns the raw track objects for one or more generation IDs in a single request."""
+        ids_param = ",".join(generation_ids)
+        logging.info(f"Checking generation status for IDs: {ids_param}")
+        return await self._request("GET", f"/api/v1/generate/{ids_param}")
+
+    async def check_generation_status(self, generation_ids: list[str]) -> Dict[str, Any]:
+        """Checks the status of a music generation request using generation IDs."""
+        return summarize_tracks(await self.fetch_generation_tracks(generation_ids))
+
+    async def get_credits(self) -> Dict[str, Any]:
+        """Gets the account status and remaining credits for the API key."""
+        logging.info("Fetching account credits...")
+        response_data = await self._request("GET", "/api/v1/generate/credit")
+        credits = response_data.get("data")
+        if credits is None:
+            raise APIParsingError("Malformed response from credits endpoint: missing 'data' field.", response_data=response_data)
+        return {"credits": credits}
+
+    async def download_audio(self, audio_url: str) -> bytes:
+        """Downloads audio content from a given URL (without sending the API key to the audio host)."""
+        logging.info(f"Downloading audio from: {audio_url}")
+        try:
+            async with self.session.get(audio_url) as response:
+                response.raise_for_status()
+                return await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Failed to download audio: {e}")
+            raise SunoError(f"Failed to download audio from {audio_url}") from e
+
+
+class EventLoopThread:
+    """An asyncio event loop running in a daemon thread, for driving async clients from sync code."""
+
+    def __init__(self, name="suno-event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Schedules a coroutine on the loop and returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Runs a coroutine on the loop and blocks until it returns."""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        self.run(close_shared_session())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def event_loop_thread() -> EventLoopThread:
+    """Returns the process-wide loop thread that all BlockingSunoClients share."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = EventLoopThread()
+        return _LOOP
+
+
+class BlockingSunoClient:
+    """
+    Thin synchronous wrapper with SunoClient's interface that runs
+    AsyncSunoClient calls on the shared loop thread. Every wrapper shares one
+    connection pool, and callers that do not want to block can use `submit()`.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        self.client = AsyncSunoClient(api_key=api_key, base_url=base_url)
+        self.api_key = self.client.api_key
+        self._loop = event_loop_thread()
+
+    def submit(self, coro):
+        return self._loop.submit(coro)
+
+    def generate_music(self, prompt_data: Dict[str, Any], callback_url: Optional[str] = None) -> Dict[str, Any]:
+        return self._loop.run(self.client.generate_music(prompt_data, callback_url))
+
+    def fetch_generation_tracks(self, generation_ids: list[str]) -> Any:
+        return self._loop.run(self.client.fetch_generation_tracks(generation_ids))
+
+    def check_generation_status(self, generation_ids: list[str]) -> Dict[str, Any]:
+        return self._loop.run(self.client.check_generation_status(generation_ids))
+
+    def get_credits(self) -> Dict[str, Any]:
+        return self._loop.run(self.client.get_credits())
+
+    def download_audio(self, audio_url: str) -> bytes:
+        return self._loop.run(self.client.download_audio(audio_url))
@@ -1,15 +1,30 @@
-import librosa
 import numpy as np
 import soundfile as sf
 import random
-import whisper
 import os
 import sys
-import torch
 import importlib
-import json
 import mutagen
 import audioread
+import subprocess
+from lazy_imports import lazy_import
+from instrumentation import SegmentProgressPool, timed, whisper_progress
+from metrics import AUDIO_DECODED_BYTES
+from model_cache import ModelCache
+from feature_index import feature_vector
+from genre_library import reference_library
+from genre_registry import GENRE_RULES
+
+# --- Heavy ML dependencies are imported on first use ---
+# Importing torch, librosa, whisper and demucs takes several seconds, so they are
+# resolved lazily. This keeps the web server and GUI shell fast to start.
+librosa = lazy_import('librosa')
+whisper = lazy_import('whisper')
+torch = lazy_import('torch')
+torchaudio = lazy_import('torchaudio')
+demucs_apply = lazy_import('demucs.apply')
+demucs_pretrained = lazy_import('demucs.pretrained')
+demucs_audio = lazy_import('demucs.audio')
 
 # --- Set TORCH_HOME to use a local cache for pretrained models ---
 # This ensures that models are downloaded within the project directory
@@ -26,18 +41,12 @@ os.environ['TORCH_HOME'] = torch_home_path
 # The hub directory will be created inside this path by torch.hub
 os.makedirs(os.path.join(torch_home_path, 'hub'), exist_ok=True)
 
-from demucs.apply import apply_model
-from demucs.pretrained import get_model
-from demucs.audio import AudioFile, convert_audio
-import torchaudio
-import subprocess
-
 # --- Demucs wrapper (unchanged) ---
 def load_track(track, audio_channels, samplerate):
     errors = {}
     wav = None
     try:
-        wav = AudioFile(track).read(
+        wav = demucs_audio.AudioFile(track).read(
             streams=0,
             samplerate=samplerate,
             channels=audio_channels
@@ -53,7 +62,7 @@ def load_track(track, audio_channels, samplerate):
         except RuntimeError as err:
             errors['torchaudio'] = err.args[0]
         else:
-            wav = convert_audio(wav, sr, samplerate, audio_channels)
+            wav = demucs_audio.convert_audio(wav, sr, samplerate, audio_channels)
 
     if wav is None:
         raise RuntimeError(f"Could not load file {track}. Errors: {errors}")
@@ -62,7 +71,7 @@ def load_track(track, audio_channels, samplerate):
 
 class Separator:
     def __init__(self, model_name='htdemucs_ft', device='cpu'):
-        self.model = get_model(name=model_name)
+        self.model = demucs_pretrained.get_model(name=model_name)
         if self.model is None:
             raise ValueError(f"Could not find model {model_name}")
         self.model.to(device)
@@ -71,15 +80,23 @@ class Separator:
         self.samplerate = self.model.samplerate
         self.audio_channels = self.model.audio_channels
 
-    def separate_audio_file(self, file_path):
+    def separate_audio_file(self, file_path, progress_callback=None):
+        """
+        Separates a file into its sources. If given, `progress_callback(fraction)`
+        is called as each Demucs segment completes.
+        """
         wav = load_track(file_path, self.audio_channels, self.samplerate)
         ref = wav.mean(0)
         wav = (wav - ref.mean()) / (ref.std() + 1e-8)  # safer normalization
         wav = wav.to(self.device)
 
+        pool = None
+        if progress_callback is not None:
+            pool = SegmentProgressPool(len(getattr(self.model, 'models', [self.model])), progress_callback)
+
         with torch.amp.autocast(self.device):
-            sources = apply_model(
-                self.model, wav[None], device=self.device, split=True, overlap=0.25, progress=True
+            sources = demucs_apply.apply_model(
+                self.model, wav[None], device=self.device, split=True, overlap=0.25, pool=pool
             )[0]
         sources = sources * ref.std() + ref.mean()
 
@@ -94,28 +111,27 @@ class Separator:
 class AudioAnalyzer:
     """Analyzes audio files to extract musical features"""
 
-    def __init__(self, audio_path, device='cpu', model_cache=None):
+    def __init__(self, audio_path, device='cpu', model_cache=None, progress_callback=None):
         self.audio_path = audio_path
         self.y = None
         self.sr = None
         self.features = {}
+        self.timings = {}  # Seconds spent in each stage, e.g. 'decode', 'feature.tempo', 'separation'
+        self.genre_candidates = []  # [(genre, score)] from the reference library, best first
         self.device = device
-        self.model_cache = model_cache if model_cache is not None else {}
-        self.genre_rules = self._load_genre_rules()
+        self.model_cache = model_cache if model_cache is not None else ModelCache()
+        self.progress_callback = progress_callback  # Called as progress_callback(stage, fraction, detail)
+        self.rules = GENRE_RULES.current()  # One version of the genre rules for the whole analysis
 
-    def _load_genre_rules(self):
-        """Loads genre rules from the external JSON file."""
-        try:
-            with open("genre_rules.json", "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Warning: Could not load or parse genre_rules.json: {e}. Using an empty list.")
-            return []
+    def _report_progress(self, stage, fraction, detail=None):
+        if self.progress_callback is not None:
+            self.progress_callback(stage, fraction, detail)
 
     def load_audio(self):
         """Load audio file"""
         try:
             self.y, self.sr = librosa.load(self.audio_path, sr=22050, mono=True)
+            AUDIO_DECODED_BYTES.inc(self.y.nbytes)
         except audioread.exceptions.NoBackendError as e:
             raise RuntimeError(
                 "Failed to load audio file because no audio backend was found. "
@@ -200,23 +216,37 @@ class AudioAnalyzer:
         
         return round(float(tempo), 1)
 
+    def feature_extractors(self):
+        """Returns the (name, method) pairs run by analyze(), in order."""
+        # The order is important, as get_tempo may use other features.
+        return [
+            ('energy', self.get_energy),
+            ('energy_value', self.get_energy_value),
+            ('spectral_centroid', self.get_spectral_centroid),
+            ('tempo', self.get_tempo),
+            ('key', self.get_key),
+            ('zero_crossing_rate', self.get_zero_crossing_rate),
+            ('mfcc', self.get_mfcc),
+            ('chroma', self.get_chroma),
+            ('spectral_rolloff', self.get_spectral_rolloff),
+            ('spectral_contrast', self.get_spectral_contrast),
+            ('spectral_bandwidth', self.get_spectral_bandwidth),
+            ('tonnetz', self.get_tonnetz),
+        ]
+
     def analyze(self):
         """Perform complete audio analysis"""
-        self.load_audio()
-        
-        # The order is important, as get_tempo may use other features.
-        self.features['energy'] = self.get_energy()
-        self.features['energy_value'] = self.get_energy_value()
-        self.features['spectral_centroid'] = self.get_spectral_centroid()
-        self.features['tempo'] = self.get_tempo()
-        self.features['key'] = self.get_key()
-        self.features['zero_crossing_rate'] = self.get_zero_crossing_rate()
-        self.features['mfcc'] = self.get_mfcc()
-        self.features['chroma'] = self.get_chroma()
-        self.features['spectral_rolloff'] = self.get_spectral_rolloff()
-        self.features['spectral_contrast'] = self.get_spectral_contrast()
-        self.features['spectral_bandwidth'] = self.get_spectral_bandwidth()
-        self.features['tonnetz'] = self.get_tonnetz()
+        self._report_progress('decode', 0.0)
+        with timed(self.timings, 'decode'):
+            self.load_audio()
+        self._report_progress('decode', 1.0)
+
+        extractors = self.feature_extractors()
+        for i, (name, extractor) in enumerate(extractors):
+            self._report_progress('features', i / len(extractors), name.replace('_', ' '))
+            with timed(self.timings, f'feature.{name}'):
+                self.features[name] = extractor()
+        self._report_progress('features', 1.0)
         
         return self.features
 
@@ -304,64 +334,29 @@ class AudioAnalyzer:
 
     def classify_genre(self, selected_genre=None):
         """
-        Classify genre based on features using a rule-based engine.
-        If a genre is selected, it will be used directly.
+        Classify genre based on features. If a genre is selected, it will be used directly.
+        Otherwise the nearest tracks of the reference library decide when a library has been
+        built, falling back to soft-scoring every genre rule.
         """
         if selected_genre and selected_genre != "Auto-detect":
             return selected_genre
-            
-        # --- Feature Extraction ---
-        tempo = self.features.get('tempo', 0)
-        energy_val = self.get_energy_value() # Get a numerical energy value
-        zcr = self.features.get('zero_crossing_rate', 0)
-        spectral_centroid = self.features.get('spectral_centroid', 0)
 
-        # --- Rule Matching ---
-        for entry in self.genre_rules:
-            rules = entry.get('rules', [])
-            
-            # Handle OR conditions (rules as a list)
-            if isinstance(rules, list):
-                if any(self._match_rule(rule_set, tempo, energy_val, zcr, spectral_centroid) for rule_set in rules):
-                    return entry['genre']
-            # Handle AND conditions (rules as a dictionary)
-            elif self._match_rule(rules, tempo, energy_val, zcr, spectral_centroid):
-                return entry['genre']
-                
+        library = reference_library()
+        vector = feature_vector(self.features) if library is not None else None
+        if vector is not None:
+            self.genre_candidates = library.classify(vector)
+        else:
+            self.genre_candidates = self.score_genre_rules()
+        if self.genre_candidates:
+            return self.genre_candidates[0][0]
         return "Pop" # Default genre
 
-    def _match_rule(self, rules, tempo, energy_val, zcr, spectral_centroid):
-        """Check if a set of rules matches the audio features."""
-        
-        # Match tempo
-        if 'tempo' in rules:
-            rule = rules['tempo']
-            if 'min' in rule and tempo < rule['min']: return False
-            if 'max' in rule and tempo > rule['max']: return False
-
-        # Match energy
-        if 'energy' in rules:
-            rule = rules['energy']
-            # Handle numerical ranges for energy
-            if 'min' in rule and energy_val < rule['min']: return False
-            if 'max' in rule and energy_val > rule['max']: return False
-            # Handle string-based energy levels ('low', 'medium', 'high')
-            if 'is' in rule and self.get_energy() != rule['is']: return False
-            if 'not' in rule and self.get_energy() == rule['not']: return False
-
-        # Match Zero-Crossing Rate
-        if 'zero_crossing_rate' in rules:
-            rule = rules['zero_crossing_rate']
-            if 'min' in rule and zcr < rule['min']: return False
-            if 'max' in rule and zcr > rule['max']: return False
-
-        # Match Spectral Centroid
-        if 'spectral_centroid' in rules:
-            rule = rules['spectral_centroid']
-            if 'min' in rule and spectral_centroid < rule['min']: return False
-            if 'max' in rule and spectral_centroid > rule['max']: return False
-            
-        return True
+    def score_genre_rules(self, k=5):
+        """Ranks the genres of genre_rules.json by how well the features fit their bounds: [(genre, score)], best first."""
+        features = dict(self.features)
+        if 'energy_value' not in features and self.y is not None:
+            features['energy_value'] = self.get_energy_value()
+        return self.rules.scorer.rank(features, k=k)
 
     def get_energy_value(self):
         """Return the raw numerical energy value."""
@@ -395,7 +390,7 @@ class AudioAnalyzer:
         """Detect likely instruments based on the genre rules."""
         
         # Find the corresponding genre rule
-        genre_rule = next((rule for rule in self.genre_rules if rule['genre'] == genre), None)
+        genre_rule = self.rules.get(genre)
         
         if genre_rule and 'typical_instruments' in genre_rule:
             instruments = genre_rule['typical_instruments']
@@ -463,8 +458,16 @@ class AudioAnalyzer:
         final_vocal_path = None
         try:
             # --- 1. Separate vocals using Demucs ---
-            separator = Separator(model_name=demucs_model, device=self.device)
-            _, separated_tracks = separator.separate_audio_file(self.audio_path)
+            self._report_progress('separation', 0.0, demucs_model)
+            with timed(self.timings, 'separation.model_load'):
+                separator = self.model_cache.get_or_load(
+                    f"demucs_{demucs_model}", lambda: Separator(model_name=demucs_model, device=self.device)
+                )
+            with timed(self.timings, 'separation'):
+                _, separated_tracks = separator.separate_audio_file(
+                    self.audio_path,
+                    progress_callback=lambda fraction: self._report_progress('separation', fraction, demucs_model)
+                )
             
             vocal_track = separated_tracks.get('vocals')
             if vocal_track is not None:
@@ -484,17 +487,24 @@ class AudioAnalyzer:
                 return {'lyrics': None, 'gender': None, 'vocal_path': None}
 
             # --- 2. Transcribe vocals using Whisper ---
+            self._report_progress('transcription', 0.0, model_quality)
             model_key = f"whisper_{model_quality}"
             if model_key not in self.model_cache:
                 print(f"Loading Whisper model '{model_quality}' onto device '{self.device}'...")
-                self.model_cache[model_key] = whisper.load_model(model_quality, device=self.device)
-            
-            model = self.model_cache[model_key]
-            result = model.transcribe(vocal_path, fp16=torch.cuda.is_available())
+            with timed(self.timings, 'transcription.model_load'):
+                model = self.model_cache.get_or_load(
+                    model_key, lambda: whisper.load_model(model_quality, device=self.device)
+                )
+            with timed(self.timings, 'transcription'), \
+                    whisper_progress(lambda fraction: self._report_progress('transcription', fraction, model_quality)):
+                result = model.transcribe(vocal_path, fp16=torch.cuda.is_available())
             lyrics = result['text']
 
             # --- 3. Detect vocal gender from the separated track ---
-            gender = self._detect_vocal_gender(vocal_path)
+            self._report_progress('gender_detection', 0.0)
+            with timed(self.timings, 'gender_detection'):
+                gender = self._detect_vocal_gender(vocal_path)
+            self._report_progress('gender_detection', 1.0)
 
             return {'lyrics': lyrics, 'gender': gender, 'vocal_path': final_vocal_path}
         except Exception as e:
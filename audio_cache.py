@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import config
+from metrics import AUDIO_CACHE_BYTES, AUDIO_CACHE_EVICTIONS, AUDIO_CACHE_HITS, AUDIO_CACHE_MISSES
+from suno_client import SunoError, open_audio_stream, pooled_session
+
+_CLIP_ID = re.compile(r'[A-Za-z0-9_-]{1,128}')
+_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.ogg', '.flac')
+
+
+def is_valid_clip_id(clip_id):
+    return bool(clip_id) and _CLIP_ID.fullmatch(clip_id) is not None
+
+
+class AudioCache:
+    """
+    Size-bounded LRU cache of generated track audio on disk, keyed by clip ID.
+    Files are written to a temporary name and renamed into place, so readers
+    only ever see complete files. Concurrent requests for the same clip share a
+    single download, and the least recently used files are deleted once the
+    cache exceeds `max_bytes`. The index is rebuilt from the directory on start.
+    """
+
+    def __init__(self, directory=config.AUDIO_CACHE_FOLDER, max_bytes=config.AUDIO_CACHE_MAX_BYTES, prefetch_workers=2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.session = pooled_session()
+        self._entries = OrderedDict()  # clip_id -> (path, size), least recently used first
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._prefetches = {}  # clip_id -> Future of an in-flight prefetch
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="audio-prefetch")
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            clip_id, ext = os.path.splitext(name)
+            path = os.path.join(self.directory, name)
+            if ext in _EXTENSIONS and is_valid_clip_id(clip_id):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, clip_id, path, stat.st_size))
+            elif name.startswith('.tmp-'):
+                os.remove(path)  # Left over from an interrupted download
+        for _, clip_id, path, size in sorted(files):
+            self._entries[clip_id] = (path, size)
+        self._update_size_metric()
+
+    def _update_size_metric(self):
+        AUDIO_CACHE_BYTES.set(sum(size for _, size in self._entries.values()))
+
+    def get(self, clip_id):
+        """Returns the path of a cached clip (marking it recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(clip_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(clip_id)
+        try:
+            os.utime(entry[0])  # Persist the LRU order across restarts
+        except OSError:
+            pass
+        return entry[0]
+
+    def fetch(self, clip_id, audio_url):
+        """Returns the path of a clip, downloading it once on a miss. Raises SunoError on failure."""
+        if not is_valid_clip_id(clip_id):
+            raise ValueError(f"Invalid clip ID: {clip_id!r}")
+        path = self.get(clip_id)
+        if path:
+            AUDIO_CACHE_HITS.inc()
+            return path
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(clip_id, threading.Lock())
+        with key_lock:
+            path = self.get(clip_id)
+            if path:
+                AUDIO_CACHE_HITS.inc()  # Another request downloaded it while this one waited
+                return path
+            AUDIO_CACHE_MISSES.inc()
+            try:
+                path, size = self._download(clip_id, audio_url)
+                self._add(clip_id, path, size)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(clip_id, None)
+            return path
+
+    def open_stream(self, clip_id, audio_url, chunk_size=64 * 1024):
+        """
+        Starts downloading a missing clip and returns (upstream response, iterable
+        of its bytes). The bytes are written to the cache as they are read, so a
+        player can start before the download has finished. Returns None if the
+        clip is cached or already being downloaded. Raises SunoError on failure.
+        """
+        if not is_valid_clip_id(clip_id):
+            raise ValueError(f"Invalid clip ID: {clip_id!r}")
+        key_lock = threading.Lock()
+        key_lock.acquire()
+        with self._lock:
+            if clip_id in self._entries or clip_id in self._key_locks:
+                return None
+            self._key_locks[clip_id] = key_lock
+        AUDIO_CACHE_MISSES.inc()
+        try:
+            response = open_audio_stream(self.session, audio_url)
+            if response.status_code != 200:
+                response.close()
+                raise SunoError(f"Failed to download audio from {audio_url}: HTTP {response.status_code}")
+        except BaseException:
+            self._release_key(clip_id, key_lock)
+            raise
+        return response, _CachingStream(self, clip_id, audio_url, response, key_lock, chunk_size)
+
+    def _release_key(self, clip_id, key_lock):
+        with self._lock:
+            self._key_locks.pop(clip_id, None)
+        key_lock.release()
+
+    def _path_for(self, clip_id, audio_url):
+        ext = os.path.splitext(urlparse(audio_url).path)[1].lower()
+        return os.path.join(self.directory, clip_id + (ext if ext in _EXTENSIONS else '.mp3'))
+
+    def _add(self, clip_id, path, size):
+        with self._lock:
+            self._entries[clip_id] = (path, size)
+            self._evict()
+
+    def prefetch(self, clip_id, audio_url):
+        """Downloads a clip in the background unless it is cached; returns a Future of its path."""
+        with self._lock:
+            future = self._prefetches.get(clip_id)
+            if future is None:
+                future = self._executor.submit(self.fetch, clip_id, audio_url)
+                self._prefetches[clip_id] = future
+                future.add_done_callback(lambda _: self._prefetch_done(clip_id))
+        return future
+
+    def prefetch_generation(self, generation):
+        """Prefetches every finished clip of a generation snapshot (usable as a poller subscriber)."""
+        for track in generation.get('results', []):
+            if track.get('audio_url') and is_valid_clip_id(track.get('id')):
+                self.prefetch(track['id'], track['audio_url'])
+
+    def _prefetch_done(self, clip_id):
+        with self._lock:
+            self._prefetches.pop(clip_id, None)
+
+    def _download(self, clip_id, audio_url):
+        path = self._path_for(clip_id, audio_url)
+        response = open_audio_stream(self.session, audio_url)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.directory)
+        try:
+            with response, os.fdopen(fd, 'wb') as f:
+                if response.status_code != 200:
+                    raise SunoError(f"Failed to download audio from {audio_url}: HTTP {response.status_code}")
+                for chunk in response.iter_content(64 * 1024):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        size = os.path.getsize(path)
+        logging.info(f"Cached audio for clip {clip_id} ({size / 1024:.0f} KiB)")
+        return path, size
+
+    def _evict(self):
+        """Deletes least recently used files until the cache fits (caller holds the lock)."""
+        total = sum(size for _, size in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            clip_id, (path, size) = self._entries.popitem(last=False)
+            try:
+                os.remove(path)
+            except OSError as e:
+                # e.g. still open by a reader on Windows; it is retried on the next eviction pass
+                logging.warning(f"Could not evict cached audio {path}: {e}")
+                self._entries[clip_id] = (path, size)
+                self._entries.move_to_end(clip_id, last=False)  # Still the next one to evict
+                break
+            total -= size
+            AUDIO_CACHE_EVICTIONS.inc()
+        self._update_size_metric()
+
+    def __contains__(self, clip_id):
+        with self._lock:
+            return clip_id in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class _CachingStream:
+    """
+    Iterates a streaming download while writing it to a temporary file, which
+    is renamed into the cache once the body has been read completely. Closing
+    it early (e.g. the client disconnected) discards the partial file.
+    """
+
+    def __init__(self, cache, clip_id, audio_url, response, key_lock, chunk_size):
+        self.cache = cache
+        self.clip_id = clip_id
+        self.audio_url = audio_url
+        self.response = response
+        self.key_lock = key_lock
+        self.chunk_size = chunk_size
+        self._chunks = None
+        self._released = False
+
+    def __iter__(self):
+        if self._chunks is None:
+            self._chunks = self._read()
+        return self._chunks
+
+    def _read(self):
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.cache.directory)
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in self.response.iter_content(self.chunk_size):
+                    f.write(chunk)
+                    yield chunk
+            path = self.cache._path_for(self.clip_id, self.audio_url)
+            os.replace(tmp_path, path)
+            complete = True
+            size = os.path.getsize(path)
+            self.cache._add(self.clip_id, path, size)
+            logging.info(f"Cached audio for clip {self.clip_id} while streaming it ({size / 1024:.0f} KiB)")
+        finally:
+            if not complete:
+                os.remove(tmp_path)
+            self._release()
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self.response.close()
+            self.cache._release_key(self.clip_id, self.key_lock)
+
+    def close(self):
+        if self._chunks is not None:
+            self._chunks.close()  # Runs the cleanup of an unfinished read
+        self._release()
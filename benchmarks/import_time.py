@@ -0,0 +1,90 @@
+"""
+Import-time benchmark.
+
+Imports each entry-point module in a fresh interpreter, measures how long the
+import takes and checks that none of the heavy ML modules (torch, librosa,
+whisper, demucs, ...) were pulled in as a side effect. Exits with a non-zero
+status when a module exceeds its time budget or imports the ML stack eagerly,
+so it can guard against start-up regressions in CI.
+
+Usage:
+    python benchmarks/import_time.py [--budget SECONDS] [--repeat N] [modules ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from lazy_imports import HEAVY_MODULES
+
+DEFAULT_MODULES = ['app', 'gui', 'audio_analyzer', 'prompt_generator', 'suno_client']
+FORBIDDEN_MODULES = sorted(set(HEAVY_MODULES + ['pygame', 'demucs']))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {forbidden!r} if name in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'heavy_modules': loaded}}))
+"""
+
+
+def measure(module, repeat):
+    """Imports `module` `repeat` times in fresh interpreters and returns the timings."""
+    timings, heavy = [], set()
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, forbidden=FORBIDDEN_MODULES)],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'import failed'}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        timings.append(result['seconds'])
+        heavy.update(result['heavy_modules'])
+    return {
+        'median_seconds': round(statistics.median(timings), 4),
+        'max_seconds': round(max(timings), 4),
+        'heavy_modules': sorted(heavy)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure start-up import time of the application modules.")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help="Modules to import.")
+    parser.add_argument('--budget', type=float, default=2.0, help="Maximum median import time in seconds.")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of fresh interpreters per module.")
+    parser.add_argument('--output', help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results, failed = {}, False
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        results[module] = result
+        if 'error' in result:
+            failed = True
+            print(f"{module:<20} ERROR  {result['error']}")
+            continue
+        over_budget = result['median_seconds'] > args.budget
+        status = "SLOW" if over_budget else "OK"
+        if result['heavy_modules']:
+            status = "EAGER"
+        failed = failed or over_budget or bool(result['heavy_modules'])
+        heavy = f"  (imported: {', '.join(result['heavy_modules'])})" if result['heavy_modules'] else ""
+        print(f"{module:<20} {status:<6} median {result['median_seconds']:.3f}s  max {result['max_seconds']:.3f}s{heavy}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
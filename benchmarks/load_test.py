@@ -0,0 +1,299 @@
+"""
+Load-test harness for the Flask app.
+
+Runs N concurrent synthetic clients against the real app and reports
+throughput, p50/p95/p99 latency and error rates per endpoint. Each client
+repeatedly picks an operation according to the traffic mix:
+
+    analyze             POST /api/analyze with synthetic audio, reading the SSE stream to the end
+    preprocess          POST /api/preprocess
+    generate            POST /api/generate-music
+    status              GET  /api/generation-status/<ids> for a generation started by the harness
+    credits             GET  /api/credits
+    history             GET  /api/history
+    generation_history  GET  /api/generation-history
+
+By default the app and the Suno mock (suno_mock_server.py) are started
+in-process on free localhost ports under waitress, so no credits are spent.
+Use --target to load an already running instance instead.
+
+Usage:
+    python benchmarks/load_test.py --clients 16 --duration 60 \\
+        --mix status=10,history=5,generation_history=2,preprocess=2,analyze=1 \\
+        [--target http://127.0.0.1:5000] [--mock-latency uniform:0.05,0.3] [--output load.json]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import soundfile as sf
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from synthetic_audio import SAMPLE_RATE, song
+
+DEFAULT_MIX = 'status=10,history=5,generation_history=2,credits=1,preprocess=2,generate=1,analyze=1'
+API_KEY = 'load-test-key'
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _serve_in_thread(wsgi_app, threads):
+    """Serves a WSGI app with waitress on a free localhost port and returns its base URL."""
+    from waitress import create_server
+    server = create_server(wsgi_app, host='127.0.0.1', port=_free_port(), threads=threads)
+    threading.Thread(target=server.run, name="load-test-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.effective_port}"
+
+
+def start_in_process(app_threads, mock_settings):
+    """Starts the Suno mock and the app in this process and points the app at the mock."""
+    from suno_mock_server import create_app
+    mock_url = _serve_in_thread(create_app(mock_settings), threads=32)
+    os.chdir(REPO_ROOT)
+    import config
+    config.SUNO_API_URL = mock_url
+
+    # Keep the user's history and uploads untouched by the synthetic traffic. The paths are
+    # set before the app is imported, since importing it opens the history and the caches.
+    scratch = tempfile.mkdtemp(prefix='load_test_')
+    config.HISTORY_DB = os.path.join(scratch, 'history.db')
+    config.HISTORY_FILE = os.path.join(scratch, 'analysis_history.json')
+    config.GENERATION_HISTORY_FILE = os.path.join(scratch, 'generation_history.json')
+    config.UPLOAD_FOLDER = os.path.join(scratch, 'uploads')
+    config.AUDIO_CACHE_FOLDER = os.path.join(config.UPLOAD_FOLDER, 'audio_cache')
+    config.PROFILE_FOLDER = os.path.join(config.UPLOAD_FOLDER, 'profiles')
+    import app as app_module
+    return _serve_in_thread(app_module.app, threads=app_threads), mock_url
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects (latency, ok, status) samples per endpoint from all client threads."""
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok, status):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((seconds, ok, status))
+
+    def report(self, elapsed):
+        report = {}
+        with self.lock:
+            items = sorted(self.samples.items())
+        for endpoint, samples in items:
+            latencies = sorted(s[0] for s in samples)
+            errors = [s for s in samples if not s[1]]
+            statuses = {}
+            for _, _, status in errors:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            report[endpoint] = {
+                'requests': len(samples),
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+                'max_ms': round(latencies[-1] * 1000, 1),
+                'error_rate': round(len(errors) / len(samples), 4),
+                'errors_by_status': statuses,
+            }
+        return report
+
+
+class Client:
+    """One synthetic user issuing operations from the mix until the deadline."""
+
+    def __init__(self, index, base_url, args, recorder, audio, generations):
+        self.index = index
+        self.base_url = base_url
+        self.args = args
+        self.recorder = recorder
+        self.audio = audio
+        self.generations = generations
+        self.rng = random.Random(index)
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f"Bearer {API_KEY}"
+        self.upload_count = 0
+        self.generate_count = 0
+
+    def _upload(self):
+        """Returns the synthetic upload, made unique per request unless coalescing is being tested."""
+        if self.args.identical_uploads:
+            return self.audio
+        self.upload_count += 1
+        audio, _ = sf.read(io.BytesIO(self.audio), dtype='float32')
+        audio[0] += 1e-4 * (self.index * 100003 + self.upload_count)  # Changes the content hash only
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, SAMPLE_RATE, format='WAV')
+        return buffer.getvalue()
+
+    def _timed(self, endpoint, func):
+        start = time.perf_counter()
+        try:
+            ok, status = func()
+        except requests.RequestException as e:
+            ok, status = False, type(e).__name__
+        self.recorder.record(endpoint, time.perf_counter() - start, ok, status)
+
+    def analyze(self):
+        files = {'audio': ('load_test.wav', self._upload(), 'audio/wav')}
+        data = {'model_quality': self.args.model_quality, 'demucs_model': self.args.demucs_model}
+        with self.session.post(f"{self.base_url}/api/analyze", files=files, data=data, stream=True, timeout=3600) as response:
+            if response.status_code != 200:
+                return False, response.status_code
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[5:])
+                if 'error' in event:
+                    return False, 'analysis_error'
+                if 'result' in event:
+                    return True, 200
+        return False, 'stream_ended'
+
+    def preprocess(self):
+        files = {'audio': ('load_test.wav', self._upload(), 'audio/wav')}
+        response = self.session.post(f"{self.base_url}/api/preprocess", files=files, timeout=120)
+        return response.ok, response.status_code
+
+    def generate(self):
+        # A distinct prompt and Idempotency-Key per request, so every call reaches the mock instead of a replay
+        self.generate_count += 1
+        payload = {'prompt': f"load test song {self.index}-{self.generate_count}", 'is_custom': False,
+                   'instrumental': False}
+        headers = {'Idempotency-Key': f"load-test-{self.index}-{self.generate_count}-{time.time_ns()}"}
+        response = self.session.post(f"{self.base_url}/api/generate-music", json=payload, headers=headers, timeout=120)
+        if response.ok:
+            clips = response.json()
+            ids = [clip['id'] for clip in clips if 'id' in clip] if isinstance(clips, list) else []
+            if ids:
+                self.generations.append(','.join(ids))
+        return response.ok, response.status_code
+
+    def status(self):
+        if not self.generations:
+            return self.generate()
+        ids = self.rng.choice(self.generations)
+        response = self.session.get(f"{self.base_url}/api/generation-status/{ids}", timeout=120)
+        return response.ok, response.status_code
+
+    def _get(self, path):
+        response = self.session.get(f"{self.base_url}{path}", timeout=120)
+        return response.ok, response.status_code
+
+    def run(self, mix, deadline, max_requests):
+        operations = {
+            'analyze': self.analyze,
+            'preprocess': self.preprocess,
+            'generate': self.generate,
+            'status': self.status,
+            'credits': lambda: self._get('/api/credits'),
+            'history': lambda: self._get('/api/history'),
+            'generation_history': lambda: self._get('/api/generation-history'),
+        }
+        names, weights = zip(*mix.items())
+        issued = 0
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            name = self.rng.choices(names, weights)[0]
+            self._timed(name, operations[name])
+            issued += 1
+            if self.args.think_time:
+                time.sleep(self.rng.uniform(0, 2 * self.args.think_time))
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'analyze', 'preprocess', 'generate', 'status', 'credits', 'history', 'generation_history'}
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the Flask app with concurrent synthetic clients.")
+    parser.add_argument('--target', help="Base URL of a running app. Default: start app and Suno mock in-process.")
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help="Test length in seconds.")
+    parser.add_argument('--requests-per-client', type=int, help="Stop each client after this many requests.")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Operation weights, e.g. 'status=10,analyze=1'.")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Mean pause between a client's requests.")
+    parser.add_argument('--audio-seconds', type=float, default=10.0, help="Length of the synthetic upload.")
+    parser.add_argument('--identical-uploads', action='store_true',
+                        help="Send byte-identical uploads so concurrent analyses coalesce.")
+    parser.add_argument('--model-quality', default='tiny')
+    parser.add_argument('--demucs-model', default='htdemucs_ft')
+    parser.add_argument('--app-threads', type=int, default=8, help="Waitress threads for the in-process app.")
+    parser.add_argument('--mock-latency', default='uniform:0.05,0.3', help="Latency spec for the in-process mock.")
+    parser.add_argument('--mock-error-rate', type=float, default=0.0, help="503 injection rate of the in-process mock.")
+    parser.add_argument('--output', help="Optional path to write the report as JSON.")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.target:
+        base_url = args.target.rstrip('/')
+    else:
+        mock_settings = {'latency': args.mock_latency, 'error_rate_503': args.mock_error_rate, 'credits': 10 ** 9,
+                         'audio_seconds': 5.0, 'seed': 0}
+        base_url, mock_url = start_in_process(args.app_threads, mock_settings)
+        print(f"App under test: {base_url}  (Suno mock: {mock_url})")
+
+    buffer = io.BytesIO()
+    sf.write(buffer, song(duration=args.audio_seconds), SAMPLE_RATE, format='WAV')
+    audio = buffer.getvalue()
+
+    recorder = Recorder()
+    generations = []
+    clients = [Client(i, base_url, args, recorder, audio, generations) for i in range(args.clients)]
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(target=client.run, args=(mix, deadline, args.requests_per_client), daemon=True)
+        for client in clients
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = recorder.report(elapsed)
+    print(f"\n{args.clients} clients, {elapsed:.1f}s")
+    print(f"{'endpoint':<20} {'reqs':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:<20} {row['requests']:>6} {row['throughput_rps']:>8.2f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate'] * 100:>6.1f}%")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'clients': args.clients, 'elapsed': round(elapsed, 2), 'mix': mix, 'endpoints': report}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
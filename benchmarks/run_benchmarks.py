@@ -0,0 +1,196 @@
+"""
+Analysis benchmark suite.
+
+Renders deterministic synthetic fixtures (see synthetic_audio.py) at several
+durations and times every analysis stage on them: decoding, each feature
+extractor, genre/mood classification, vocal separation, Whisper transcription
+and prompt generation. Results are compared against a JSON baseline and the
+run fails when any stage is slower than the baseline by more than the
+threshold. Everything runs offline on a CPU.
+
+Separation uses a stub by default (it measures file I/O and the surrounding
+pipeline only); pass --separator demucs to time a real Demucs model.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--durations 10 30] [--repeat 3]
+        [--baseline benchmarks/baseline.json] [--update-baseline]
+        [--threshold 0.25] [--separator stub|demucs] [--whisper-model tiny|none]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from synthetic_audio import FIXTURES, write_fixture
+from audio_analyzer import AudioAnalyzer, Separator
+from prompt_generator import PromptGenerator
+from model_cache import ModelCache
+from lazy_imports import lazy_import
+
+whisper = lazy_import('whisper')
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+# Stages faster than this are dominated by timer noise and never count as regressions.
+MIN_COMPARABLE_SECONDS = 0.01
+
+
+class StubSeparator:
+    """Stands in for Demucs: reads the file and returns it as the 'vocals' stem."""
+    samplerate = 44100
+
+    def separate_audio_file(self, file_path, progress_callback=None):
+        audio, self.samplerate = sf.read(file_path, dtype='float32', always_2d=True)
+        return None, {'vocals': audio.T, 'other': np.zeros_like(audio.T)}
+
+
+def _time(func, repeat):
+    """Runs `func` `repeat` times and returns (median seconds, last result)."""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings), 5), result
+
+
+def benchmark_fixture(path, expected, args, model_cache, separator):
+    """Times every stage on one fixture file; returns (stage timings, detected facts, errors)."""
+    stages, errors = {}, {}
+    random.seed(0)  # prompt generation picks descriptors at random
+    analyzer = AudioAnalyzer(path, device='cpu', model_cache=model_cache)
+
+    stages['load_audio'], _ = _time(analyzer.load_audio, args.repeat)
+    for name, extractor in analyzer.feature_extractors():
+        stages[f'feature.{name}'], analyzer.features[name] = _time(extractor, args.repeat)
+
+    stages['classify_genre'], genre = _time(analyzer.classify_genre, args.repeat)
+    mood = analyzer.classify_mood()
+    instruments = analyzer.detect_instruments(genre)
+    has_vocals = analyzer.detect_vocals()
+
+    try:
+        stages['separation'], _ = _time(lambda: separator.separate_audio_file(path), 1)
+    except Exception as e:
+        errors['separation'] = str(e)
+
+    if args.whisper_model != 'none':
+        try:
+            model = model_cache.get_or_load(
+                f"whisper_{args.whisper_model}",
+                lambda: whisper.load_model(args.whisper_model, device='cpu')
+            )
+            stages['transcription'], _ = _time(lambda: model.transcribe(path, fp16=False), 1)
+        except Exception as e:
+            errors['transcription'] = str(e)
+
+    generator = PromptGenerator(analyzer.features, genre, mood, instruments, has_vocals)
+    stages['prompt_generation'], _ = _time(generator.generate_variations, args.repeat)
+
+    detected = {fact: analyzer.features.get(fact) for fact in expected}
+    return stages, detected, errors
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of (case, stage, baseline, current) for stages slower than the threshold allows."""
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get('results', {}).get(case, {}).get('stages', {})
+        for stage, seconds in current['stages'].items():
+            reference = previous.get(stage)
+            if reference is None or reference < MIN_COMPARABLE_SECONDS:
+                continue
+            if seconds > reference * (1 + threshold):
+                regressions.append((case, stage, reference, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every analysis stage on synthetic audio.")
+    parser.add_argument('--fixtures', nargs='*', default=list(FIXTURES), choices=list(FIXTURES))
+    parser.add_argument('--durations', nargs='*', type=float, default=[10.0, 30.0], help="Fixture lengths in seconds.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions of each cheap stage (median is kept).")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare against.")
+    parser.add_argument('--update-baseline', action='store_true', help="Write the results as the new baseline.")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown per stage (0.25 = 25%%).")
+    parser.add_argument('--separator', choices=['stub', 'demucs'], default='stub')
+    parser.add_argument('--demucs-model', default='htdemucs', help="Demucs model for --separator demucs.")
+    parser.add_argument('--whisper-model', default='tiny', help="Whisper model to time, or 'none' to skip.")
+    parser.add_argument('--output', help="Optional path to also write this run's results.")
+    args = parser.parse_args()
+
+    model_cache = ModelCache()
+    separator = StubSeparator() if args.separator == 'stub' else Separator(model_name=args.demucs_model, device='cpu')
+
+    results, failed = {}, False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for duration in args.durations:
+            for name in args.fixtures:
+                case = f"{name}@{duration:g}s"
+                path = os.path.join(tmp_dir, f"{name}_{duration:g}.wav")
+                expected = write_fixture(path, name, duration)
+                try:
+                    stages, detected, errors = benchmark_fixture(path, expected, args, model_cache, separator)
+                except Exception as e:
+                    print(f"{case:<28} ERROR  {e}")
+                    results[case] = {'stages': {}, 'error': str(e)}
+                    failed = True
+                    continue
+                results[case] = {'stages': stages, 'expected': expected, 'detected': detected, 'errors': errors}
+                facts = ", ".join(f"{k} {detected[k]} (expected {v})" for k, v in expected.items())
+                print(f"{case:<28} total {sum(stages.values()):8.3f}s  {facts}")
+                for stage, error in errors.items():
+                    print(f"{'':<28} {stage} skipped: {error}")
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+            'separator': args.separator if args.separator == 'stub' else f"demucs:{args.demucs_model}",
+            'whisper_model': args.whisper_model,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if failed:
+        print("Some fixtures failed; the baseline was not compared or updated.")
+    elif args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+    else:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for case, stage, reference, seconds in regressions:
+            print(f"REGRESSION {case} {stage}: {reference:.4f}s -> {seconds:.4f}s (+{(seconds / reference - 1) * 100:.0f}%)")
+        if regressions:
+            failed = True
+        else:
+            print(f"No stage regressed by more than {args.threshold * 100:.0f}% against {args.baseline}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
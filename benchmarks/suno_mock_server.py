@@ -0,0 +1,378 @@
+"""
+Local stand-in for the Suno API.
+
+Implements the endpoints SunoClient uses, with configurable latency and fault
+injection, so throughput, retries and polling can be exercised without
+spending credits:
+
+    POST /api/v1/generate            -> list of 2 clips (status 'submitted'); with a
+                                        'callback_url' the clips complete after
+                                        callback_delay seconds and are POSTed there
+    GET  /api/v1/generate/<ids>      -> list of clips; each completes after N polls
+    GET  /api/v1/generate/credit     -> {"data": <credits>}
+    GET  /audio/<clip_id>.<mp3|wav>  -> synthetic audio (Range requests supported)
+
+Control endpoints (no auth): GET/POST /mock/config, GET /mock/stats, POST /mock/reset.
+
+Latency specs: 'fixed:0.1', 'uniform:0.05,0.3', 'normal:0.2,0.05',
+'lognormal:-1.6,0.5' (mu, sigma of ln seconds) or 'exp:0.2' (mean).
+
+Usage:
+    python benchmarks/suno_mock_server.py --port 8055 --latency uniform:0.05,0.3 \\
+        --error-rate-503 0.05 --error-rate-429 0.02 --polls-to-complete 3
+    SUNO_API_URL=http://127.0.0.1:8055 python app.py
+    SUNO_API_URL=http://127.0.0.1:8055 SUNO_CALLBACK_BASE_URL=http://127.0.0.1:5000 python app.py  # with callbacks
+"""
+import argparse
+import io
+import logging
+import random
+import threading
+import time
+import uuid
+import wave
+import zlib
+
+import numpy as np
+import requests
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_SETTINGS = {
+    'latency': 'fixed:0',           # Applied to every API endpoint without an override
+    'endpoint_latency': {},         # e.g. {'status': 'exp:0.1', 'audio': 'uniform:0.1,0.5'}
+    'error_rate_503': 0.0,
+    'error_rate_429': 0.0,
+    'error_rate_401': 0.0,
+    'retry_after': 1,               # Seconds advertised in Retry-After on injected 429s
+    'valid_keys': [],               # Empty list accepts any bearer token
+    'polls_to_complete': 3,
+    'callback_delay': 2.0,          # Seconds until clips of a generation with a callback_url complete
+    'callback_drop_rate': 0.0,      # Fraction of callbacks never sent (exercises the polling fallback)
+    'generation_failure_rate': 0.0,
+    'clips_per_generation': 2,
+    'credits': 1000,
+    'credits_per_generation': 10,
+    'audio_format': 'mp3',
+    'audio_seconds': 30.0,
+    'seed': None,
+}
+
+ENDPOINTS = ('generate', 'status', 'credit', 'audio')
+
+
+def parse_latency(spec):
+    """Turns a latency spec such as 'uniform:0.05,0.3' into a function returning seconds."""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',')] if params else []
+    samplers = {
+        'fixed': lambda rng: values[0] if values else 0.0,
+        'uniform': lambda rng: rng.uniform(values[0], values[1]),
+        'normal': lambda rng: rng.gauss(values[0], values[1]),
+        'lognormal': lambda rng: rng.lognormvariate(values[0], values[1]),
+        'exp': lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0,
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution '{kind}'. Use one of {sorted(samplers)}.")
+    sampler = samplers[kind]
+    sampler(random.Random(0))  # Validate the parameter count up front
+    return lambda rng: max(0.0, sampler(rng))
+
+
+def synthetic_wav(seconds, seed, sample_rate=22050):
+    """A short seeded chord as 16-bit mono WAV bytes."""
+    rng = np.random.default_rng(seed)
+    root = rng.choice([220.0, 246.94, 261.63, 293.66, 329.63])
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    chord = sum(np.sin(2 * np.pi * root * ratio * t) for ratio in (1.0, 1.25, 1.5)) / 3
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((chord * 0.5 * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def synthetic_mp3(seconds, seed):
+    """MP3 bytes: an encoded tone when lameenc is installed, otherwise valid silent MPEG-1 Layer III frames."""
+    try:
+        import lameenc
+    except ImportError:
+        # 128 kbps, 44.1 kHz, joint stereo; an all-zero frame body decodes as silence.
+        header = bytes([0xFF, 0xFB, 0x90, 0x64])
+        frame = header + bytes(144 * 128000 // 44100 - len(header))
+        return frame * int(seconds * 44100 / 1152)
+    wav = synthetic_wav(seconds, seed)
+    with wave.open(io.BytesIO(wav)) as f:
+        pcm, sample_rate = f.readframes(f.getnframes()), f.getframerate()
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(128)
+    encoder.set_in_sample_rate(sample_rate)
+    encoder.set_channels(1)
+    encoder.set_quality(7)
+    return bytes(encoder.encode(pcm) + encoder.flush())
+
+
+class MockState:
+    """Clips, credits and request counters shared by all request threads."""
+
+    def __init__(self, settings):
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.lock = threading.Lock()
+        self.rng = random.Random(self.settings['seed'])
+        self._latency = {}
+        self.reset()
+        self.configure({})
+
+    def reset(self):
+        with self.lock:
+            self.clips = {}
+            self.credits = self.settings['credits']
+            self.stats = {'requests': {}, 'injected': {}, 'callbacks': {}, 'generations': 0, 'completed_clips': 0}
+            self._audio_cache = {}
+
+    def configure(self, updates):
+        """Applies setting updates, validating the latency specs first."""
+        settings = dict(self.settings, **updates)
+        latency = {name: parse_latency(settings['endpoint_latency'].get(name, settings['latency'])) for name in ENDPOINTS}
+        with self.lock:
+            if 'credits' in updates:
+                self.credits = settings['credits']
+            if 'audio_format' in updates or 'audio_seconds' in updates:
+                self._audio_cache = {}
+            self.settings = settings
+            self._latency = latency
+
+    def count(self, key, name):
+        with self.lock:
+            self.stats[key][name] = self.stats[key].get(name, 0) + 1
+
+    def delay(self, endpoint):
+        with self.lock:
+            seconds = self._latency[endpoint](self.rng)
+        if seconds:
+            time.sleep(seconds)
+
+    def roll(self, probability):
+        with self.lock:
+            return self.rng.random() < probability
+
+    def audio(self, clip_id, fmt):
+        key = (clip_id, fmt)
+        with self.lock:
+            cached = self._audio_cache.get(key)
+        if cached is None:
+            seed = zlib.crc32(clip_id.encode('utf-8'))
+            seconds = self.settings['audio_seconds']
+            cached = synthetic_mp3(seconds, seed) if fmt == 'mp3' else synthetic_wav(seconds, seed)
+            with self.lock:
+                self._audio_cache[key] = cached
+        return cached
+
+
+def create_app(settings=None):
+    """Builds the mock server as a Flask app (importable by load tests)."""
+    state = MockState(settings or {})
+    app = Flask(__name__)
+    app.config['MOCK_STATE'] = state
+
+    def _check_request(endpoint):
+        """Counts the request, sleeps for the sampled latency and returns an injected error response or None."""
+        state.count('requests', endpoint)
+        state.delay(endpoint)
+        auth = request.headers.get('Authorization', '')
+        key = auth[len('Bearer '):] if auth.startswith('Bearer ') else None
+        valid_keys = state.settings['valid_keys']
+        if not key or (valid_keys and key not in valid_keys) or state.roll(state.settings['error_rate_401']):
+            state.count('injected', '401')
+            return jsonify({'detail': 'Unauthorized'}), 401
+        if state.roll(state.settings['error_rate_429']):
+            state.count('injected', '429')
+            response = jsonify({'detail': 'Too many requests'})
+            response.headers['Retry-After'] = str(state.settings['retry_after'])
+            return response, 429
+        if state.roll(state.settings['error_rate_503']):
+            state.count('injected', '503')
+            return jsonify({'detail': 'Service unavailable'}), 503
+        return None
+
+    def _finish(clip):
+        """Moves a clip to its final status (caller holds the lock)."""
+        if clip['_fails']:
+            clip['status'] = 'error'
+            clip['error_message'] = 'Injected generation failure'
+        else:
+            clip['status'] = 'complete'
+            state.stats['completed_clips'] += 1
+
+    def _send_callbacks(clip_ids, callback_url):
+        """Completes a generation's clips and POSTs each one to its callback URL, like Suno does."""
+        for clip_id in clip_ids:
+            with state.lock:
+                clip = state.clips.get(clip_id)
+                if clip is None:
+                    continue
+                if clip['status'] not in ('complete', 'error'):
+                    _finish(clip)
+                view = _clip_view(clip)
+            if state.roll(state.settings['callback_drop_rate']):
+                state.count('callbacks', 'dropped')
+                continue
+            try:
+                response = requests.post(callback_url, json={'code': 200, 'data': [view]}, timeout=10)
+                state.count('callbacks', 'sent' if response.ok else f"http_{response.status_code}")
+            except requests.RequestException:
+                state.count('callbacks', 'failed')
+
+    def _clip_view(clip):
+        view = {k: v for k, v in clip.items() if not k.startswith('_')}
+        if clip['status'] != 'complete':
+            view['audio_url'] = None
+        return view
+
+    @app.route('/api/v1/generate', methods=['POST'])
+    def generate():
+        error = _check_request('generate')
+        if error:
+            return error
+        payload = request.get_json(silent=True) or {}
+        with state.lock:
+            if state.credits < state.settings['credits_per_generation']:
+                return jsonify({'detail': 'Insufficient credits'}), 402
+            state.credits -= state.settings['credits_per_generation']
+            state.stats['generations'] += 1
+            clips = []
+            for _ in range(state.settings['clips_per_generation']):
+                clip_id = str(uuid.uuid4())
+                clip = {
+                    'id': clip_id,
+                    'status': 'submitted',
+                    'title': payload.get('title') or 'Mock Song',
+                    'tags': payload.get('tags', ''),
+                    'audio_url': f"{request.host_url}audio/{clip_id}.{state.settings['audio_format']}",
+                    'metadata': {'make_instrumental': payload.get('make_instrumental', False), 'prompt': payload.get('prompt', '')},
+                    'created_at': time.time(),
+                    '_polls': 0,
+                    '_fails': state.rng.random() < state.settings['generation_failure_rate'],
+                }
+                state.clips[clip_id] = clip
+                clips.append(_clip_view(clip))
+        if payload.get('callback_url'):
+            timer = threading.Timer(state.settings['callback_delay'], _send_callbacks,
+                                    args=([clip['id'] for clip in clips], payload['callback_url']))
+            timer.daemon = True
+            timer.start()
+        return jsonify(clips)
+
+    @app.route('/api/v1/generate/credit', methods=['GET'])
+    def credit():
+        error = _check_request('credit')
+        if error:
+            return error
+        with state.lock:
+            return jsonify({'code': 200, 'msg': 'success', 'data': state.credits})
+
+    @app.route('/api/v1/generate/<ids>', methods=['GET'])
+    def status(ids):
+        error = _check_request('status')
+        if error:
+            return error
+        polls_to_complete = state.settings['polls_to_complete']
+        results = []
+        with state.lock:
+            for clip_id in ids.split(','):
+                clip = state.clips.get(clip_id)
+                if clip is None:
+                    return jsonify({'detail': f'Clip {clip_id} not found'}), 404
+                if clip['status'] not in ('complete', 'error'):
+                    clip['_polls'] += 1
+                    if clip['_polls'] >= polls_to_complete:
+                        _finish(clip)
+                    else:
+                        clip['status'] = 'streaming' if clip['_polls'] >= polls_to_complete - 1 else 'queued'
+                results.append(_clip_view(clip))
+        return jsonify(results)
+
+    @app.route('/audio/<clip_id>.<fmt>', methods=['GET'])
+    def audio(clip_id, fmt):
+        state.count('requests', 'audio')
+        state.delay('audio')
+        if fmt not in ('mp3', 'wav'):
+            return jsonify({'detail': 'Unsupported format'}), 404
+        response = Response(state.audio(clip_id, fmt), mimetype='audio/mpeg' if fmt == 'mp3' else 'audio/wav')
+        return response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+
+    @app.route('/mock/config', methods=['GET', 'POST'])
+    def mock_config():
+        if request.method == 'POST':
+            try:
+                state.configure(request.get_json() or {})
+            except (ValueError, IndexError, KeyError) as e:
+                return jsonify({'error': str(e)}), 400
+        return jsonify(state.settings)
+
+    @app.route('/mock/stats', methods=['GET'])
+    def mock_stats():
+        with state.lock:
+            by_status = {}
+            for clip in state.clips.values():
+                by_status[clip['status']] = by_status.get(clip['status'], 0) + 1
+            return jsonify(dict(state.stats, credits=state.credits, clips=by_status))
+
+    @app.route('/mock/reset', methods=['POST'])
+    def mock_reset():
+        state.reset()
+        return jsonify({'success': True})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the Suno API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8055)
+    parser.add_argument('--threads', type=int, default=16, help="Waitress worker threads.")
+    parser.add_argument('--latency', default=DEFAULT_SETTINGS['latency'], help="Default latency spec.")
+    parser.add_argument('--endpoint-latency', action='append', default=[], metavar='ENDPOINT=SPEC',
+                        help=f"Per-endpoint latency override; endpoints: {', '.join(ENDPOINTS)}.")
+    parser.add_argument('--error-rate-503', type=float, default=0.0)
+    parser.add_argument('--error-rate-429', type=float, default=0.0)
+    parser.add_argument('--error-rate-401', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=DEFAULT_SETTINGS['retry_after'])
+    parser.add_argument('--valid-key', action='append', default=[], help="Accept only these API keys.")
+    parser.add_argument('--polls-to-complete', type=int, default=DEFAULT_SETTINGS['polls_to_complete'])
+    parser.add_argument('--generation-failure-rate', type=float, default=0.0)
+    parser.add_argument('--callback-delay', type=float, default=DEFAULT_SETTINGS['callback_delay'])
+    parser.add_argument('--callback-drop-rate', type=float, default=0.0)
+    parser.add_argument('--credits', type=int, default=DEFAULT_SETTINGS['credits'])
+    parser.add_argument('--audio-format', choices=['mp3', 'wav'], default=DEFAULT_SETTINGS['audio_format'])
+    parser.add_argument('--audio-seconds', type=float, default=DEFAULT_SETTINGS['audio_seconds'])
+    parser.add_argument('--seed', type=int, help="Seed latency and fault injection for reproducible runs.")
+    args = parser.parse_args()
+
+    settings = {
+        'latency': args.latency,
+        'endpoint_latency': dict(item.split('=', 1) for item in args.endpoint_latency),
+        'error_rate_503': args.error_rate_503,
+        'error_rate_429': args.error_rate_429,
+        'error_rate_401': args.error_rate_401,
+        'retry_after': args.retry_after,
+        'valid_keys': args.valid_key,
+        'polls_to_complete': args.polls_to_complete,
+        'generation_failure_rate': args.generation_failure_rate,
+        'callback_delay': args.callback_delay,
+        'callback_drop_rate': args.callback_drop_rate,
+        'credits': args.credits,
+        'audio_format': args.audio_format,
+        'audio_seconds': args.audio_seconds,
+        'seed': args.seed,
+    }
+    app = create_app(settings)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.info(f"Mock Suno API listening on http://{args.host}:{args.port}")
+    from waitress import serve
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Deterministic synthetic audio for the benchmarks.
+
+Every generator is pure NumPy and seeded, so the same fixture is bit-identical
+across runs and machines. Fixtures carry the musical facts they were built
+from (BPM, key) so benchmark runs can also report whether the analyzer still
+detects them.
+"""
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 22050
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+MAJOR_SCALE = [0, 2, 4, 5, 7, 9, 11]
+MINOR_SCALE = [0, 2, 3, 5, 7, 8, 10]
+
+# Formant centre frequencies (Hz) of sung vowels
+VOWEL_FORMANTS = {
+    'a': (800, 1150, 2900),
+    'e': (400, 1600, 2700),
+    'i': (350, 1700, 2700),
+    'o': (450, 800, 2830),
+    'u': (325, 700, 2530),
+}
+
+
+def _midi_to_hz(note):
+    return 440.0 * 2 ** ((note - 69) / 12)
+
+
+def _normalize(audio, peak=0.8):
+    max_value = np.max(np.abs(audio))
+    return (audio / max_value * peak if max_value > 0 else audio).astype(np.float32)
+
+
+def click_track(bpm, duration, sr=SAMPLE_RATE, accent_every=4):
+    """Short decaying clicks on every beat, with an accented downbeat."""
+    audio = np.zeros(int(duration * sr), dtype=np.float32)
+    click_len = int(0.03 * sr)
+    t = np.arange(click_len) / sr
+    click = np.sin(2 * np.pi * 1000 * t) * np.exp(-t * 150)
+    beat_interval = 60.0 / bpm
+    for i, start in enumerate(np.arange(0, duration, beat_interval)):
+        begin = int(start * sr)
+        end = min(begin + click_len, len(audio))
+        gain = 1.0 if i % accent_every == 0 else 0.6
+        audio[begin:end] += gain * click[:end - begin]
+    return _normalize(audio)
+
+
+def chord_progression(key='C', mode='major', duration=10.0, sr=SAMPLE_RATE, chord_seconds=2.0):
+    """A I-V-vi-IV (major) or i-VI-III-VII (minor) progression of additive-synth triads."""
+    scale = MAJOR_SCALE if mode == 'major' else MINOR_SCALE
+    degrees = [0, 4, 5, 3] if mode == 'major' else [0, 5, 2, 6]
+    root = 48 + NOTE_NAMES.index(key)  # C3-based octave
+    n = int(duration * sr)
+    audio = np.zeros(n, dtype=np.float64)
+    chord_len = int(chord_seconds * sr)
+    t = np.arange(chord_len) / sr
+    envelope = np.minimum(1.0, t / 0.02) * np.exp(-t * 0.8)
+    for i, start in enumerate(range(0, n, chord_len)):
+        degree = degrees[i % len(degrees)]
+        chord = np.zeros(chord_len)
+        for step in (0, 2, 4):
+            index = degree + step
+            note = root + scale[index % 7] + 12 * (index // 7)
+            for harmonic in range(1, 5):
+                chord += np.sin(2 * np.pi * _midi_to_hz(note) * harmonic * t) / harmonic
+        end = min(start + chord_len, n)
+        audio[start:end] += (chord * envelope)[:end - start]
+    return _normalize(audio)
+
+
+def noise_bursts(duration, sr=SAMPLE_RATE, burst_seconds=0.25, gap_seconds=0.5, seed=0):
+    """Alternating white-noise bursts and silence (stresses onset and ZCR features)."""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(duration * sr), dtype=np.float32)
+    burst, period = int(burst_seconds * sr), int((burst_seconds + gap_seconds) * sr)
+    for start in range(0, len(audio), period):
+        end = min(start + burst, len(audio))
+        audio[start:end] = rng.standard_normal(end - start)
+    return _normalize(audio)
+
+
+def sung_vowel(f0=220.0, duration=10.0, sr=SAMPLE_RATE, vowel='a', vibrato_hz=5.0, seed=0):
+    """A harmonic tone with vibrato, shaped by vowel formants, resembling a sustained sung vowel."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    pitch = f0 * (1 + 0.01 * np.sin(2 * np.pi * vibrato_hz * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    formants = VOWEL_FORMANTS[vowel]
+    audio = np.zeros_like(t)
+    for harmonic in range(1, int((sr / 2) / (f0 * 1.02))):
+        frequency = f0 * harmonic
+        gain = sum(np.exp(-((frequency - formant) / 120.0) ** 2) for formant in formants) + 0.05 / harmonic
+        audio += gain * np.sin(harmonic * phase)
+    audio += 0.01 * rng.standard_normal(len(t))  # breath noise
+    return _normalize(audio)
+
+
+def song(bpm=120, key='A', mode='minor', duration=10.0, sr=SAMPLE_RATE, seed=0):
+    """A mix of clicks, chords and a vowel 'vocal' on the key's fifth, for end-to-end runs."""
+    vocal_f0 = _midi_to_hz(60 + NOTE_NAMES.index(key) + 7)
+    mix = (
+        0.5 * click_track(bpm, duration, sr)
+        + 0.6 * chord_progression(key, mode, duration, sr)
+        + 0.5 * sung_vowel(vocal_f0, duration, sr, seed=seed)
+    )
+    return _normalize(mix)
+
+
+# name -> (generator(duration, sr), expected facts)
+FIXTURES = {
+    'click_90bpm': (lambda d, sr: click_track(90, d, sr), {'tempo': 90}),
+    'click_128bpm': (lambda d, sr: click_track(128, d, sr), {'tempo': 128}),
+    'chords_C_major': (lambda d, sr: chord_progression('C', 'major', d, sr), {'key': 'C'}),
+    'chords_A_minor': (lambda d, sr: chord_progression('A', 'minor', d, sr), {'key': 'Am'}),
+    'noise_bursts': (lambda d, sr: noise_bursts(d, sr), {}),
+    'vowel_a_220hz': (lambda d, sr: sung_vowel(220.0, d, sr, 'a'), {}),
+    'song_120bpm_Am': (lambda d, sr: song(120, 'A', 'minor', d, sr), {'tempo': 120, 'key': 'Am'}),
+}
+
+
+def write_fixture(path, name, duration, sr=SAMPLE_RATE):
+    """Renders a fixture to a 16-bit WAV file and returns its expected facts."""
+    generator, expected = FIXTURES[name]
+    sf.write(path, generator(duration, sr), sr, subtype='PCM_16')
+    return expected
@@ -1,4 +1,5 @@
 import os
+import sys
 from dotenv import load_dotenv
 
 # Build the absolute path to the .env file based on this script's location
@@ -7,8 +8,74 @@ load_dotenv(dotenv_path=dotenv_path)
 
 # --- API Keys ---
 SUNO_API_URL = os.getenv("SUNO_API_URL", "https://api.sunoapi.org")
+SUNO_HTTP_POOL_SIZE = int(os.getenv("SUNO_HTTP_POOL_SIZE", "16"))  # Keep-alive connections per client
+SUNO_CLIENT_IDLE_TIMEOUT = int(os.getenv("SUNO_CLIENT_IDLE_TIMEOUT", "600"))  # Seconds before an unused client is closed
+# Shared per-API-key request budget (token bucket) and circuit breaker
+SUNO_RATE_LIMIT_PER_SECOND = float(os.getenv("SUNO_RATE_LIMIT_PER_SECOND", "2"))
+SUNO_RATE_LIMIT_BURST = int(os.getenv("SUNO_RATE_LIMIT_BURST", "20"))
+SUNO_RATE_LIMIT_MAX_WAIT = float(os.getenv("SUNO_RATE_LIMIT_MAX_WAIT", "60"))  # Longest a request queues for a token
+SUNO_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("SUNO_CIRCUIT_FAILURE_THRESHOLD", "5"))  # Consecutive 5xx/network errors
+SUNO_CIRCUIT_RESET_TIMEOUT = float(os.getenv("SUNO_CIRCUIT_RESET_TIMEOUT", "30"))  # Seconds before a trial request
+# Seconds credit lookups are served from the server-side cache. Generations subtract their
+# cost from the cached balance instead of forcing a refresh; kept short so credits spent
+# elsewhere (another app or the Suno site) show up within a minute.
+CREDITS_CACHE_TTL = float(os.getenv("CREDITS_CACHE_TTL", "60"))
+GENERATION_CREDIT_COST = int(os.getenv("GENERATION_CREDIT_COST", "10"))  # Credits one generate call spends
+# Identical generation requests from one account within this many seconds reuse the first generation
+GENERATION_IDEMPOTENCY_WINDOW = float(os.getenv("GENERATION_IDEMPOTENCY_WINDOW", "120"))
+BATCH_GENERATION_MAX_CONCURRENCY = int(os.getenv("BATCH_GENERATION_MAX_CONCURRENCY", "4"))  # Requests in flight per batch
+BATCH_GENERATION_MAX_ITEMS = int(os.getenv("BATCH_GENERATION_MAX_ITEMS", "50"))
+# Distributed batches skip saved accounts with fewer credits than this
+ACCOUNT_MIN_CREDITS = int(os.getenv("ACCOUNT_MIN_CREDITS", "10"))
+# Distributed batches spend every saved account's credits. They are only accepted from callers
+# whose key is one of the saved accounts, unless this is set (single-user, local installs).
+ALLOW_ACCOUNT_DISTRIBUTION = os.getenv("ALLOW_ACCOUNT_DISTRIBUTION", "false").lower() == "true"
+# Connections shared by all async clients on one event loop (see async_suno_client.py)
+SUNO_ASYNC_CONNECTION_LIMIT = int(os.getenv("SUNO_ASYNC_CONNECTION_LIMIT", "100"))
+
+# --- Suno callbacks ---
+# Public base URL under which Suno can reach this app (e.g. https://example.com).
+# When set, generations ask Suno to POST completion notices to /api/suno-callback/<token>
+# and polling only runs as a slow fallback.
+SUNO_CALLBACK_BASE_URL = os.getenv("SUNO_CALLBACK_BASE_URL")
+# Signs the per-account callback tokens. Set it to keep callback URLs valid across restarts.
+SUNO_CALLBACK_SECRET = os.getenv("SUNO_CALLBACK_SECRET") or os.urandom(32).hex()
+SUNO_CALLBACK_POLL_INTERVAL = float(os.getenv("SUNO_CALLBACK_POLL_INTERVAL", "60"))  # Fallback poll interval in seconds
+
+# --- Server ---
+# Waitress worker threads. Each open analysis or generation event stream holds one.
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "16"))
 
 # Files and Uploads
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'flac', 'ogg'}
-MAX_FILE_SIZE = 256 * 1024 * 1024  # 256MB
\ No newline at end of file
+MAX_FILE_SIZE = 256 * 1024 * 1024  # 256MB
+# Analysis and generation history (SQLite). Legacy JSON history files are imported on first start.
+HISTORY_DB = os.getenv("HISTORY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.db'))
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_history.json')
+GENERATION_HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generation_history.json')
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+# "Find similar tracks": libraries this large use an approximate (HNSW) index when faiss is installed
+FEATURE_INDEX_APPROX_THRESHOLD = int(os.getenv("FEATURE_INDEX_APPROX_THRESHOLD", "50000"))
+SIMILAR_MAX_RESULTS = 50
+
+# --- Genre classification ---
+# genre_rules.json is read from the application folder (next to the executable in bundled
+# builds), not the working directory, and reloaded whenever it changes.
+_APP_DIR = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+GENRE_RULES_PATH = os.getenv("GENRE_RULES_PATH", os.path.join(_APP_DIR, 'genre_rules.json'))
+# Reference library built with `python genre_library.py build <folder>`. When it exists,
+# auto-detected genres come from its nearest neighbours instead of genre_rules.json.
+GENRE_LIBRARY_PATH = os.getenv("GENRE_LIBRARY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'genre_library.npz'))
+GENRE_KNN_NEIGHBOURS = int(os.getenv("GENRE_KNN_NEIGHBOURS", "15"))
+# --- Profiling ---
+# Admin switch for on-demand profiling of single analyses (request flag `profile=true`).
+ENABLE_PROFILING = os.getenv("ENABLE_PROFILING", "false").lower() == "true"
+PROFILING_MODE = os.getenv("PROFILING_MODE", "sampling")  # 'sampling' or 'cprofile'
+PROFILE_FOLDER = os.path.join(UPLOAD_FOLDER, 'profiles')
+
+# --- Audio cache ---
+# Downloaded generations, reused by the web proxy and the GUI player.
+AUDIO_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'audio_cache')
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_MB", "1024")) * 1024 * 1024
@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+from metrics import CREDITS_CACHE_LOOKUPS
+
+
+class CreditsCache:
+    """
+    Per-API-key TTL cache for credit lookups. Concurrent misses for a key share
+    a single upstream call (single-flight): the first caller runs `fetch(api_key)`
+    and everyone else waits for its result or error. Errors are not cached.
+    """
+
+    def __init__(self, fetch, ttl=config.CREDITS_CACHE_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._entries = {}  # api_key -> (value, fetched_at)
+        self._inflight = {}  # api_key -> Future
+        self._versions = {}  # api_key -> invalidation count, so a fetch racing an invalidation is not stored
+        self._lock = threading.Lock()
+
+    def get(self, api_key):
+        """Returns the credits for a key, calling the API only when the cached value is stale."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is not None and now - entry[1] < self.ttl:
+                CREDITS_CACHE_LOOKUPS.inc(result='hit')
+                return dict(entry[0])
+            future = self._inflight.get(api_key)
+            owner = future is None
+            if owner:
+                future = self._inflight[api_key] = Future()
+                version = self._versions.get(api_key, 0)
+        CREDITS_CACHE_LOOKUPS.inc(result='miss' if owner else 'coalesced')
+
+        if owner:
+            try:
+                value = self.fetch(api_key)
+            except BaseException as e:
+                with self._lock:
+                    self._inflight.pop(api_key, None)
+                future.set_exception(e)
+                raise
+            with self._lock:
+                self._inflight.pop(api_key, None)
+                if self._versions.get(api_key, 0) == version:
+                    self._entries[api_key] = (value, time.monotonic())
+            future.set_result(value)
+        return dict(future.result())
+
+    def spend(self, api_key, credits):
+        """
+        Subtracts credits a request is known to have spent from a key's cached
+        balance without calling the API; the real balance is fetched again once
+        the entry expires.
+        """
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is not None and isinstance(entry[0].get('credits'), (int, float)):
+                value = dict(entry[0], credits=max(0, entry[0]['credits'] - credits))
+                self._entries[api_key] = (value, entry[1])
+            # A fetch already in flight may predate the spend; do not let it overwrite this
+            self._versions[api_key] = self._versions.get(api_key, 0) + 1
+
+    def invalidate(self, api_key):
+        """Drops a key's cached credits (e.g. after a generation spent some)."""
+        with self._lock:
+            self._entries.pop(api_key, None)
+            self._versions[api_key] = self._versions.get(api_key, 0) + 1
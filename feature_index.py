@@ -0,0 +1,168 @@
+import logging
+import threading
+
+import numpy as np
+
+import config
+
+# Per-track summary features from AudioAnalyzer.analyze(), flattened in this order
+FEATURE_LAYOUT = (
+    ('mfcc', 13),
+    ('chroma', 12),
+    ('spectral_contrast', 7),
+    ('tonnetz', 6),
+    ('tempo', 1),
+    ('spectral_centroid', 1),
+    ('spectral_rolloff', 1),
+    ('spectral_bandwidth', 1),
+    ('zero_crossing_rate', 1),
+    ('energy_value', 1),
+)
+DIMENSIONS = sum(size for _, size in FEATURE_LAYOUT)
+
+
+def feature_vector(features):
+    """Flattens an analysis' features into a float32 vector, or returns None if any are missing or malformed."""
+    if not isinstance(features, dict):
+        return None
+    parts = []
+    for name, size in FEATURE_LAYOUT:
+        try:
+            part = np.asarray(features.get(name), dtype=np.float32).reshape(-1)
+        except (TypeError, ValueError):
+            return None
+        if part.size != size:
+            return None
+        parts.append(part)
+    vector = np.concatenate(parts)
+    return vector if np.isfinite(vector).all() else None
+
+
+class FeatureIndex:
+    """
+    k-nearest-neighbour index over analysis feature vectors.
+
+    Vectors are pulled incrementally from `rows(after_rowid)`, which yields
+    (rowid, id, float32 bytes) in rowid order, into a float32 matrix. Each
+    dimension is standardised (z-score) so MFCCs, tempo and spectral
+    centroid weigh alike; the scaling is refitted whenever the library has
+    grown by `refit_growth` since the last fit, and new rows are scaled with
+    the current fit in between. Queries are a brute-force NumPy distance
+    computation, or an HNSW index when faiss is installed and the library
+    has at least `approximate_threshold` tracks.
+    """
+
+    def __init__(self, rows, refit_growth=0.1, approximate_threshold=config.FEATURE_INDEX_APPROX_THRESHOLD):
+        self.rows = rows
+        self.refit_growth = refit_growth
+        self.approximate_threshold = approximate_threshold
+        self._ids = []
+        self._positions = {}  # id -> row in the matrices
+        self._raw = np.empty((0, DIMENSIONS), dtype=np.float32)
+        self._scaled = np.empty((0, DIMENSIONS), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._mean = np.zeros(DIMENSIONS, dtype=np.float32)
+        self._scale = np.ones(DIMENSIONS, dtype=np.float32)
+        self._size = 0
+        self._fitted_size = 0
+        self._last_rowid = 0
+        self._approximate = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return self._size
+
+    def sync(self):
+        """Adds any rows saved since the last sync. Returns how many were added."""
+        with self._lock:
+            ids, vectors = [], []
+            for rowid, item_id, blob in self.rows(self._last_rowid):
+                self._last_rowid = rowid
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.size == DIMENSIONS:
+                    ids.append(item_id)
+                    vectors.append(vector)
+            if vectors:
+                self._append(ids, np.vstack(vectors))
+            return len(vectors)
+
+    def _append(self, ids, vectors):
+        start, end = self._size, self._size + len(ids)
+        if end > len(self._raw):
+            capacity = max(end, 2 * len(self._raw), 256)
+            self._raw = self._grow(self._raw, capacity)
+            self._scaled = self._grow(self._scaled, capacity)
+            self._sq_norms = np.resize(self._sq_norms, capacity)
+        self._raw[start:end] = vectors
+        self._ids.extend(ids)
+        for position, item_id in enumerate(ids, start):
+            self._positions[item_id] = position
+        self._size = end
+
+        if end > self._fitted_size * (1 + self.refit_growth):
+            self._fit()
+        else:
+            self._scale_rows(start, end)
+            if self._approximate is not None:
+                self._approximate.add(self._scaled[start:end])
+
+    @staticmethod
+    def _grow(matrix, capacity):
+        grown = np.empty((capacity, DIMENSIONS), dtype=np.float32)
+        grown[:len(matrix)] = matrix
+        return grown
+
+    def _fit(self):
+        raw = self._raw[:self._size]
+        self._mean = raw.mean(axis=0, dtype=np.float64).astype(np.float32)
+        std = raw.std(axis=0, dtype=np.float64).astype(np.float32)
+        self._scale = np.where(std > 1e-8, 1.0 / np.maximum(std, 1e-8), 1.0).astype(np.float32)
+        self._fitted_size = self._size
+        self._scale_rows(0, self._size)
+        self._approximate = self._build_approximate()
+
+    def _scale_rows(self, start, end):
+        scaled = (self._raw[start:end] - self._mean) * self._scale
+        self._scaled[start:end] = scaled
+        self._sq_norms[start:end] = np.einsum('ij,ij->i', scaled, scaled)
+
+    def _build_approximate(self):
+        if self._size < self.approximate_threshold:
+            return None
+        try:
+            import faiss
+        except ImportError:
+            return None
+        index = faiss.IndexHNSWFlat(DIMENSIONS, 32)
+        index.add(self._scaled[:self._size])
+        logging.info(f"Built approximate feature index over {self._size} tracks")
+        return index
+
+    def vector_for(self, item_id):
+        """The raw feature vector of an indexed analysis, or None."""
+        self.sync()
+        with self._lock:
+            position = self._positions.get(item_id)
+            return None if position is None else self._raw[position].copy()
+
+    def search(self, vector, k=10, exclude=None):
+        """Returns up to k (id, distance) pairs nearest to a raw feature vector, closest first."""
+        self.sync()
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if self._size == 0:
+                return []
+            query = (query - self._mean) * self._scale
+            wanted = min(k + (1 if exclude is not None else 0), self._size)
+            if self._approximate is not None:
+                distances, positions = self._approximate.search(query[None, :], wanted)
+                pairs = [(int(p), float(d)) for p, d in zip(positions[0], distances[0]) if p >= 0]
+            else:
+                # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, one matrix-vector product for the whole library
+                distances = self._sq_norms[:self._size] - 2.0 * (self._scaled[:self._size] @ query) + query @ query
+                positions = np.argpartition(distances, wanted - 1)[:wanted]
+                positions = positions[np.argsort(distances[positions])]
+                pairs = [(int(p), float(distances[p])) for p in positions]
+            results = [(self._ids[p], float(np.sqrt(max(d, 0.0)))) for p, d in pairs if self._ids[p] != exclude]
+        return results[:k]
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import config
+from async_suno_client import event_loop_thread
+from metrics import GENERATION_IDEMPOTENT_REPLAYS
+
+
+def _account_scoped_key(api_key, fields):
+    account = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+    payload = json.dumps(dict(fields, account=account), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def idempotency_key(api_key, prompt_data):
+    """Hash of the generation payload and the account, identifying resubmissions of the same request."""
+    return _account_scoped_key(api_key, {'prompt': prompt_data})
+
+
+def client_idempotency_key(api_key, client_key):
+    """Hash of a client-supplied Idempotency-Key and the account, so keys from different accounts never collide."""
+    return _account_scoped_key(api_key, {'client_key': client_key})
+
+
+class IdempotencyCache:
+    """
+    Remembers the outcome of each submission for `window` seconds. A repeat of
+    a key within the window gets the first submission's response (waiting for
+    it if it is still running) instead of running again. Failed submissions
+    are forgotten so they can be retried.
+    """
+
+    def __init__(self, window=config.GENERATION_IDEMPOTENCY_WINDOW):
+        self.window = window
+        self._entries = {}  # key -> (Future, created_at)
+        self._lock = threading.Lock()
+
+    def run(self, key, submit):
+        """Returns (response, replayed) where `replayed` is True when an earlier submission's response is reused."""
+        future, owner = self._claim(key)
+        if not owner:
+            GENERATION_IDEMPOTENT_REPLAYS.inc()
+            return future.result(), True
+        try:
+            response = submit()
+        except BaseException as e:
+            self._forget(key, future, e)
+            raise
+        future.set_result(response)
+        return response, False
+
+    async def run_async(self, key, submit):
+        """Coroutine version of run() for a coroutine function `submit`; waiting for a replay does not block the loop."""
+        future, owner = self._claim(key)
+        if not owner:
+            GENERATION_IDEMPOTENT_REPLAYS.inc()
+            return await asyncio.wrap_future(future), True
+        try:
+            response = await submit()
+        except BaseException as e:
+            self._forget(key, future, e)
+            raise
+        future.set_result(response)
+        return response, False
+
+    def _claim(self, key):
+        """Returns (future, owner); the owner runs the submission, everyone else waits for its future."""
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0], False
+            future = Future()
+            self._entries[key] = (future, now)
+            return future, True
+
+    def _forget(self, key, future, error):
+        with self._lock:
+            self._entries.pop(key, None)
+        future.set_exception(error)
+
+    def _purge(self, now):
+        expired = [k for k, (future, created) in self._entries.items() if future.done() and now - created > self.window]
+        for key in expired:
+            del self._entries[key]
+
+
+class GenerationBatch:
+    """A set of generation requests submitted together, with a status per item."""
+
+    def __init__(self, api_key, items):
+        self.id = uuid.uuid4().hex
+        self.api_key = api_key
+        self.created_at = time.monotonic()
+        self.items = [
+            {'index': i, 'idempotency_key': key, 'status': 'queued', 'clip_ids': [], 'error': None, 'account': None}
+            for i, (key, _) in enumerate(items)
+        ]
+        self.owners = [api_key] * len(items)  # API key each item was submitted with, for status lookups
+        self._lock = threading.Lock()
+
+    def update(self, index, **changes):
+        with self._lock:
+            self.items[index].update(changes)
+
+    def snapshot(self):
+        with self._lock:
+            items = [dict(item) for item in self.items]
+        counts = {}
+        for item in items:
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+        done = all(item['status'] in ('submitted', 'duplicate', 'failed') for item in items)
+        return {'batch_id': self.id, 'done': done, 'counts': counts, 'items': items}
+
+
+class GenerationBatches:
+    """
+    Submits batches of generation requests through the coroutine function
+    `submit(api_key, prompt_data)` with at most `concurrency` requests of a
+    batch in flight, using the shared idempotency cache, and keeps each
+    batch's status for `retention` seconds. Every batch runs on the shared
+    event loop (see async_suno_client.py), so in-flight requests need no
+    threads. Batches started with an `accounts` pool route each item to the
+    account the pool chooses instead of the caller's key.
+    """
+
+    def __init__(self, submit, idempotency, max_concurrency=config.BATCH_GENERATION_MAX_CONCURRENCY, retention=3600.0):
+        self.submit = submit
+        self.idempotency = idempotency
+        self.max_concurrency = max_concurrency
+        self.retention = retention
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def start(self, api_key, prompts, concurrency=None, accounts=None):
+        """Starts submitting a list of prompt payloads in the background and returns the new batch."""
+        items = [(idempotency_key(api_key, prompt_data), prompt_data) for prompt_data in prompts]
+        batch = GenerationBatch(api_key, items)
+        workers = max(1, min(concurrency or self.max_concurrency, self.max_concurrency, len(items)))
+        with self._lock:
+            now = time.monotonic()
+            for batch_id in [b for b, old in self._batches.items() if now - old.created_at > self.retention]:
+                del self._batches[batch_id]
+            self._batches[batch.id] = batch
+
+        event_loop_thread().submit(self._run(batch, items, workers, accounts))
+        return batch
+
+    def get(self, batch_id):
+        with self._lock:
+            return self._batches.get(batch_id)
+
+    async def _run(self, batch, items, workers, accounts):
+        slots = asyncio.Semaphore(workers)
+        await asyncio.gather(*(
+            self._submit_item(slots, batch, index, key, prompt_data, accounts)
+            for index, (key, prompt_data) in enumerate(items)
+        ))
+
+    async def _submit_item(self, slots, batch, index, key, prompt_data, accounts):
+        async with slots:
+            batch.update(index, status='submitting')
+
+            async def submit():
+                if accounts is None:
+                    return await self.submit(batch.api_key, prompt_data)
+                name, api_key = await asyncio.to_thread(accounts.choose)  # Credit lookups may call the API
+                batch.owners[index] = api_key
+                batch.update(index, account=name)
+                try:
+                    response = await self.submit(api_key, prompt_data)
+                except Exception:
+                    accounts.record(name, ok=False)
+                    raise
+                accounts.record(name, ok=True)
+                return response
+
+            try:
+                response, replayed = await self.idempotency.run_async(key, submit)
+            except Exception as e:
+                batch.update(index, status='failed', error=str(e))
+                return
+        clip_ids = [clip['id'] for clip in response if clip.get('id')] if isinstance(response, list) else []
+        batch.update(index, status='duplicate' if replayed else 'submitted', clip_ids=clip_ids)
@@ -0,0 +1,305 @@
+import logging
+import threading
+import time
+
+from suno_client import SunoAuthError, SunoError, summarize_tracks
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+class TrackingLimitError(Exception):
+    """Raised when tracking more generation IDs would exceed the poller's limits."""
+
+    def __init__(self, message, status_code=429):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Generation:
+    """One generation request (the clip IDs returned by a single generate call)."""
+
+    def __init__(self, api_key, ids, interval, next_poll):
+        self.api_key = api_key
+        self.ids = list(ids)
+        self.request_id = ','.join(self.ids)
+        self.status = 'processing'
+        self.results = []
+        self.message = None
+        self.tracks = {}  # Latest raw track object per clip ID, from polls and callbacks
+        self.created_at = time.monotonic()
+        self.base_interval = interval
+        self.interval = interval
+        self.next_poll = next_poll
+        self.finished_at = None
+
+    def snapshot(self):
+        snapshot = {
+            'request_id': self.request_id,
+            'status': self.status,
+            'results': list(self.results),
+            'completed_tracks': len(self.results),
+            'total_tracks': len(self.ids),
+        }
+        if self.message:
+            snapshot['message'] = self.message
+        return snapshot
+
+
+class GenerationPoller:
+    """
+    Tracks every outstanding generation and polls them from a single background
+    thread. All due generations of an API key are fetched together in batched
+    status calls, each generation's interval backs off while its status is
+    unchanged, and subscribers are notified only when something changes.
+    Tracks pushed by Suno callbacks are merged in through `push()`.
+    `on_complete(snapshot)` runs exactly once per completed generation.
+    Generations belong to the API key that tracked them: the same clip IDs
+    tracked with another key are a separate generation, polled with that key.
+    A generation that has not finished within `max_age` seconds (e.g. IDs
+    Suno does not know) is marked failed, and each key may track at most
+    `max_ids_per_key` unfinished IDs, `max_ids_per_request` per generation.
+    """
+
+    def __init__(self, client_for_key, on_complete=None, min_interval=3.0, max_interval=30.0,
+                 backoff=1.5, batch_size=20, retention=600.0, max_age=1800.0,
+                 max_ids_per_request=20, max_ids_per_key=200):
+        self.client_for_key = client_for_key
+        self.on_complete = on_complete
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.retention = retention  # Seconds finished generations stay queryable
+        self.max_age = max_age
+        self.max_ids_per_request = max_ids_per_request
+        self.max_ids_per_key = max_ids_per_key
+        self._generations = {}  # (api_key, request_id) -> _Generation
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def track(self, api_key, ids, poll_interval=None):
+        """
+        Starts tracking a generation (idempotent) and returns its current snapshot.
+        `poll_interval` replaces the minimum interval for generations whose
+        updates are expected from callbacks, so polling only acts as a fallback.
+        Raises TrackingLimitError if the IDs exceed the per-request or per-key limit.
+        """
+        ids = [i for i in ids if i]
+        if len(ids) > self.max_ids_per_request:
+            raise TrackingLimitError(f"At most {self.max_ids_per_request} generation IDs can be tracked per request.", 400)
+        key = (api_key, ','.join(ids))
+        with self._lock:
+            generation = self._generations.get(key)
+            if generation is None:
+                tracked = sum(len(g.ids) for g in self._generations.values()
+                              if g.api_key == api_key and g.finished_at is None)
+                if tracked + len(ids) > self.max_ids_per_key:
+                    raise TrackingLimitError(
+                        f"Too many unfinished generations are being tracked for this account (limit {self.max_ids_per_key} IDs).")
+                interval = poll_interval or self.min_interval
+                next_poll = time.monotonic() + poll_interval if poll_interval else 0.0
+                generation = _Generation(api_key, ids, interval, next_poll)
+                self._generations[key] = generation
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="generation-poller", daemon=True)
+                    self._thread.start()
+                self._wake.set()
+            return generation.snapshot()
+
+    def get(self, api_key, request_id):
+        """Returns the snapshot of a generation tracked with this API key, or None."""
+        with self._lock:
+            generation = self._generations.get((api_key, request_id))
+            return generation.snapshot() if generation else None
+
+    def audio_url(self, clip_id):
+        """The audio URL reported for a finished clip of any tracked generation, or None."""
+        with self._lock:
+            for generation in self._generations.values():
+                for result in generation.results:
+                    if result.get('id') == clip_id and result.get('audio_url'):
+                        return result['audio_url']
+        return None
+
+    def snapshots(self, api_key):
+        """Returns the snapshots of every tracked generation of an API key."""
+        with self._lock:
+            return [g.snapshot() for g in self._generations.values() if g.api_key == api_key]
+
+    def outstanding(self):
+        """Returns the number of generations that are still being polled."""
+        with self._lock:
+            return sum(1 for g in self._generations.values() if g.finished_at is None)
+
+    def subscribe(self, api_key, callback):
+        """
+        Calls `callback(snapshot)` from the poller thread on every status change
+        of the key's generations (all keys when `api_key` is None). Returns a
+        function that removes the subscription.
+        """
+        entry = (api_key, callback)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def push(self, tracks, authorize=None):
+        """
+        Applies track objects delivered by a callback to the generations that
+        contain them. `authorize(api_key)` decides whether the sender may update
+        a generation of that key. Returns (updated request IDs, number of
+        generations the sender was not authorized for).
+        """
+        by_id = {track['id']: track for track in tracks if isinstance(track, dict) and track.get('id')}
+        with self._lock:
+            matches = [g for g in self._generations.values() if g.finished_at is None and by_id.keys() & set(g.ids)]
+        updated, rejected = [], 0
+        for generation in matches:
+            if authorize is not None and not authorize(generation.api_key):
+                rejected += 1
+                continue
+            self._apply_tracks(generation, [by_id[i] for i in generation.ids if i in by_id], reschedule=False)
+            updated.append(generation.request_id)
+        return updated, rejected
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                self._purge(now)
+                expired = [g for g in self._generations.values()
+                           if g.finished_at is None and now - g.created_at > self.max_age]
+            for generation in expired:
+                self._update(generation, {
+                    'status': 'failed', 'results': generation.results,
+                    'message': f"Generation did not finish within {self.max_age / 60:.0f} minutes."
+                })
+            with self._lock:
+                due_keys = {g.api_key for g in self._generations.values() if g.finished_at is None and g.next_poll <= now}
+            for api_key in due_keys:
+                try:
+                    self._poll_key(api_key)
+                except Exception as e:
+                    logging.error(f"Generation poller error: {e}")
+            with self._lock:
+                # Wake for the next poll, or to purge finished generations once their retention ends
+                pending = [g.next_poll if g.finished_at is None else g.finished_at + self.retention
+                           for g in self._generations.values()]
+            timeout = max(0.0, min(pending) - time.monotonic()) if pending else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _purge(self, now):
+        expired = [key for key, g in self._generations.items() if g.finished_at and now - g.finished_at > self.retention]
+        for key in expired:
+            del self._generations[key]
+
+    def _poll_key(self, api_key):
+        # Every unfinished generation of the key rides along in the same batched calls.
+        with self._lock:
+            generations = [g for g in self._generations.values() if g.api_key == api_key and g.finished_at is None]
+        try:
+            client = self.client_for_key(api_key)
+        except Exception as e:
+            logging.error(f"Could not get a client to poll {len(generations)} generations: {e}")
+            for generation in generations:
+                self._update(generation, None)  # Backs off instead of retrying at once
+            return
+        batch, batch_ids = [], 0
+        for generation in generations:
+            if batch and batch_ids + len(generation.ids) > self.batch_size:
+                self._poll_batch(client, batch)
+                batch, batch_ids = [], 0
+            batch.append(generation)
+            batch_ids += len(generation.ids)
+        if batch:
+            self._poll_batch(client, batch)
+
+    def _poll_batch(self, client, batch):
+        ids = [i for generation in batch for i in generation.ids]
+        try:
+            response = client.fetch_generation_tracks(ids)
+        except SunoAuthError as e:
+            for generation in batch:
+                self._update(generation, {'status': 'failed', 'results': [], 'message': str(e)})
+            return
+        except SunoError as e:
+            logging.warning(f"Polling {len(ids)} generation IDs failed: {e}")
+            for generation in batch:
+                self._update(generation, None)
+            return
+        except Exception as e:
+            logging.error(f"Unexpected error polling {len(ids)} generation IDs: {e}")
+            for generation in batch:
+                self._update(generation, None)
+            return
+
+        if not isinstance(response, list):
+            if len(batch) > 1:
+                # An error object for a combined call; isolate the offending generation.
+                for generation in batch:
+                    self._poll_batch(client, [generation])
+                return
+            self._update(batch[0], summarize_tracks(response))
+            return
+
+        tracks = {track.get('id'): track for track in response if isinstance(track, dict)}
+        for generation in batch:
+            self._apply_tracks(generation, [tracks[i] for i in generation.ids if i in tracks])
+
+    def _apply_tracks(self, generation, tracks, reschedule=True):
+        """Merges fresh track objects into a generation and updates its summary."""
+        with self._lock:
+            generation.tracks.update((track['id'], track) for track in tracks)
+            known = [generation.tracks[i] for i in generation.ids if i in generation.tracks]
+        summary = summarize_tracks(known)
+        if len(known) < len(generation.ids) and summary['status'] == 'completed':
+            summary['status'] = 'processing'
+        self._update(generation, summary, reschedule)
+
+    def _update(self, generation, summary, reschedule=True):
+        """
+        Applies a poll or callback result (None for a failed poll) and, unless
+        `reschedule` is False, schedules the next poll.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if generation.finished_at is not None:
+                return
+            changed = summary is not None and (
+                summary['status'] != generation.status or len(summary['results']) != len(generation.results)
+            )
+            if changed:
+                generation.status = summary['status']
+                generation.results = summary['results']
+                generation.message = summary.get('message')
+                generation.interval = generation.base_interval
+                generation.next_poll = now + generation.interval
+            elif reschedule:
+                max_interval = max(self.max_interval, generation.base_interval)
+                generation.interval = min(max_interval, generation.interval * self.backoff)
+                generation.next_poll = now + generation.interval
+            finished = changed and generation.status in TERMINAL_STATUSES
+            if finished:
+                generation.finished_at = now
+            snapshot = generation.snapshot()
+            subscribers = [cb for key, cb in self._subscribers if key is None or key == generation.api_key]
+
+        if not changed:
+            return
+        if finished and generation.status == 'completed' and self.on_complete is not None:
+            try:
+                self.on_complete(snapshot)
+            except Exception as e:
+                logging.error(f"Could not process completed generation {generation.request_id}: {e}")
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logging.error(f"Generation subscriber failed: {e}")
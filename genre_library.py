@@ -0,0 +1,187 @@
+"""
+Reference library of labelled feature vectors for nearest-neighbour genre
+classification.
+
+Build or update the library from a folder with one sub-folder per genre:
+
+    python genre_library.py build path/to/tagged_music [-o genre_library.npz] [--workers 4]
+
+Files already in the library are only analyzed again if they changed.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import config
+from feature_index import DIMENSIONS, feature_vector
+
+AUDIO_EXTENSIONS = tuple('.' + ext for ext in config.ALLOWED_EXTENSIONS)
+
+
+class GenreLibrary:
+    """
+    Labelled reference vectors, standardised per dimension. `classify()`
+    ranks genres by distance-weighted votes of the k nearest references,
+    using one matrix-vector product over the whole library.
+    """
+
+    def __init__(self, vectors, labels, paths=None, mtimes=None):
+        self.vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, DIMENSIONS)
+        self.labels = np.asarray(labels, dtype=str)
+        self.paths = np.asarray(paths if paths is not None else [''] * len(self.labels), dtype=str)
+        self.mtimes = np.asarray(mtimes if mtimes is not None else [0.0] * len(self.labels), dtype=np.float64)
+        self.genres, self._label_index = np.unique(self.labels, return_inverse=True)
+
+        std = self.vectors.std(axis=0) if len(self.vectors) else np.ones(DIMENSIONS, dtype=np.float32)
+        self._mean = self.vectors.mean(axis=0) if len(self.vectors) else np.zeros(DIMENSIONS, dtype=np.float32)
+        self._scale = np.where(std > 1e-8, 1.0 / np.maximum(std, 1e-8), 1.0).astype(np.float32)
+        self._scaled = (self.vectors - self._mean) * self._scale
+        self._sq_norms = np.einsum('ij,ij->i', self._scaled, self._scaled)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['vectors'], data['labels'], data['paths'], data['mtimes'])
+
+    def save(self, path):
+        """Writes the library atomically, so a running server never reads a partial file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.genre-library-', suffix='.npz', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, vectors=self.vectors, labels=self.labels, paths=self.paths, mtimes=self.mtimes)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def classify(self, vector, k=config.GENRE_KNN_NEIGHBOURS):
+        """Returns [(genre, score)] for the genres among the k nearest references, best first; scores sum to 1."""
+        if not len(self):
+            return []
+        query = (np.asarray(vector, dtype=np.float32).reshape(-1) - self._mean) * self._scale
+        distances = self._sq_norms - 2.0 * (self._scaled @ query) + query @ query
+        k = min(k, len(self))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        weights = 1.0 / (np.sqrt(np.maximum(distances[nearest], 0.0)) + 1e-6)
+        votes = np.bincount(self._label_index[nearest], weights=weights, minlength=len(self.genres))
+        votes /= votes.sum()
+        ranked = np.argsort(votes)[::-1]
+        return [(str(self.genres[i]), round(float(votes[i]), 4)) for i in ranked if votes[i] > 0]
+
+
+_LIBRARY = None
+_LIBRARY_SIGNATURE = None
+_LIBRARY_LOCK = threading.Lock()
+
+
+def reference_library(path=None):
+    """Returns the reference library, reloading it when the file changes, or None if there is none."""
+    global _LIBRARY, _LIBRARY_SIGNATURE
+    path = path or config.GENRE_LIBRARY_PATH
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+    with _LIBRARY_LOCK:
+        if signature != _LIBRARY_SIGNATURE:
+            try:
+                _LIBRARY = GenreLibrary.load(path)
+                logging.info(f"Loaded genre reference library with {len(_LIBRARY)} tracks from {path}")
+            except Exception as e:
+                logging.error(f"Could not load genre reference library {path}: {e}")
+                _LIBRARY = None
+            _LIBRARY_SIGNATURE = signature
+        return _LIBRARY
+
+
+def _analyze_file(path):
+    """Feature vector of one file (runs in a worker process)."""
+    from audio_analyzer import AudioAnalyzer
+    try:
+        vector = feature_vector(AudioAnalyzer(path).analyze())
+    except Exception as e:
+        return path, None, str(e)
+    return path, vector, None if vector is not None else "incomplete features"
+
+
+def tagged_files(root):
+    """Yields (genre, path) for every audio file under root/<genre>/."""
+    for genre in sorted(os.listdir(root)):
+        genre_dir = os.path.join(root, genre)
+        if not os.path.isdir(genre_dir):
+            continue
+        for dirpath, _, filenames in os.walk(genre_dir):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(AUDIO_EXTENSIONS):
+                    yield genre, os.path.abspath(os.path.join(dirpath, filename))
+
+
+def build_library(root, output, workers=None):
+    """Analyzes new or changed files under a tagged folder and writes the library. Returns it."""
+    previous = GenreLibrary.load(output) if os.path.exists(output) else None
+    known = {}
+    if previous is not None:
+        known = {path: (mtime, vector) for path, mtime, vector in zip(previous.paths, previous.mtimes, previous.vectors)}
+
+    labels, paths, mtimes, vectors, pending = [], [], [], [], {}
+    for genre, path in tagged_files(root):
+        mtime = os.path.getmtime(path)
+        cached = known.get(path)
+        if cached is not None and cached[0] == mtime:
+            labels.append(genre)
+            paths.append(path)
+            mtimes.append(mtime)
+            vectors.append(cached[1])
+        else:
+            pending[path] = (genre, mtime)
+
+    logging.info(f"{len(paths)} tracks unchanged, analyzing {len(pending)}")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for done, (path, vector, error) in enumerate(executor.map(_analyze_file, pending), 1):
+            if vector is None:
+                logging.warning(f"Skipping {path}: {error}")
+                continue
+            genre, mtime = pending[path]
+            labels.append(genre)
+            paths.append(path)
+            mtimes.append(mtime)
+            vectors.append(vector)
+            if done % 50 == 0:
+                logging.info(f"Analyzed {done}/{len(pending)} files")
+
+    library = GenreLibrary(np.array(vectors, dtype=np.float32).reshape(-1, DIMENSIONS), labels, paths, mtimes)
+    library.save(output)
+    counts = {genre: int(n) for genre, n in zip(*np.unique(library.labels, return_counts=True))}
+    logging.info(f"Wrote {len(library)} reference tracks to {output}: {counts}")
+    return library
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the genre reference library from tagged folders.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Analyze <folder>/<genre>/* into the reference library.")
+    build.add_argument('folder', help="Folder with one sub-folder of audio files per genre.")
+    build.add_argument('-o', '--output', default=config.GENRE_LIBRARY_PATH, help="Library file (default: %(default)s).")
+    build.add_argument('--workers', type=int, default=None, help="Analysis processes (default: CPU count).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not os.path.isdir(args.folder):
+        parser.error(f"{args.folder} is not a folder")
+    build_library(args.folder, args.output, workers=args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
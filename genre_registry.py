@@ -0,0 +1,189 @@
+import json
+import logging
+import math
+import numbers
+import os
+import tempfile
+import threading
+
+import config
+from genre_scoring import ENERGY_LEVELS, GenreRuleScorer
+
+RULE_FEATURES = ('tempo', 'energy', 'zero_crossing_rate', 'spectral_centroid')
+TEXT_FIELDS = ('texture', 'notes')
+
+
+class DuplicateGenreError(ValueError):
+    """Raised when a genre name (compared case-insensitively) is defined more than once."""
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _validate_rule_set(genre, rules):
+    if not isinstance(rules, dict):
+        raise ValueError(f"Rules of '{genre}' must be an object or a list of objects.")
+    for feature, rule in rules.items():
+        if feature not in RULE_FEATURES:
+            raise ValueError(f"Unknown feature '{feature}' in the rules of '{genre}' (use {', '.join(RULE_FEATURES)}).")
+        if feature == 'energy' and isinstance(rule, str):
+            rule = {'is': rule}  # Checked like a level, though scoring ignores plain strings (see _allowed_levels)
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule '{feature}' of '{genre}' must be an object.")
+        for bound in ('min', 'max'):
+            if bound in rule and not _is_number(rule[bound]):
+                raise ValueError(f"'{feature}.{bound}' of '{genre}' must be a finite number.")
+        if _is_number(rule.get('min')) and _is_number(rule.get('max')) and rule['min'] > rule['max']:
+            raise ValueError(f"'{feature}.min' of '{genre}' is greater than its max.")
+        for level_key in ('is', 'not'):
+            value = rule.get(level_key)
+            if value is None:
+                continue
+            if feature != 'energy' or value not in ENERGY_LEVELS:
+                raise ValueError(f"'{feature}.{level_key}' of '{genre}' must be one of {', '.join(ENERGY_LEVELS)} (energy only).")
+        unknown = set(rule) - {'min', 'max', 'is', 'not'}
+        if unknown:
+            raise ValueError(f"Unknown keys {sorted(unknown)} in rule '{feature}' of '{genre}'.")
+
+
+def validate_rules(rules):
+    """Raises ValueError describing the first problem if `rules` is not a valid genre_rules.json document."""
+    if not isinstance(rules, list):
+        raise ValueError("Genre rules must be a list of genre entries.")
+    seen = set()
+    for entry in rules:
+        if not isinstance(entry, dict) or not isinstance(entry.get('genre'), str) or not entry['genre'].strip():
+            raise ValueError("Every genre entry needs a non-empty 'genre' name.")
+        genre = entry['genre']
+        if genre.lower() in seen:
+            raise DuplicateGenreError(f"Genre '{genre}' is defined more than once.")
+        seen.add(genre.lower())
+        rule_sets = entry.get('rules', {})
+        if isinstance(rule_sets, list):
+            if not rule_sets:
+                raise ValueError(f"Rules of '{genre}' must not be an empty list.")
+            for rules_set in rule_sets:
+                _validate_rule_set(genre, rules_set)
+        else:
+            _validate_rule_set(genre, rule_sets)
+        instruments = entry.get('typical_instruments', [])
+        if not isinstance(instruments, list) or not all(isinstance(i, str) for i in instruments):
+            raise ValueError(f"'typical_instruments' of '{genre}' must be a list of strings.")
+        for field in TEXT_FIELDS:
+            if field in entry and not isinstance(entry[field], str):
+                raise ValueError(f"'{field}' of '{genre}' must be a string.")
+
+
+class GenreRules:
+    """One loaded version of the genre rules. Treat it as read-only; the registry swaps in a new one on change."""
+
+    def __init__(self, rules, version=None):
+        self.rules = rules
+        self.version = version
+        self._by_genre = {entry['genre']: entry for entry in rules}
+        self._scorer = None
+
+    def __len__(self):
+        return len(self.rules)
+
+    def get(self, genre):
+        """The entry for a genre, or None."""
+        return self._by_genre.get(genre)
+
+    @property
+    def genres(self):
+        return [entry['genre'] for entry in self.rules]
+
+    @property
+    def scorer(self):
+        """GenreRuleScorer for this version, compiled on first use."""
+        if self._scorer is None:
+            self._scorer = GenreRuleScorer(self.rules)
+        return self._scorer
+
+
+class GenreRulesRegistry:
+    """
+    Process-wide genre rules. The file is parsed once and re-read only when
+    its modification time or size changes; a new version replaces the old
+    one in a single assignment, so readers always see a complete set. An
+    edit that does not parse or validate is logged and the previous version
+    is kept. Writes are validated and atomically replace the file.
+    """
+
+    def __init__(self, path=config.GENRE_RULES_PATH):
+        self.path = path
+        self._current = GenreRules([])
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def current(self):
+        """Returns the current GenreRules, reloading the file if it changed."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return self._current
+        with self._lock:
+            if signature != self._signature:
+                self._reload(signature)
+            return self._current
+
+    def _reload(self, signature):
+        if signature is None:
+            logging.error(f"Genre rules file not found: {self.path}")
+        else:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    rules = json.load(f)
+                validate_rules(rules)
+            except (IOError, ValueError) as e:  # json.JSONDecodeError is a ValueError
+                logging.error(f"Could not load {self.path}, keeping the previous genre rules: {e}")
+            else:
+                self._current = GenreRules(rules, version=signature)
+                logging.info(f"Loaded {len(rules)} genre rules from {self.path}")
+        self._signature = signature
+
+    def save(self, rules):
+        """Validates and atomically writes a complete rule list. Raises ValueError if it is invalid."""
+        validate_rules(rules)
+        with self._lock:
+            self._write(rules)
+        return self._current
+
+    def add(self, entry):
+        """Appends a genre entry. Raises DuplicateGenreError if the genre exists, ValueError if it is invalid."""
+        with self._lock:
+            rules = list(self._current_locked().rules) + [entry]
+            validate_rules(rules)
+            self._write(rules)
+        return self._current
+
+    def _current_locked(self):
+        signature = self._file_signature()
+        if signature != self._signature:
+            self._reload(signature)
+        return self._current
+
+    def _write(self, rules):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.genre-rules-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(rules, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._signature = self._file_signature()
+        self._current = GenreRules(rules, version=self._signature)
+
+
+# Shared by the web app, the analyzer and the prompt generator
+GENRE_RULES = GenreRulesRegistry()
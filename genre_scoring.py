@@ -0,0 +1,111 @@
+import numpy as np
+
+# Numeric features the genre rules can bound, and how far outside a bound counts
+# as one unit of misfit (e.g. 8 BPM below a tempo minimum).
+RULE_FEATURES = ('tempo', 'energy_value', 'zero_crossing_rate', 'spectral_centroid')
+FEATURE_TOLERANCES = np.array([8.0, 0.01, 0.02, 300.0])
+ENERGY_LEVELS = ('low', 'medium', 'high')
+ENERGY_MISMATCH_PENALTY = 2.0  # Misfit added when the energy level is excluded by a rule
+
+
+def _bounds(rule):
+    """(min, max) of a rule entry, with infinities for missing bounds."""
+    if not isinstance(rule, dict):
+        return -np.inf, np.inf
+    low, high = rule.get('min'), rule.get('max')
+    return (-np.inf if low is None else float(low)), (np.inf if high is None else float(high))
+
+
+def _allowed_levels(rule):
+    """
+    Energy levels a rule entry accepts: {'is': level} accepts one, {'not': level}
+    the others. A plain string such as "high" accepts every level, because the
+    first-match classifier never applied it and genre_rules.json relies on that.
+    """
+    if not isinstance(rule, dict):
+        return [True] * len(ENERGY_LEVELS)
+    if rule.get('is') is not None:
+        return [level == rule['is'] for level in ENERGY_LEVELS]
+    if rule.get('not') is not None:
+        return [level != rule['not'] for level in ENERGY_LEVELS]
+    return [True] * len(ENERGY_LEVELS)
+
+
+class GenreRuleScorer:
+    """
+    genre_rules.json compiled into NumPy bound arrays. Every rule set gets a
+    min and max per numeric feature and a mask of accepted energy levels, so
+    one vectorised pass scores all genres for one or many tracks.
+
+    A track's score for a rule set is exp(-misfit / 2), where misfit sums the
+    squared distances outside each bound (in FEATURE_TOLERANCES units) and a
+    penalty for an excluded energy level. A rule set that fits scores 1.
+    Genres whose rules are a list (OR) take their best rule set. Ties keep
+    the file order, so the top genre is the first fully matching rule, as
+    with first-match classification.
+    """
+
+    def __init__(self, genre_rules):
+        genres, owners, lows, highs, levels = [], [], [], [], []
+        for entry in genre_rules:
+            rule_sets = entry.get('rules', [])
+            rule_sets = rule_sets if isinstance(rule_sets, list) else [rule_sets]
+            if not rule_sets:
+                continue
+            genres.append(entry['genre'])
+            for rules in rule_sets:
+                bounds = [_bounds(rules.get(feature if feature != 'energy_value' else 'energy'))
+                          for feature in RULE_FEATURES]
+                owners.append(len(genres) - 1)
+                lows.append([low for low, _ in bounds])
+                highs.append([high for _, high in bounds])
+                levels.append(_allowed_levels(rules.get('energy')))
+        self.genres = genres
+        self._owners = np.array(owners, dtype=np.intp)
+        self._low = np.array(lows, dtype=np.float64).reshape(-1, len(RULE_FEATURES))
+        self._high = np.array(highs, dtype=np.float64).reshape(-1, len(RULE_FEATURES))
+        self._levels = np.array(levels, dtype=bool).reshape(-1, len(ENERGY_LEVELS))
+
+    @staticmethod
+    def feature_matrix(tracks):
+        """(values, energy level indices) for a list of feature dicts; missing values are NaN / -1."""
+        values = np.array([[track.get(feature, np.nan) if isinstance(track.get(feature), (int, float)) else np.nan
+                            for feature in RULE_FEATURES] for track in tracks], dtype=np.float64)
+        levels = np.array([ENERGY_LEVELS.index(track['energy']) if track.get('energy') in ENERGY_LEVELS else -1
+                           for track in tracks], dtype=np.intp)
+        return values.reshape(-1, len(RULE_FEATURES)), levels
+
+    def score_matrix(self, values, levels, chunk_size=4096):
+        """Scores in [0, 1] for every track (rows) and genre (columns)."""
+        values = np.asarray(values, dtype=np.float64)
+        levels = np.asarray(levels, dtype=np.intp)
+        scores = np.zeros((len(values), len(self.genres)))
+        if not self.genres:
+            return scores
+        # Chunked so the (tracks, rules, features) intermediate stays small for whole catalogues
+        for start in range(0, len(values), chunk_size):
+            end = start + chunk_size
+            self._score_chunk(values[start:end], levels[start:end], scores[start:end])
+        return scores
+
+    def _score_chunk(self, values, levels, scores):
+        x = values[:, None, :]
+        outside = np.maximum(self._low - x, 0.0) + np.maximum(x - self._high, 0.0)
+        outside = np.nan_to_num(outside / FEATURE_TOLERANCES, nan=0.0)  # Unknown features do not count against a rule
+        misfit = np.einsum('trf,trf->tr', outside, outside)
+        known = levels >= 0
+        excluded = np.zeros_like(misfit, dtype=bool)
+        excluded[known] = ~self._levels[:, levels[known]].T
+        misfit += ENERGY_MISMATCH_PENALTY * excluded
+        rule_scores = np.exp(-0.5 * misfit)
+        np.maximum.at(scores.T, self._owners, rule_scores.T)
+
+    def rank_many(self, tracks, k=5):
+        """[(genre, score)] of the k best genres for each feature dict, best first."""
+        scores = self.score_matrix(*self.feature_matrix(tracks))
+        # Stable sort on the negated scores keeps the file order among ties
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return [[(self.genres[g], round(float(row[g]), 4)) for g in ranked] for row, ranked in zip(scores, order)]
+
+    def rank(self, features, k=5):
+        return self.rank_many([features], k)[0]
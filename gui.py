@@ -5,22 +5,43 @@ import multiprocessing
 import queue
 import os
 import json
-import torch
-import cpuinfo
-import pygame
 import requests
 import io
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import nullcontext
 from audio_analyzer import AudioAnalyzer
 from prompt_generator import PromptGenerator
-from suno_client import SunoClient
+from suno_client import SunoClientPool
+from audio_cache import AudioCache
+from account_pool import AccountPool
+from genre_registry import GENRE_RULES
+from generation_poller import GenerationPoller
+from analysis_jobs import analysis_key, hash_file
 from gui_builder import BuildGUI
+from lazy_imports import lazy_import, is_loaded, preload
+from model_cache import ModelCache
+import hardware_profile
+from instrumentation import StageProgress, timed
+from profiling import profiled
 import subprocess
 import config
 
 import sys
 
+# torch and pygame are imported on first use so the window opens immediately.
+torch = lazy_import('torch')
+pygame = lazy_import('pygame')
+
+def init_audio_mixer():
+    """Initializes pygame and its mixer the first time audio is played."""
+    if not pygame.mixer.get_init():
+        pygame.init()
+        pygame.mixer.init()
+
 # --- Analysis Worker Function (for multiprocessing) ---
-def run_analysis_in_process(q, filepath, device, genre_var, model_quality_var, demucs_model_var, save_vocals_var):
+def run_analysis_in_process(q, filepath, device, genre_var, model_quality_var, demucs_model_var, save_vocals_var, profile=False):
     """
     This function runs in a separate process to avoid blocking the GUI.
     It communicates with the main thread via a multiprocessing.Queue.
@@ -33,44 +54,46 @@ def run_analysis_in_process(q, filepath, device, genre_var, model_quality_var, d
             print(f"Could not put message in queue: {e}")
 
     try:
-        _put_in_queue({'type': 'progress', 'value': 5, 'log_message': "Analyzing audio features..."})
-        # Note: model_cache is not shared across processes. Each process will have its own cache.
-        analyzer = AudioAnalyzer(filepath, device=device, model_cache={})
-        features = analyzer.analyze()
+        if device == 'cpu':
+            hardware_profile.apply_thread_settings()
+        profile_dir = os.path.join(config.PROFILE_FOLDER, uuid.uuid4().hex)
+        profiler = profiled(profile_dir, mode=config.PROFILING_MODE) if profile else nullcontext({})
+        with profiler as profile_summary:
+            total_start = time.perf_counter()
+            progress = StageProgress(lambda value, status: _put_in_queue({'type': 'progress', 'value': value, 'log_message': status}))
+            # Note: model_cache is not shared across processes. Each process will have its own cache.
+            analyzer = AudioAnalyzer(filepath, device=device, model_cache=ModelCache(), progress_callback=progress)
+            features = analyzer.analyze()
+            timings = analyzer.timings
         
-        _put_in_queue({'type': 'progress', 'value': 20, 'log_message': "Detecting tempo and key..."})
-        selected_genre = genre_var
-        if selected_genre == "Auto-detect":
-            selected_genre = None
+            selected_genre = genre_var
+            if selected_genre == "Auto-detect":
+                selected_genre = None
         
-        _put_in_queue({'type': 'progress', 'value': 25, 'log_message': "Classifying genre and mood..."})
-        genre = analyzer.classify_genre(selected_genre=selected_genre)
-        mood = analyzer.classify_mood()
+            _put_in_queue({'type': 'progress', 'value': 30, 'log_message': "Classifying genre and mood..."})
+            with timed(timings, 'classification'):
+                genre = analyzer.classify_genre(selected_genre=selected_genre)
+                mood = analyzer.classify_mood()
+                instruments = analyzer.detect_instruments(genre)
+                has_vocals = analyzer.detect_vocals()
         
-        _put_in_queue({'type': 'progress', 'value': 30, 'log_message': "Analyzing instruments..."})
-        instruments = analyzer.detect_instruments(genre)
-        has_vocals = analyzer.detect_vocals()
-        
-        lyrics, vocal_gender = None, None
-        if has_vocals:
-            _put_in_queue({'type': 'progress', 'value': 40, 'log_message': "Separating vocals (can be slow)..."})
-            model_quality = model_quality_var
-            demucs_model = demucs_model_var
-            save_vocals = save_vocals_var
-            
-            _put_in_queue({'type': 'progress', 'value': 60, 'log_message': f"Transcribing lyrics with Whisper ({model_quality})..."})
-            vocal_info = analyzer.extract_lyrics(
-                model_quality=model_quality,
-                demucs_model=demucs_model,
-                save_vocals=save_vocals,
-                output_dir=os.path.dirname(filepath)
-            )
-            lyrics = vocal_info.get('lyrics')
-            vocal_gender = vocal_info.get('gender')
+            lyrics, vocal_gender = None, None
+            if has_vocals:
+                vocal_info = analyzer.extract_lyrics(
+                    model_quality=model_quality_var,
+                    demucs_model=demucs_model_var,
+                    save_vocals=save_vocals_var,
+                    output_dir=os.path.dirname(filepath)
+                )
+                lyrics = vocal_info.get('lyrics')
+                vocal_gender = vocal_info.get('gender')
         
-        _put_in_queue({'type': 'progress', 'value': 90, 'log_message': "Generating prompts..."})
-        generator = PromptGenerator(features, genre, mood, instruments, has_vocals, lyrics, vocal_gender)
-        variations = generator.generate_variations()
+            _put_in_queue({'type': 'progress', 'value': 90, 'log_message': "Generating prompts..."})
+            with timed(timings, 'prompt_generation'):
+                generator = PromptGenerator(features, genre, mood, instruments, has_vocals, lyrics, vocal_gender,
+                                            genre_candidates=analyzer.genre_candidates)
+                variations = generator.generate_variations()
+            timings['total'] = round(time.perf_counter() - total_start, 4)
         
         result_data = {
             'type': 'result',
@@ -78,9 +101,14 @@ def run_analysis_in_process(q, filepath, device, genre_var, model_quality_var, d
             'analysis_data': {
                 'genre': genre, 'mood': mood, 'instruments': instruments,
                 'has_vocals': has_vocals, 'lyrics': lyrics, 'vocal_gender': vocal_gender,
-                'full_analysis_data': features
+                'genre_candidates': [{'genre': g, 'score': score} for g, score in analyzer.genre_candidates],
+                'full_analysis_data': features,
+                'timings': timings
             }
         }
+        if profile:
+            result_data['analysis_data']['profile'] = profile_summary
+            _put_in_queue({'type': 'log', 'message': f"Profile written to: {os.path.abspath(profile_dir)}"})
         _put_in_queue(result_data)
 
     except Exception as e:
@@ -272,6 +300,7 @@ class AudioPlayer(ttk.Frame):
         self.download_button.pack(side=tk.LEFT)
 
     def load_audio(self):
+        init_audio_mixer()
         if self.audio_data:
             try:
                 # If raw audio data is provided, load it from a BytesIO object
@@ -281,15 +310,13 @@ class AudioPlayer(ttk.Frame):
                 self.app.log(f"Error loading audio from data: {e}")
                 return False
         elif self.audio_url:
-            # This should already be handled by the main app, but as a fallback
-            self.app.log("Audio data not pre-loaded, attempting download...")
+            # Normally pre-loaded by the main app; otherwise play from the shared audio cache
+            self.app.log("Audio data not pre-loaded, fetching into the audio cache...")
             try:
-                client = self.app.suno_client
-                if not client:
-                    self.app.log("Suno client not available for fallback download.")
-                    return False
-                self.audio_data = client.download_audio(self.audio_url)
-                pygame.mixer.music.load(io.BytesIO(self.audio_data))
+                path = self.app.audio_cache.fetch(self.audio_id, self.audio_url)
+                pygame.mixer.music.load(path)
+                with open(path, 'rb') as f:
+                    self.audio_data = f.read() # Kept for "Download MP3"
                 return True
             except Exception as e:
                 self.app.log(f"Error downloading/loading audio: {e}")
@@ -344,17 +371,34 @@ class PromptGeneratorGUI:
         master.configure(bg="#282c34")
 
         self.filepath = None
-        self.model_cache = {}
+        self.analysis_process = None
+        self.analysis_key = None
+        self.model_cache = ModelCache()
         self.analysis_results = {}
         self.genre_rules = self.load_genre_rules()
         self.suno_client = None # Will be initialized after account selection
-        
-        # --- Initialize Pygame Mixer ---
-        pygame.init()
-        pygame.mixer.init()
+        self.audio_cache = AudioCache() # Clips are downloaded once and replayed from disk
+        self.suno_clients = SunoClientPool()
+        self.account_pool = AccountPool("suno_accounts.json") # Re-reads the file only when it changes
+        # Background threads hand UI work to the Tk thread through this queue (see _drain_ui_queue)
+        self.ui_queue = queue.Queue()
+        # One background poller follows every generation card in batched status calls
+        self.generation_cards = {}
+        self.generation_poller = GenerationPoller(lambda api_key: self.suno_clients.get(api_key, base_url=config.SUNO_API_URL))
+        self.generation_poller.subscribe(None, self._on_generation_update)
+        self.generation_poller.subscribe(None, self.audio_cache.prefetch_generation)
+
+        # --- Hardware is detected in the background once torch has been imported ---
+        self.cpu_model = "Detecting..."
+        self.gpu_model = "Detecting..."
+        self.pytorch_gpu = False
+        self.device = None
+        self.recommended = {'model_quality': 'base', 'demucs_model': 'htdemucs_ft'}
+        self.hardware_ready = threading.Event()
+        self.hardware_error = None
 
         self.setup_styles()
-        self.detect_hardware()
+        preload(['torch', 'librosa'], on_complete=self.detect_hardware)
         self.initialize_suno_client()
 
         self._create_menubar()
@@ -381,6 +425,8 @@ class PromptGeneratorGUI:
         self._create_action_ui()
         self._create_metadata_ui()
         self._create_results_ui()
+        self.master.after(100, self._poll_hardware_ready)
+        self.master.after(50, self._drain_ui_queue)
 
     def setup_styles(self):
         style = ttk.Style()
@@ -418,19 +464,57 @@ class PromptGeneratorGUI:
                   foreground=[("selected", "white")])
 
     def detect_hardware(self):
-        self.cpu_model = cpuinfo.get_cpu_info().get('brand_raw', 'N/A')
-        self.pytorch_gpu = torch.cuda.is_available()
-        self.gpu_model = "N/A"
-        if self.pytorch_gpu:
-            self.gpu_model = torch.cuda.get_device_name(0)
+        """Runs in the background preload thread once the ML modules are imported. Makes no Tk calls."""
+        try:
+            profile = hardware_profile.get_profile()
+            self.cpu_model = profile['system']['cpu_model']
+            self.gpu_model = profile['system']['gpu_model']
+            self.pytorch_gpu = profile['system']['cuda_available']
+        except Exception as e:
+            self.hardware_error = e
+            self.pytorch_gpu = False
         self.device = 'cuda' if self.pytorch_gpu else 'cpu'
+        self.hardware_ready.set()
+
+    def _poll_hardware_ready(self):
+        """Applies the detected hardware on the Tk thread once detection has finished."""
+        if not self.hardware_ready.is_set():
+            self.master.after(100, self._poll_hardware_ready)
+            return
+        if self.hardware_error is not None:
+            self.log(f"ERROR: Could not detect hardware: {self.hardware_error}")
+        self._update_status_ui()
+        self._poll_calibration(hardware_profile.start_calibration())
+
+    def _poll_calibration(self, thread):
+        if thread is not None and thread.is_alive():
+            self.master.after(1000, self._poll_calibration, thread)
+        else:
+            self._apply_recommended_settings()
+
+    def get_device(self):
+        """Returns the processing device, waiting for hardware detection. Only call this from worker threads."""
+        self.hardware_ready.wait()
+        return self.device
 
     def _create_status_ui(self):
         status_frame = ttk.LabelFrame(self.main_frame, text="System Status", padding=10)
         status_frame.pack(fill=tk.X, pady=(0, 10))
 
-        ttk.Label(status_frame, text=f"🖥️ CPU: {self.cpu_model}").pack(anchor="w")
-        ttk.Label(status_frame, text=f"🎮 GPU: {self.gpu_model}").pack(anchor="w")
+        self.cpu_label = ttk.Label(status_frame, text=f"🖥️ CPU: {self.cpu_model}")
+        self.cpu_label.pack(anchor="w")
+        self.gpu_label = ttk.Label(status_frame, text=f"🎮 GPU: {self.gpu_model}")
+        self.gpu_label.pack(anchor="w")
+
+        self.device_label = ttk.Label(status_frame, text="AI Processing (Demucs & Whisper): ● Loading...")
+        self.device_label.pack(anchor="w")
+
+        self.credits_label = ttk.Label(status_frame, text="💰 Suno Credits: N/A")
+        self.credits_label.pack(anchor="w")
+
+    def _update_status_ui(self):
+        self.cpu_label.config(text=f"🖥️ CPU: {self.cpu_model}")
+        self.gpu_label.config(text=f"🎮 GPU: {self.gpu_model}")
 
         processing_device = "GPU" if self.pytorch_gpu else "CPU"
         status_color = "#98c379" if self.pytorch_gpu else "#e5c07b"
@@ -439,10 +523,17 @@ class PromptGeneratorGUI:
         style = ttk.Style()
         style.configure(status_style_name, foreground=status_color)
 
-        ttk.Label(status_frame, text=f"AI Processing (Demucs & Whisper): ● {processing_device}", style=status_style_name).pack(anchor="w")
+        self.device_label.config(text=f"AI Processing (Demucs & Whisper): ● {processing_device}", style=status_style_name)
+        self._apply_recommended_settings()
 
-        self.credits_label = ttk.Label(status_frame, text="💰 Suno Credits: N/A")
-        self.credits_label.pack(anchor="w")
+    def _apply_recommended_settings(self):
+        """Switches the model options to this machine's recommended defaults unless the user changed them."""
+        recommended = hardware_profile.recommended_settings()
+        if self.model_quality_var.get() == self.recommended.get('model_quality', 'base'):
+            self.model_quality_var.set(recommended['model_quality'])
+        if self.demucs_model_var.get() == self.recommended.get('demucs_model', 'htdemucs_ft'):
+            self.demucs_model_var.set(recommended['demucs_model'])
+        self.recommended = recommended
 
     def _create_file_selection_ui(self):
         file_frame = ttk.LabelFrame(self.main_frame, text="1. Select Audio File", padding=10)
@@ -490,6 +581,12 @@ class PromptGeneratorGUI:
         self.auto_lyrics_var = tk.BooleanVar(value=False)
         self.auto_lyrics_check = ttk.Checkbutton(options_frame, text="Auto-generate Lyrics (Advanced Mode)", variable=self.auto_lyrics_var)
         self.auto_lyrics_check.grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+
+        # Profiling is an admin setting (ENABLE_PROFILING), so the option is hidden otherwise
+        self.profile_var = tk.BooleanVar(value=False)
+        if config.ENABLE_PROFILING:
+            self.profile_check = ttk.Checkbutton(options_frame, text="Profile This Analysis", variable=self.profile_var)
+            self.profile_check.grid(row=5, column=0, columnspan=2, padx=5, pady=5, sticky="w")
         
         options_frame.columnconfigure(1, weight=1)
 
@@ -575,6 +672,67 @@ class PromptGeneratorGUI:
             self.log("ERROR: Please select a file first.")
             return
 
+        options = {
+            'selected_genre': self.genre_var.get(),
+            'model_quality': self.model_quality_var.get(),
+            'demucs_model': self.demucs_model_var.get(),
+            'save_vocals': self.save_vocals_var.get(),
+            'profile': self.profile_var.get()
+        }
+        # Hashing reads the whole file, so it runs off the Tk thread
+        filepath = self.filepath
+        file_hash = Future()
+
+        def hash_worker():
+            try:
+                file_hash.set_result(hash_file(filepath))
+            except Exception as e:
+                file_hash.set_exception(e)
+
+        threading.Thread(target=hash_worker, daemon=True).start()
+        self._call_when_done(file_hash, lambda: self._start_analysis(filepath, options, file_hash))
+
+    def _drain_ui_queue(self):
+        """Runs the callbacks queued by background threads on the Tk thread."""
+        while True:
+            try:
+                callback = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback()
+            except Exception as e:
+                self.log(f"ERROR: UI update failed: {e}")
+        self.master.after(50, self._drain_ui_queue)
+
+    def _call_when_done(self, future, callback, interval=50):
+        """Runs callback on the Tk thread once a background future has finished."""
+        if future.done():
+            callback()
+        else:
+            self.master.after(interval, self._call_when_done, future, callback, interval)
+
+    def _start_analysis(self, filepath, options, file_hash, waiting=False):
+        if not self.hardware_ready.is_set():
+            if not waiting:
+                self.log("Waiting for hardware detection to finish...")
+            self.master.after(100, self._start_analysis, filepath, options, file_hash, True)
+            return
+        try:
+            key = analysis_key(file_hash.result(), options)
+        except OSError as e:
+            self.log(f"ERROR: Could not read {filepath}: {e}")
+            return
+
+        # --- Single-flight: never run the same file with the same options twice at once ---
+        if self.analysis_process is not None and self.analysis_process.is_alive():
+            if key == self.analysis_key:
+                self.log("An identical analysis is already running. Waiting for its result...")
+            else:
+                self.log("ERROR: Another analysis is still running. Please wait for it to finish.")
+            return
+        self.analysis_key = key
+
         self.analyze_button.config(state=tk.DISABLED)
         self.progress_var.set(0)
         
@@ -588,12 +746,13 @@ class PromptGeneratorGUI:
         self.analysis_queue = multiprocessing.Queue()
         analysis_args = (
             self.analysis_queue,
-            self.filepath,
+            filepath,
             self.device,
-            self.genre_var.get(),
-            self.model_quality_var.get(),
-            self.demucs_model_var.get(),
-            self.save_vocals_var.get()
+            options['selected_genre'],
+            options['model_quality'],
+            options['demucs_model'],
+            options['save_vocals'],
+            options['profile']
         )
         
         self.analysis_process = multiprocessing.Process(target=run_analysis_in_process, args=analysis_args)
@@ -676,7 +835,7 @@ class PromptGeneratorGUI:
 
     def display_metadata(self):
         try:
-            analyzer = AudioAnalyzer(self.filepath, device=self.device, model_cache=self.model_cache)
+            analyzer = AudioAnalyzer(self.filepath, device=self.get_device(), model_cache=self.model_cache)
             metadata = analyzer.extract_metadata()
             
             # --- Perform a quick analysis for more detailed info ---
@@ -793,46 +952,40 @@ class PromptGeneratorGUI:
             self.master.after(0, lambda: status_label.config(text=error_message))
 
     def poll_suno_status(self, request_ids, prompt_name, generation_card):
-        # This runs in a background thread
-        import time
-        status_label = generation_card.status_label
-        progress_var = generation_card.progress_var
-
-        while True:
-            try:
-                # Network call is safe in a background thread
-                response = self.suno_client.check_generation_status(request_ids)
-                status = response.get('status', 'unknown')
-                
-                completed_tracks = len(response.get('results', []))
-                total_tracks = len(request_ids)
-                progress = (completed_tracks / total_tracks) * 100 if total_tracks > 0 else 0
-                
-                status_text = f"Status: {status.title()} ({completed_tracks}/{total_tracks} complete)"
-
-                # Schedule UI updates on the main thread
-                def update_ui(s, p):
-                    status_label.config(text=s)
-                    progress_var.set(p)
-                self.master.after(0, lambda s=status_text, p=progress: update_ui(s, p))
-
-                if status == 'completed':
-                    self.log(f"Suno generation '{prompt_name}' completed.")
-                    results = response.get('results', [])
-                    # The task_id is now the list of clip_ids
-                    self.master.after(0, lambda r=results, c=generation_card, t=request_ids: self.display_suno_results(r, c, t))
-                    break
-                elif status == 'failed':
-                    raise Exception(response.get('message', 'Generation failed without a specific message.'))
-                
-                time.sleep(5) # This is safe in a background thread
-
-            except Exception as e:
-                error_message = f"ERROR polling Suno status: {e}"
-                self.log(error_message)
-                # Schedule UI updates on the main thread
-                self.master.after(0, lambda: status_label.config(text=error_message))
-                break
+        """Hands a generation to the shared poller; its updates arrive in _on_generation_update."""
+        generation_card.prompt_name = prompt_name
+        generation_card.request_ids = request_ids
+        request_id = ','.join(request_ids)
+        self.generation_cards[request_id] = generation_card
+        snapshot = self.generation_poller.track(self.suno_client.api_key, request_ids)
+        self._on_generation_update(snapshot)
+
+    def _on_generation_update(self, snapshot):
+        # Called from the poller thread; Tk is only touched when the main thread drains the queue
+        self.ui_queue.put(lambda: self._update_generation_card(snapshot))
+
+    def _update_generation_card(self, snapshot):
+        card = self.generation_cards.get(snapshot['request_id'])
+        if card is None:
+            return
+        status = snapshot['status']
+        completed_tracks = snapshot['completed_tracks']
+        total_tracks = snapshot['total_tracks']
+        progress = (completed_tracks / total_tracks) * 100 if total_tracks > 0 else 0
+
+        card.status_label.config(text=f"Status: {status.title()} ({completed_tracks}/{total_tracks} complete)")
+        card.progress_var.set(progress)
+
+        if status == 'completed':
+            del self.generation_cards[snapshot['request_id']]
+            self.log(f"Suno generation '{card.prompt_name}' completed.")
+            # The task_id is now the list of clip_ids
+            self.display_suno_results(snapshot['results'], card, card.request_ids)
+        elif status == 'failed':
+            del self.generation_cards[snapshot['request_id']]
+            error_message = f"ERROR polling Suno status: {snapshot.get('message', 'Generation failed without a specific message.')}"
+            self.log(error_message)
+            card.status_label.config(text=error_message)
 
     def add_generation_card(self, prompt_name, initial_status):
         card = ttk.Frame(self.generations_content_frame, style="Card.TFrame", padding=10)
@@ -883,18 +1036,20 @@ class PromptGeneratorGUI:
 
         for i, result in enumerate(results):
             if result.get('audio_url'):
-                # This is a network call, so it should be in a thread
-                def fetch_and_play(result_data, task_id):
+                # Usually already prefetched by the poller; otherwise downloaded once into the audio cache
+                def on_downloaded(future, result_data=result):
                     try:
-                        audio_url = result_data.get('audio_url')
-                        self.log(f"Downloading audio for '{result_data.get('title')}'...")
-                        audio_data = self.suno_client.download_audio(audio_url)
-                        # Switch back to the main thread to create the player
-                        self.master.after(0, lambda: self._create_player(card, result_data, audio_data, task_id))
+                        with open(future.result(), 'rb') as f:
+                            audio_data = f.read()
+                        # Runs on the cache's download thread; the player is created when the Tk thread drains the queue
+                        self.ui_queue.put(lambda: self._create_player(card, result_data, audio_data, task_id))
                     except Exception as e:
-                        self.log(f"Error fetching audio for {result_data.get('title')}: {e}")
+                        message = f"Error fetching audio for {result_data.get('title')}: {e}"
+                        self.ui_queue.put(lambda: self.log(message))
 
-                threading.Thread(target=fetch_and_play, args=(result, task_id), daemon=True).start()
+                self.log(f"Loading audio for '{result.get('title')}'...")
+                future = self.audio_cache.prefetch(result.get('id'), result['audio_url'])
+                future.add_done_callback(on_downloaded)
             else:
                 self.log(f"No audio_url found for result: {result}")
 
@@ -982,20 +1137,18 @@ class PromptGeneratorGUI:
         self.master.after(30000, self.auto_refresh_credits) # 30 seconds
 
     def load_genre_rules(self):
-        """Loads genre rules from an external JSON file."""
-        try:
-            with open("genre_rules.json", "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            self.log(f"ERROR: Could not load genre_rules.json: {e}")
+        """Loads genre rules from the shared registry."""
+        rules = GENRE_RULES.current().rules
+        if not rules:
+            self.log(f"ERROR: Could not load {config.GENRE_RULES_PATH}")
             messagebox.showerror("Error", "Could not load or parse genre_rules.json. Please ensure it exists and is valid.")
-            return []
+        return rules
 
     def edit_genre_rules(self):
         """Opens the genre_rules.json file in the default text editor."""
         try:
-            os.startfile("genre_rules.json")
-            self.log("Opened genre_rules.json for editing. Please restart the application to apply changes.")
+            os.startfile(config.GENRE_RULES_PATH)
+            self.log("Opened genre_rules.json for editing. Saved changes apply to the next analysis; restart to refresh the genre list.")
         except Exception as e:
             self.log(f"ERROR: Could not open genre_rules.json: {e}")
             messagebox.showerror("Error", f"Could not open genre_rules.json: {e}")
@@ -1028,7 +1181,8 @@ class PromptGeneratorGUI:
                 instruments=analysis_data['instruments'],
                 has_vocals=analysis_data['has_vocals'],
                 lyrics=analysis_data.get('lyrics'),
-                vocal_gender=analysis_data.get('vocal_gender')
+                vocal_gender=analysis_data.get('vocal_gender'),
+                genre_candidates=[(c['genre'], c['score']) for c in analysis_data.get('genre_candidates', [])]
             )
             variations = generator.generate_variations()
             
@@ -1049,21 +1203,16 @@ class PromptGeneratorGUI:
 
 
     def on_closing(self):
-        if pygame.mixer.get_init():
+        if is_loaded('pygame') and pygame.mixer.get_init():
             pygame.mixer.music.stop()
             pygame.mixer.quit()
         self.master.destroy()
 
     def load_accounts(self):
-        try:
-            with open("suno_accounts.json", "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        return self.account_pool.accounts()
 
     def save_accounts(self, accounts):
-        with open("suno_accounts.json", "w") as f:
-            json.dump(accounts, f, indent=4)
+        self.account_pool.save(accounts)
 
     def get_default_account_name(self):
         accounts = self.load_accounts()
@@ -1086,7 +1235,7 @@ class PromptGeneratorGUI:
             accounts = self.load_accounts()
             api_key = accounts[account_name].get('api_key')
             if api_key:
-                self.suno_client = SunoClient(api_key=api_key, base_url=config.SUNO_API_URL)
+                self.suno_client = self.suno_clients.get(api_key, base_url=config.SUNO_API_URL)
                 self.log(f"Suno client initialized with account: {account_name}")
                 # Start the auto-refresh cycle
                 self.master.after(1000, self.auto_refresh_credits)
@@ -0,0 +1,373 @@
+import ctypes
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import soundfile as sf
+from lazy_imports import is_loaded, lazy_import
+from model_cache import ModelCache
+
+torch = lazy_import('torch')
+cpuinfo = lazy_import('cpuinfo')
+
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hardware_profile.json')
+
+# Candidate models, best quality first. Calibration picks the best one that keeps
+# the stage below the real-time budget on this machine.
+DEMUCS_CANDIDATES = ['htdemucs_ft', 'hdemucs_mmi', 'mdx_extra']
+WHISPER_CANDIDATES = ['large', 'medium', 'small', 'base', 'tiny']
+# Relative speed of the Whisper models as published in the Whisper README (large = 1x).
+WHISPER_RELATIVE_SPEED = {'tiny': 32, 'base': 16, 'small': 6, 'medium': 2, 'large': 1}
+# Approximate VRAM (GB) each Whisper model needs on a GPU.
+WHISPER_VRAM_GB = {'tiny': 1, 'base': 1, 'small': 2, 'medium': 5, 'large': 10}
+
+# Seconds of processing allowed per second of audio for each stage.
+REALTIME_BUDGET = 0.5
+CALIBRATION_SECONDS = 6.0
+
+_PROFILE = None
+_LOCK = threading.Lock()
+_CALIBRATION_THREAD = None
+
+
+def _total_ram_bytes():
+    """Returns the total physical memory, or None if it cannot be determined."""
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        pass
+    if sys.platform == 'win32':
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+            ]
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+    return None
+
+
+def _physical_cores():
+    """Returns the number of physical cores, falling back to logical cores."""
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+
+def _package_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def fingerprint():
+    """A cheap identifier of the machine and ML stack, used to invalidate the persisted profile."""
+    parts = [
+        platform.node(), platform.machine(), platform.processor(), str(os.cpu_count()),
+        str(_package_version('torch')), os.environ.get('CUDA_VISIBLE_DEVICES', '')
+    ]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def detect_system():
+    """Collects the static hardware description. Slow (probes the CPU), so it is only run once."""
+    system = {
+        'cpu_model': 'N/A',
+        'cpu_logical_cores': os.cpu_count() or 1,
+        'cpu_physical_cores': _physical_cores(),
+        'ram_bytes': _total_ram_bytes(),
+        'platform': platform.platform(),
+        'torch_version': _package_version('torch'),
+        'cuda_available': False,
+        'gpu_model': 'N/A',
+        'gpu_memory_bytes': None,
+    }
+    try:
+        system['cpu_model'] = cpuinfo.get_cpu_info().get('brand_raw', 'N/A')
+    except Exception as e:
+        logging.warning(f"Could not detect CPU model: {e}")
+    try:
+        if torch.cuda.is_available():
+            system['cuda_available'] = True
+            system['gpu_model'] = torch.cuda.get_device_name(0)
+            system['gpu_memory_bytes'] = torch.cuda.get_device_properties(0).total_memory
+    except Exception as e:
+        logging.warning(f"Could not detect GPU: {e}")
+    return system
+
+
+def _whisper_candidates(system):
+    """Whisper models that fit this machine, best quality first. 'large' is left as an explicit choice."""
+    candidates = [m for m in WHISPER_CANDIDATES if m != 'large']
+    if system.get('cuda_available') and system.get('gpu_memory_bytes'):
+        vram_gb = system['gpu_memory_bytes'] / 1024 ** 3
+        candidates = [m for m in candidates if WHISPER_VRAM_GB[m] * 1.2 <= vram_gb] or ['tiny']
+    return candidates
+
+
+def recommend(system, calibration=None):
+    """Chooses default model and thread settings from the system description and calibration results."""
+    recommended = {
+        'device': 'cuda' if system.get('cuda_available') else 'cpu',
+        'demucs_model': 'htdemucs_ft',
+        'model_quality': 'base',
+        'torch_threads': system.get('cpu_physical_cores') or 1,
+        'source': 'heuristic',
+    }
+    candidates = _whisper_candidates(system)
+    if recommended['device'] == 'cuda':
+        recommended['model_quality'] = candidates[0]
+
+    if calibration:
+        recommended['source'] = 'calibration'
+        demucs_model = (calibration.get('demucs') or {}).get('recommended')
+        if demucs_model:
+            recommended['demucs_model'] = demucs_model
+
+        whisper_result = calibration.get('whisper') or {}
+        if whisper_result.get('realtime_factor'):
+            # Extrapolate from the measured model using the published relative speeds.
+            measured_speed = WHISPER_RELATIVE_SPEED[whisper_result['model']]
+            recommended['model_quality'] = next(
+                (m for m in candidates
+                 if whisper_result['realtime_factor'] * measured_speed / WHISPER_RELATIVE_SPEED[m] <= REALTIME_BUDGET),
+                'tiny'
+            )
+    return recommended
+
+
+def _synthetic_song(duration, sr):
+    """A deterministic stereo test signal: a sung-vowel-like harmonic tone over a noisy backing."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 220.0 * (1 + 0.01 * np.sin(2 * np.pi * 5 * t))  # vibrato
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voice = sum((0.6 / k) * np.sin(k * phase) for k in range(1, 8))
+    backing = 0.1 * rng.standard_normal(t.shape) + 0.2 * np.sin(2 * np.pi * 55 * t)
+    mix = 0.5 * voice + backing
+    stereo = np.stack([mix, 0.9 * mix], axis=1)
+    return (stereo / np.max(np.abs(stereo)) * 0.8).astype(np.float32)
+
+
+def _calibrate_demucs(device, audio_path):
+    """Times each Demucs model, best quality first, stopping at the first one within budget."""
+    from audio_analyzer import Separator
+    runs = {}
+    for model_name in DEMUCS_CANDIDATES:
+        try:
+            separator = Separator(model_name=model_name, device=device)
+            start = time.perf_counter()
+            separator.separate_audio_file(audio_path)
+            rtf = (time.perf_counter() - start) / CALIBRATION_SECONDS
+        except Exception as e:
+            logging.warning(f"Demucs calibration with '{model_name}' failed: {e}")
+            continue
+        runs[model_name] = round(rtf, 4)
+        logging.info(f"Demucs '{model_name}' real-time factor: {rtf:.3f}")
+        if rtf <= REALTIME_BUDGET:
+            return {'runs': runs, 'recommended': model_name}
+    # Nothing met the budget: fall back to the fastest model that worked.
+    return {'runs': runs, 'recommended': min(runs, key=runs.get) if runs else None}
+
+
+def _calibrate_whisper(device, audio, sr, model_cache):
+    whisper = lazy_import('whisper')
+    model_quality = 'base'
+    try:
+        model_key = f"whisper_{model_quality}"
+        model = model_cache.get_or_load(model_key, lambda: whisper.load_model(model_quality, device=device))
+        mono = audio.mean(axis=1)
+        # Whisper expects 16 kHz mono input
+        mono_16k = np.interp(np.arange(0, len(mono), sr / 16000), np.arange(len(mono)), mono).astype(np.float32)
+        start = time.perf_counter()
+        model.transcribe(mono_16k, fp16=(device == 'cuda'))
+        rtf = (time.perf_counter() - start) / CALIBRATION_SECONDS
+        logging.info(f"Whisper '{model_quality}' real-time factor: {rtf:.3f}")
+        return {'model': model_quality, 'realtime_factor': round(rtf, 4)}
+    except Exception as e:
+        logging.warning(f"Whisper calibration failed: {e}")
+        return {'model': model_quality, 'realtime_factor': None}
+
+
+def calibrate(device, model_cache=None):
+    """Times Demucs and Whisper on a short synthetic clip and returns their real-time factors."""
+    model_cache = model_cache if model_cache is not None else ModelCache()
+    sr = 44100
+    audio = _synthetic_song(CALIBRATION_SECONDS, sr)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_path = os.path.join(tmp_dir, 'calibration.wav')
+        sf.write(audio_path, audio, sr)
+        demucs = _calibrate_demucs(device, audio_path)
+    whisper_result = _calibrate_whisper(device, audio, sr, model_cache)
+    return {
+        'clip_seconds': CALIBRATION_SECONDS,
+        'demucs': demucs,
+        'whisper': whisper_result,
+        'timestamp': time.time(),
+    }
+
+
+def _load_persisted():
+    try:
+        with open(PROFILE_FILE, 'r') as f:
+            profile = json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return None
+    if profile.get('fingerprint') != fingerprint():
+        logging.info("Hardware changed since the last profile was saved; re-profiling.")
+        return None
+    return profile
+
+
+def _persist(profile):
+    try:
+        tmp_path = PROFILE_FILE + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(profile, f, indent=4)
+        os.replace(tmp_path, PROFILE_FILE)
+    except IOError:
+        logging.error(f"Could not write hardware profile: {PROFILE_FILE}")
+
+
+def get_profile():
+    """
+    Returns the hardware profile, loading it from disk or detecting the system on
+    first use. Calibration results are filled in later by `start_calibration`.
+    """
+    global _PROFILE
+    with _LOCK:
+        if _PROFILE is None:
+            _PROFILE = _load_persisted()
+            if _PROFILE is None:
+                system = detect_system()
+                _PROFILE = {
+                    'fingerprint': fingerprint(),
+                    'system': system,
+                    'calibration': None,
+                    'recommended': recommend(system),
+                }
+                _persist(_PROFILE)
+        return _PROFILE
+
+
+def cached_profile():
+    """
+    Returns the profile without blocking on detection: the detected one, else
+    the profile persisted by an earlier run. Until one of those exists it
+    returns a provisional profile ('provisional': True) whose device comes
+    from torch if it is already imported and whose recommendations are the
+    heuristic ones, so request handlers never import torch or probe the CPU.
+    """
+    global _PROFILE
+    profile = _PROFILE
+    if profile is not None:
+        return profile
+    if _LOCK.acquire(blocking=False):  # Held while the warm-up detects the system
+        try:
+            if _PROFILE is None:
+                _PROFILE = _load_persisted()
+            profile = _PROFILE
+        finally:
+            _LOCK.release()
+        if profile is not None:
+            return profile
+
+    system = {
+        'cpu_model': 'Detecting...',
+        'cpu_logical_cores': os.cpu_count() or 1,
+        'cpu_physical_cores': os.cpu_count() or 1,
+        'ram_bytes': None,
+        'platform': platform.platform(),
+        'torch_version': None,
+        'cuda_available': False,
+        'gpu_model': 'Detecting...',
+        'gpu_memory_bytes': None,
+    }
+    if is_loaded('torch'):
+        try:
+            if torch.cuda.is_available():
+                system['cuda_available'] = True
+                system['gpu_model'] = torch.cuda.get_device_name(0)
+                system['gpu_memory_bytes'] = torch.cuda.get_device_properties(0).total_memory
+        except Exception as e:
+            logging.warning(f"Could not detect GPU: {e}")
+    return {'fingerprint': None, 'system': system, 'calibration': None, 'recommended': recommend(system),
+            'provisional': True}
+
+
+def recommended_settings():
+    """Returns the default analysis settings chosen for this machine."""
+    return get_profile()['recommended']
+
+
+def calibration_status():
+    """Returns 'complete', 'running', 'pending' or 'detecting' (hardware not profiled yet)."""
+    if cached_profile().get('calibration'):
+        return 'complete'
+    if _CALIBRATION_THREAD is not None and _CALIBRATION_THREAD.is_alive():
+        return 'running'
+    return 'pending' if _PROFILE is not None else 'detecting'
+
+
+def apply_thread_settings():
+    """Applies the recommended intra-op thread count to torch on CPU machines."""
+    settings = recommended_settings()
+    if settings['device'] == 'cpu' and settings.get('torch_threads'):
+        torch.set_num_threads(settings['torch_threads'])
+        logging.info(f"Using {settings['torch_threads']} torch threads")
+
+
+def start_calibration(model_cache=None, on_complete=None):
+    """Runs the calibration in a daemon thread unless a calibrated profile is already persisted."""
+    global _CALIBRATION_THREAD
+    profile = get_profile()
+    if profile.get('calibration'):
+        if on_complete is not None:
+            on_complete()
+        return None
+
+    def _worker():
+        global _PROFILE
+        logging.info("Calibrating analysis defaults on synthetic audio...")
+        device = profile['recommended']['device']
+        calibration = calibrate(device, model_cache)
+        if not calibration['demucs']['runs'] and not calibration['whisper']['realtime_factor']:
+            # Nothing could be measured (e.g. models not downloadable); try again on next start.
+            logging.warning("Calibration produced no measurements; keeping heuristic defaults.")
+            return
+        with _LOCK:
+            updated = dict(_PROFILE)
+            updated['calibration'] = calibration
+            updated['recommended'] = recommend(updated['system'], calibration)
+            _PROFILE = updated
+            _persist(updated)
+        logging.info(f"Calibration complete. Recommended settings: {updated['recommended']}")
+        if on_complete is not None:
+            on_complete()
+
+    with _LOCK:
+        if _CALIBRATION_THREAD is None or not _CALIBRATION_THREAD.is_alive():
+            _CALIBRATION_THREAD = threading.Thread(target=_worker, name="hardware-calibration", daemon=True)
+            _CALIBRATION_THREAD.start()
+    return _CALIBRATION_THREAD
@@ -0,0 +1,294 @@
+import base64
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+import config
+from feature_index import feature_vector
+
+_TABLES = {
+    'analysis': 'analysis_history',
+    'generation': 'generation_history',
+}
+
+SCHEMA_VERSION = 3
+
+# Indexed analysis facets: column -> SQL type. Exact-match facets also get value counts.
+_FACET_COLUMNS = {
+    'genre': 'TEXT',
+    'mood': 'TEXT',
+    'key': 'TEXT',
+    'energy': 'TEXT',
+    'tempo': 'REAL',
+    'has_vocals': 'INTEGER',
+}
+FACETS = ('genre', 'mood', 'key', 'energy', 'has_vocals')
+
+
+def _now():
+    # Fixed-width timestamps so they sort correctly as text
+    return datetime.datetime.now().isoformat(timespec='microseconds')
+
+
+def _facet_values(item):
+    analysis = item.get('analysis') or {}
+    tempo = analysis.get('tempo')
+    has_vocals = analysis.get('has_vocals')
+    return {
+        'genre': analysis.get('genre'),
+        'mood': analysis.get('mood'),
+        'key': analysis.get('key'),
+        'energy': analysis.get('energy') if isinstance(analysis.get('energy'), str) else None,
+        'tempo': float(tempo) if isinstance(tempo, (int, float)) else None,
+        'has_vocals': int(bool(has_vocals)) if has_vocals is not None else None,
+    }
+
+
+def _prompt_texts(prompt):
+    if isinstance(prompt, dict):
+        return [text for value in prompt.values() for text in _prompt_texts(value)]
+    return [prompt] if isinstance(prompt, str) else []
+
+
+def _search_text(item):
+    """(lyrics, prompts) text of an analysis for the full-text index."""
+    lyrics = (item.get('analysis') or {}).get('lyrics') or ''
+    prompts = [text for variation in item.get('prompts') or [] if isinstance(variation, dict)
+               for text in _prompt_texts(variation.get('prompt'))]
+    return lyrics if isinstance(lyrics, str) else '', '\n'.join(prompts)
+
+
+def match_query(text):
+    """FTS5 query matching every word of free text (each quoted, so operators in user input are literal)."""
+    words = text.split()
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in words) if words else None
+
+
+def encode_cursor(timestamp, item_id):
+    return base64.urlsafe_b64encode(json.dumps([timestamp, item_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Returns the (timestamp, id) a cursor points after. Raises ValueError for malformed cursors."""
+    try:
+        timestamp, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(timestamp, str) or not isinstance(item_id, str):
+        raise ValueError("Invalid cursor.")
+    return timestamp, item_id
+
+
+class HistoryStore:
+    """
+    Analysis and generation history in SQLite. The database runs in WAL mode,
+    so page reads never wait for a save, and each save is a single indexed
+    insert instead of a rewrite of the whole history. Items are kept as JSON
+    next to their indexed ID and timestamp and are listed newest first with
+    keyset (cursor) pagination. Each thread uses its own connection.
+
+    Analyses also keep their genre, mood, key, energy, tempo and vocal
+    presence in indexed columns, and their lyrics and prompts in an FTS5
+    index, for `search()`, plus their feature vector for FeatureIndex.
+    """
+
+    def __init__(self, path=config.HISTORY_DB):
+        self.path = path
+        self._local = threading.local()
+        self._create_schema()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._connection()
+        with conn:
+            for table in _TABLES.values():
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    "id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, data TEXT NOT NULL)"
+                )
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp, id)")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 2:
+                self._add_search_schema(conn)
+            if version < 3:
+                conn.execute(f"ALTER TABLE {_TABLES['analysis']} ADD COLUMN features BLOB")
+            if version < SCHEMA_VERSION:
+                self._reindex(conn, text=version < 2)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _add_search_schema(self, conn):
+        """Adds the analysis facet columns and the full-text index."""
+        table = _TABLES['analysis']
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, sql_type in _FACET_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+            # Facet first, then the listing order, so filtered pages are read straight off the index
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column}, timestamp, id)")
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS analysis_text USING fts5(lyrics, prompts, content='')")
+
+    def _reindex(self, conn, text):
+        """Backfills the derived analysis columns (and the full-text index if `text`) after a schema upgrade."""
+        rows = conn.execute(f"SELECT rowid, data FROM {_TABLES['analysis']}").fetchall()
+        for rowid, data in rows:
+            self._index_analysis(conn, rowid, json.loads(data), text=text)
+        if rows:
+            logging.info(f"Indexed {len(rows)} analyses for history search")
+
+    def _index_analysis(self, conn, rowid, item, text=True):
+        columns = _facet_values(item)
+        vector = feature_vector((item.get('analysis') or {}).get('full_analysis_data'))
+        columns['features'] = vector.tobytes() if vector is not None else None
+        conn.execute(
+            f"UPDATE {_TABLES['analysis']} SET {', '.join(f'{c} = ?' for c in columns)} WHERE rowid = ?",
+            (*columns.values(), rowid)
+        )
+        if text:
+            conn.execute("INSERT INTO analysis_text (rowid, lyrics, prompts) VALUES (?, ?, ?)", (rowid, *_search_text(item)))
+
+    def _insert(self, conn, kind, item):
+        cursor = conn.execute(
+            f"INSERT OR IGNORE INTO {_TABLES[kind]} (id, timestamp, data) VALUES (?, ?, ?)",
+            (item['id'], item.get('timestamp') or '', json.dumps(item))
+        )
+        if cursor.rowcount > 0 and kind == 'analysis':
+            self._index_analysis(conn, cursor.lastrowid, item)
+        return cursor.rowcount > 0
+
+    def add_analysis(self, data):
+        """Saves an analysis result under a new ID and timestamp; returns the stored item."""
+        item = dict(data, id=str(uuid.uuid4()), timestamp=_now())
+        conn = self._connection()
+        with conn:
+            self._insert(conn, 'analysis', item)
+        return item
+
+    def add_generations(self, tracks):
+        """Saves generated tracks keyed by their clip ID, skipping ones already saved. Returns how many were new."""
+        conn = self._connection()
+        added = 0
+        with conn:
+            for track in tracks:
+                item = dict(track, generation_id=str(uuid.uuid4()), timestamp=_now())
+                added += self._insert(conn, 'generation', item)
+        return added
+
+    def _select_page(self, table, where, params, cursor, limit):
+        where = list(where)
+        params = list(params)
+        if cursor:
+            where.append("(timestamp, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        clause = f"WHERE {' AND '.join(where)} " if where else ""
+        rows = self._connection().execute(
+            f"SELECT id, timestamp, data FROM {table} {clause}ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [json.loads(data) for _, _, data in rows[:limit]], next_cursor
+
+    def page(self, kind, cursor=None, limit=50):
+        """Returns (items, next_cursor) for one page of a history, newest first. next_cursor is None on the last page."""
+        return self._select_page(_TABLES[kind], [], [], cursor, limit)
+
+    def _search_filter(self, filters, text):
+        """SQL conditions and parameters for search filters (see `search()`)."""
+        where, params = [], []
+        for column in FACETS:
+            values = filters.get(column)
+            if values:
+                where.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if filters.get('tempo_min') is not None:
+            where.append("tempo >= ?")
+            params.append(filters['tempo_min'])
+        if filters.get('tempo_max') is not None:
+            where.append("tempo <= ?")
+            params.append(filters['tempo_max'])
+        query = match_query(text or '')
+        if query:
+            where.append("rowid IN (SELECT rowid FROM analysis_text WHERE analysis_text MATCH ?)")
+            params.append(query)
+        return where, params
+
+    def search(self, filters, text=None, cursor=None, limit=50):
+        """
+        Returns (items, next_cursor) for one page of saved analyses matching
+        every filter, newest first. `filters` maps each of FACETS to a list of
+        accepted values, plus optional `tempo_min`/`tempo_max`; `text` must
+        match the lyrics or prompts word for word.
+        """
+        where, params = self._search_filter(filters, text)
+        return self._select_page(_TABLES['analysis'], where, params, cursor, limit)
+
+    def facet_counts(self, filters, text=None):
+        """Number of matching analyses per value of each facet."""
+        where, params = self._search_filter(filters, text)
+        clause = f"WHERE {' AND '.join(where)} " if where else ""
+        conn = self._connection()
+        counts = {}
+        for column in FACETS:
+            rows = conn.execute(
+                f"SELECT {column}, COUNT(*) FROM {_TABLES['analysis']} {clause}"
+                f"GROUP BY {column} HAVING {column} IS NOT NULL ORDER BY COUNT(*) DESC",
+                params
+            ).fetchall()
+            counts[column] = {str(value) if column != 'has_vocals' else bool(value): n for value, n in rows}
+        return counts
+
+    def get_many(self, kind, ids):
+        """Returns the stored items with the given IDs, keyed by ID."""
+        if not ids:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT id, data FROM {_TABLES[kind]} WHERE id IN ({', '.join('?' * len(ids))})", list(ids)
+        ).fetchall()
+        return {item_id: json.loads(data) for item_id, data in rows}
+
+    def feature_rows(self, after_rowid=0):
+        """Yields (rowid, id, float32 feature bytes) of analyses saved after a rowid, for FeatureIndex."""
+        yield from self._connection().execute(
+            f"SELECT rowid, id, features FROM {_TABLES['analysis']} "
+            "WHERE rowid > ? AND features IS NOT NULL ORDER BY rowid",
+            (after_rowid,)
+        )
+
+    def count(self, kind):
+        return self._connection().execute(f"SELECT COUNT(*) FROM {_TABLES[kind]}").fetchone()[0]
+
+    def import_json(self, kind, file_path):
+        """
+        One-time import of a legacy JSON history file. The file is renamed to
+        `<name>.imported` afterwards so it is not imported again. Returns the
+        number of items imported.
+        """
+        if not os.path.exists(file_path):
+            return 0
+        try:
+            with open(file_path, 'r') as f:
+                items = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            logging.error(f"Could not import history file {file_path}: {e}")
+            return 0
+
+        conn = self._connection()
+        imported = 0
+        with conn:
+            for item in items if isinstance(items, list) else []:
+                if isinstance(item, dict) and item.get('id'):
+                    imported += self._insert(conn, kind, item)
+        os.replace(file_path, file_path + '.imported')
+        logging.info(f"Imported {imported} {kind} history items from {file_path}")
+        return imported
@@ -0,0 +1,127 @@
+import importlib
+import threading
+import time
+import types
+from contextlib import contextmanager
+
+# Overall progress range (start %, end %) and status label for each instrumented analysis stage.
+ANALYSIS_PROGRESS_STAGES = {
+    'decode': (5, 10, "Decoding audio"),
+    'features': (10, 30, "Analyzing audio features"),
+    'separation': (35, 65, "Separating vocals"),
+    'transcription': (65, 88, "Transcribing lyrics with Whisper"),
+    'gender_detection': (88, 90, "Detecting vocal gender"),
+}
+
+
+@contextmanager
+def timed(timings, stage):
+    """Records the monotonic wall time of the enclosed block in `timings[stage]` (seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 4)
+
+
+class StageProgress:
+    """
+    Converts the per-stage fractions reported by AudioAnalyzer into overall
+    progress percentages and status messages, calling `publish(progress, status)`
+    only when the integer percentage or the status text changes.
+    """
+
+    def __init__(self, publish):
+        self.publish = publish
+        self._last = None
+
+    def __call__(self, stage, fraction, detail=None):
+        start, end, label = ANALYSIS_PROGRESS_STAGES[stage]
+        progress = int(start + (end - start) * max(0.0, min(1.0, fraction)))
+        status = f"{label} ({detail})..." if detail else f"{label}..."
+        if (progress, status) == self._last:
+            return
+        self._last = (progress, status)
+        self.publish(progress, status)
+
+
+class _SegmentResult:
+    def __init__(self, pool, func, args, kwargs):
+        self.pool = pool
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def result(self):
+        out = self.func(*self.args, **self.kwargs)
+        self.pool._segment_done()
+        return out
+
+
+class SegmentProgressPool:
+    """
+    Drop-in replacement for Demucs' DummyPoolExecutor that reports progress as
+    segments complete. `apply_model` submits every segment of one (sub-)model
+    before resolving any of them, so completed/submitted within a phase is that
+    model's progress, and a new submission after a completed phase starts the next model.
+    """
+
+    def __init__(self, num_models, callback):
+        self.num_models = max(1, num_models)
+        self.callback = callback
+        self._models_done = 0
+        self._submitted = 0
+        self._completed = 0
+
+    def submit(self, func, *args, **kwargs):
+        if self._submitted and self._completed == self._submitted:
+            self._models_done += 1
+            self._submitted = self._completed = 0
+        self._submitted += 1
+        return _SegmentResult(self, func, args, kwargs)
+
+    def _segment_done(self):
+        self._completed += 1
+        fraction = (self._models_done + self._completed / self._submitted) / self.num_models
+        self.callback(min(1.0, fraction))
+
+
+_whisper_local = threading.local()
+_whisper_hook_lock = threading.Lock()
+_whisper_hooked = False
+
+
+def _install_whisper_hook():
+    """
+    Whisper only exposes transcription progress through a tqdm bar over the
+    audio frames. Swap in a tqdm subclass (once per process) that forwards
+    updates to the callback registered for the current thread.
+    """
+    global _whisper_hooked
+    with _whisper_hook_lock:
+        if _whisper_hooked:
+            return
+        transcribe_module = importlib.import_module('whisper.transcribe')
+        base_tqdm = transcribe_module.tqdm.tqdm
+
+        class _ProgressTqdm(base_tqdm):
+            def update(self, n=1):
+                callback = getattr(_whisper_local, 'callback', None)
+                if callback is not None and self.total:
+                    self._frames_done = getattr(self, '_frames_done', 0) + n
+                    callback(min(1.0, self._frames_done / self.total))
+                return super().update(n)
+
+        transcribe_module.tqdm = types.SimpleNamespace(tqdm=_ProgressTqdm)
+        _whisper_hooked = True
+
+
+@contextmanager
+def whisper_progress(callback):
+    """Reports Whisper transcription progress (0.0-1.0) to `callback` for calls made in this thread."""
+    _install_whisper_hook()
+    _whisper_local.callback = callback
+    try:
+        yield
+    finally:
+        _whisper_local.callback = None
@@ -0,0 +1,71 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+
+# Heavy ML modules that should never be imported just to start the server or the GUI shell.
+HEAVY_MODULES = ['torch', 'torchaudio', 'librosa', 'whisper', 'demucs.apply', 'demucs.pretrained', 'demucs.audio']
+
+_IMPORT_LOCK = threading.RLock()
+_LAZY_MODULES = {}
+
+
+class LazyModule:
+    """A stand-in for a module that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _IMPORT_LOCK:
+                if self._module is None:
+                    start = time.perf_counter()
+                    self._module = importlib.import_module(self._name)
+                    logging.debug(f"Imported '{self._name}' in {time.perf_counter() - start:.2f}s")
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """Returns a shared LazyModule for the given dotted module name."""
+    with _IMPORT_LOCK:
+        if name not in _LAZY_MODULES:
+            _LAZY_MODULES[name] = LazyModule(name)
+        return _LAZY_MODULES[name]
+
+
+def is_loaded(name):
+    """Checks whether a module has actually been imported yet."""
+    return name in sys.modules
+
+
+def preload(names=None, on_complete=None):
+    """
+    Imports the given modules (the heavy ML stack by default) in a daemon
+    thread so that they are warm by the time the first analysis needs them.
+    """
+    names = HEAVY_MODULES if names is None else names
+
+    def _worker():
+        start = time.perf_counter()
+        for name in names:
+            try:
+                lazy_import(name)._load()
+            except Exception as e:
+                logging.warning(f"Background import of '{name}' failed: {e}")
+        logging.info(f"Background import of ML modules finished in {time.perf_counter() - start:.2f}s")
+        if on_complete is not None:
+            on_complete()
+
+    thread = threading.Thread(target=_worker, name="ml-preload", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,205 @@
+import bisect
+import math
+import threading
+
+# Buckets (seconds) sized for anything from a single feature to a full Demucs run.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, or is read from a callback at scrape time."""
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Reads the (unlabelled) gauge value from `function()` whenever metrics are rendered."""
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with a running sum and count."""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Flask service ---
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'http_request_duration_seconds', "HTTP request latency by route, including streamed bodies.",
+    ('method', 'route', 'status'))
+
+# --- Analysis pipeline ---
+ANALYSIS_STAGE_DURATION = REGISTRY.histogram(
+    'analysis_stage_duration_seconds', "Duration of each analysis stage.", ('stage',))
+ANALYSIS_JOBS_IN_FLIGHT = REGISTRY.gauge(
+    'analysis_jobs_in_flight', "Analyses currently running (the job queue depth).")
+ANALYSIS_JOBS_COALESCED = REGISTRY.counter(
+    'analysis_jobs_coalesced_total', "Duplicate analysis submissions attached to an in-flight job.")
+AUDIO_DECODED_BYTES = REGISTRY.counter(
+    'audio_decoded_bytes_total', "Bytes of PCM audio produced by decoding input files.")
+
+# --- Model cache ---
+MODEL_LOAD_DURATION = REGISTRY.histogram(
+    'model_load_duration_seconds', "Time taken to load a model into memory; _count is the number of loads.",
+    ('model',))
+MODEL_CACHE_HITS = REGISTRY.counter('model_cache_hits_total', "Model cache lookups served from memory.", ('model',))
+MODEL_CACHE_EVICTIONS = REGISTRY.counter('model_cache_evictions_total', "Models evicted from the cache.", ('model',))
+
+# --- Suno API ---
+SUNO_REQUEST_DURATION = REGISTRY.histogram(
+    'suno_api_request_duration_seconds', "Latency of Suno API calls.", ('method', 'endpoint'))
+SUNO_ERRORS = REGISTRY.counter(
+    'suno_api_errors_total', "Failed Suno API calls by HTTP status ('network' for connection errors).",
+    ('endpoint', 'status'))
+SUNO_RATE_LIMIT_WAIT = REGISTRY.histogram(
+    'suno_rate_limit_wait_seconds', "Time Suno API calls queued for a rate limit token.",
+    buckets=(0, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60))
+SUNO_CIRCUIT_REJECTIONS = REGISTRY.counter(
+    'suno_circuit_rejections_total', "Suno API calls failed fast by an open circuit breaker.", ('endpoint',))
+GENERATION_IDEMPOTENT_REPLAYS = REGISTRY.counter(
+    'generation_idempotent_replays_total', "Generation requests answered with an earlier identical submission.")
+ACCOUNT_GENERATIONS = REGISTRY.counter(
+    'account_generations_total', "Generations routed to each saved account, by result.", ('account', 'result'))
+CREDITS_CACHE_LOOKUPS = REGISTRY.counter(
+    'credits_cache_lookups_total', "Credit lookups by result (hit, miss, coalesced).", ('result',))
+SUNO_CLIENT_POOL_SIZE = REGISTRY.gauge('suno_client_pool_size', "Pooled Suno API clients (one per API key).")
+GENERATIONS_OUTSTANDING = REGISTRY.gauge('suno_generations_outstanding', "Generations still being polled by the central poller.")
+SUNO_CALLBACKS = REGISTRY.counter(
+    'suno_callbacks_total', "Generation callbacks received, by result (accepted, rejected, ignored).", ('result',))
+
+# --- Audio cache ---
+AUDIO_CACHE_HITS = REGISTRY.counter('audio_cache_hits_total', "Clip audio served from the disk cache.")
+AUDIO_CACHE_MISSES = REGISTRY.counter('audio_cache_misses_total', "Clip audio downloaded into the disk cache.")
+AUDIO_CACHE_EVICTIONS = REGISTRY.counter('audio_cache_evictions_total', "Clips evicted from the disk cache.")
+AUDIO_CACHE_BYTES = REGISTRY.gauge('audio_cache_bytes', "Size of the clip audio disk cache.")
@@ -0,0 +1,65 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import MODEL_CACHE_EVICTIONS, MODEL_CACHE_HITS, MODEL_LOAD_DURATION
+
+# Loaded Whisper/Demucs models kept in memory. Each can use several GB, so the cache is bounded.
+DEFAULT_MAX_MODELS = int(os.getenv("MODEL_CACHE_SIZE", "3"))
+
+
+class ModelCache:
+    """
+    Thread-safe LRU cache of loaded models. Concurrent requests for the same
+    key wait for a single load instead of loading the model twice, and the
+    least recently used model is evicted once `max_models` is exceeded.
+    """
+
+    def __init__(self, max_models=DEFAULT_MAX_MODELS):
+        self.max_models = max(1, max_models)
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_or_load(self, key, loader):
+        """Returns the cached model for `key`, calling `loader()` to load it on a miss."""
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                MODEL_CACHE_HITS.inc(model=key)
+                return self._models[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    MODEL_CACHE_HITS.inc(model=key)
+                    return self._models[key]
+
+            start = time.perf_counter()
+            model = loader()
+            MODEL_LOAD_DURATION.observe(time.perf_counter() - start, model=key)
+
+            with self._lock:
+                self._models[key] = model
+                self._key_locks.pop(key, None)
+                while len(self._models) > self.max_models:
+                    evicted, _ = self._models.popitem(last=False)
+                    MODEL_CACHE_EVICTIONS.inc(model=evicted)
+                    logging.info(f"Evicted model '{evicted}' from the model cache")
+            return model
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._models
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
@@ -0,0 +1,156 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_MODES = ('sampling', 'cprofile')
+COLLAPSED_FILE = 'profile.collapsed'  # Brendan Gregg's collapsed stacks; opens directly in speedscope
+PSTATS_FILE = 'profile.prof'
+TOP_FILE = 'top_functions.json'
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread at a fixed interval from a helper
+    thread. Overhead stays low enough to profile full Demucs/Whisper runs, and
+    time spent inside native torch calls is attributed to the Python caller.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(names))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._start
+
+    def top_functions(self, limit=30):
+        """Returns the hottest functions by self samples, with inclusive samples and estimated seconds."""
+        self_samples = Counter()
+        total_samples = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for name in set(frames):
+                total_samples[name] += count
+        seconds_per_sample = self.elapsed / self.samples if self.samples else 0.0
+        return [
+            {
+                'function': name,
+                'self_samples': count,
+                'total_samples': total_samples[name],
+                'self_seconds': round(count * seconds_per_sample, 4),
+                'total_seconds': round(total_samples[name] * seconds_per_sample, 4),
+                'self_percent': round(100.0 * count / self.samples, 2),
+            }
+            for name, count in self_samples.most_common(limit)
+        ]
+
+    def write(self, output_dir):
+        """Writes the collapsed stacks, returning the created file names."""
+        with open(os.path.join(output_dir, COLLAPSED_FILE), 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return [COLLAPSED_FILE]
+
+
+class DeterministicProfiler:
+    """cProfile wrapper: exact call counts at a higher overhead. Only profiles the calling thread."""
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self.elapsed = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self.elapsed = time.perf_counter() - self._start
+
+    def top_functions(self, limit=30):
+        stats = pstats.Stats(self._profile)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [
+            {
+                'function': f"{func} ({os.path.basename(filename)}:{line})",
+                'calls': calls,
+                'self_seconds': round(self_time, 4),
+                'total_seconds': round(cumulative, 4),
+            }
+            for (filename, line, func), (_, calls, self_time, cumulative, _) in rows
+        ]
+
+    def write(self, output_dir):
+        self._profile.dump_stats(os.path.join(output_dir, PSTATS_FILE))
+        return [PSTATS_FILE]
+
+
+@contextmanager
+def profiled(output_dir, mode='sampling', top_n=30):
+    """
+    Profiles the enclosed block in the current thread and writes the artefacts
+    to `output_dir`. Yields a dict that is filled with the summary on exit:
+    {'mode', 'elapsed', 'files', 'top_functions'}.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profiling mode '{mode}'. Use one of {PROFILE_MODES}.")
+    profiler = SamplingProfiler() if mode == 'sampling' else DeterministicProfiler()
+    summary = {'mode': mode}
+    profiler.start()
+    try:
+        yield summary
+    finally:
+        profiler.stop()
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            top = profiler.top_functions(top_n)
+            files = profiler.write(output_dir)
+            with open(os.path.join(output_dir, TOP_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'mode': mode, 'elapsed': round(profiler.elapsed, 4), 'top_functions': top}, f, indent=4)
+            summary.update({
+                'elapsed': round(profiler.elapsed, 4),
+                'files': files + [TOP_FILE],
+                'top_functions': top,
+            })
+            logging.info(f"Profile ({mode}) written to {output_dir}")
+        except Exception as e:
+            logging.error(f"Could not write profile to {output_dir}: {e}")
+            summary['error'] = str(e)
@@ -1,18 +1,20 @@
 import random
-import json
+
+from genre_registry import GENRE_RULES
 
 class PromptGenerator:
     """Generates Suno v5 compatible prompts from audio features"""
     
-    def __init__(self, features, genre, mood, instruments, has_vocals, lyrics=None, vocal_gender=None):
+    def __init__(self, features, genre, mood, instruments, has_vocals, lyrics=None, vocal_gender=None, genre_candidates=None):
         self.features = features
         self.genre = genre
+        self.genre_candidates = genre_candidates or []  # [(genre, score)] from the classifier, best first
         self.mood = mood
         self.instruments = instruments
         self.has_vocals = has_vocals
         self.lyrics = lyrics
         self.vocal_gender = vocal_gender
-        self.genre_rules = self._load_genre_rules()
+        self.rules = GENRE_RULES.current()
 
         # Data for more varied prompts
         self.tempo_map = [
@@ -84,14 +86,6 @@ class PromptGenerator:
             }
         }
 
-    def _load_genre_rules(self):
-        """Loads genre rules from the external JSON file."""
-        try:
-            with open("genre_rules.json", "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-
     def _get_random_descriptor(self, value, descriptor_map):
         """Gets a random descriptor from a map based on a value."""
         for threshold, descriptors in descriptor_map:
@@ -109,7 +103,7 @@ class PromptGenerator:
         prompt_parts.append(self.mood.lower())
         
         # --- Add texture from genre rules ---
-        genre_rule = next((rule for rule in self.genre_rules if rule['genre'] == self.genre), None)
+        genre_rule = self.rules.get(self.genre)
         if genre_rule and 'texture' in genre_rule:
             prompt_parts.append(genre_rule['texture'])
         
@@ -183,7 +177,7 @@ class PromptGenerator:
             base_prompt += f", {', '.join(style_descriptors)}"
         
         # --- Add notes from genre rules ---
-        genre_rule = next((rule for rule in self.genre_rules if rule['genre'] == self.genre), None)
+        genre_rule = self.rules.get(self.genre)
         if genre_rule and 'notes' in genre_rule:
             base_prompt += f", ({genre_rule['notes']})"
             
@@ -433,6 +427,21 @@ class PromptGenerator:
         
         return final_output
 
+    def generate_genre_blend(self, min_ratio=0.5, max_blend=2):
+        """Blends the genre with runners-up scoring at least `min_ratio` of the best candidate."""
+        if not self.genre_candidates:
+            return None
+        best = self.genre_candidates[0][1]
+        others = [genre for genre, score in self.genre_candidates
+                  if genre != self.genre and best > 0 and score >= min_ratio * best][:max_blend]
+        if not others:
+            return None
+        tempo = self.features.get('tempo', 120)
+        blend_prompt = f"{self.genre} fused with {' and '.join(others)}, {self.mood.lower()}, {int(tempo)} bpm"
+        if self.instruments:
+            blend_prompt += f", {', '.join(self.instruments[:2])}"
+        return blend_prompt
+
     def generate_variations(self):
         """Generate multiple prompt variations"""
         variations = []
@@ -482,6 +491,14 @@ class PromptGenerator:
                 "prompt": artist_prompt
             })
 
+        # Variation 6b: Genre Blend, when the classifier found close runners-up
+        blend_prompt = self.generate_genre_blend()
+        if blend_prompt:
+            variations.append({
+                "name": "Genre Blend",
+                "prompt": blend_prompt
+            })
+
         # Variation 7: Refinement Prompt (New)
         variations.append({
             "name": "Refinement Prompt",
@@ -0,0 +1,152 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second refill a bucket holding
+    at most `capacity`, so short bursts are allowed while the long-term rate is
+    capped. `pause()` stops issuing tokens until a deadline (e.g. Retry-After).
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """
+        Takes a token without blocking. Returns 0.0 on success, otherwise the
+        seconds until one may be available (for callers that wait themselves,
+        e.g. with asyncio.sleep).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._paused_until and self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return max(self._paused_until - now, (1 - self._tokens) / self.rate if self.rate > 0 else 1.0, 1e-3)
+
+    def acquire(self, timeout=None):
+        """
+        Blocks until a token is available and returns the seconds waited, or
+        raises TimeoutError when none is available within `timeout` seconds.
+        """
+        start = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return time.monotonic() - start
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                raise TimeoutError("No rate limit token available in time")
+            time.sleep(wait)
+
+    def available(self):
+        """Tokens that could be taken right now (0 while paused), without taking any."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return 0.0 if now < self._paused_until else self._tokens
+
+    def pause(self, seconds):
+        """Issues no tokens for the next `seconds` seconds and drains the burst allowance."""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures and opens after `failure_threshold` of them.
+    While open, `allow()` returns False so callers fail fast; after
+    `reset_timeout` seconds a single trial call is let through (half-open),
+    and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns whether a call may proceed."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Seconds until an open circuit lets a trial call through."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Gives back the half-open trial slot of a call that was never sent; the state is unchanged."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class KeyLimiter:
+    """The rate limit and circuit breaker shared by every request made with one API key."""
+
+    def __init__(self, rate, burst, failure_threshold, reset_timeout):
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+
+class RateLimiterRegistry:
+    """Process-wide map of API key -> KeyLimiter, so separate clients for a key share one budget."""
+
+    def __init__(self, rate, burst, failure_threshold=5, reset_timeout=30.0):
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = KeyLimiter(
+                    self.rate, self.burst, self.failure_threshold, self.reset_timeout)
+            return limiter
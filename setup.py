@@ -29,6 +29,7 @@ setup(
         'click==8.1.7',
         'openai-whisper',
         'requests',
+        'aiohttp==3.10.10',
         # torch is excluded, user must install it manually
     ],
     classifiers=[
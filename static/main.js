@@ -23,6 +23,7 @@ const historyBtn = document.getElementById('historyBtn');
 const historyPanel = document.getElementById('historyPanel');
 const closeHistoryBtn = document.getElementById('closeHistoryBtn');
 const historyContainer = document.getElementById('historyContainer');
+const historySearchInput = document.getElementById('historySearchInput');
 const generationHistoryBtn = document.getElementById('generationHistoryBtn');
 const generationHistoryPanel = document.getElementById('generationHistoryPanel');
 const closeGenerationHistoryBtn = document.getElementById('closeGenerationHistoryBtn');
@@ -45,7 +46,8 @@ async function populateGenres() {
     try {
         const response = await fetch('/api/genres');
         const genres = await response.json();
-        genreSelect.innerHTML = genres.map(g => `<option value="${g.genre}">${g.genre}</option>`).join('');
+        genreSelect.innerHTML = '<option value="Auto-detect">Auto-detect</option>' +
+            genres.map(g => `<option value="${g.genre}">${g.genre}</option>`).join('');
     } catch (err) {
         console.error('Error fetching genres:', err);
     }
@@ -278,6 +280,10 @@ async function uploadAndAnalyze(file) {
     formData.append('selected_genre', genreSelect.value);
     formData.append('demucs_model', document.getElementById('separationQualitySelect').value);
     formData.append('save_vocals', document.getElementById('saveVocalsCheckbox').checked);
+    const profileCheckbox = document.getElementById('profileCheckbox');
+    if (profileCheckbox && profileCheckbox.checked) {
+        formData.append('profile', 'true');
+    }
 
     try {
         const response = await fetch('/api/analyze', { // This is now a streaming endpoint
@@ -373,6 +379,19 @@ function displayResults(data) {
         </div>
     `;
 
+    // Link the profiling artefacts when the analysis was profiled
+    if (data.profile && data.profile.files) {
+        const links = Object.entries(data.profile.files)
+            .map(([name, url]) => `<a href="${url}" download>${name}</a>`)
+            .join(' · ');
+        analysisGrid.innerHTML += `
+        <div class="analysis-item">
+            <div class="analysis-label">Profile (${data.profile.mode}, ${data.profile.elapsed}s)</div>
+            <div class="analysis-value">${links}</div>
+        </div>
+    `;
+    }
+
     // Categorize prompts
     const standardPrompts = prompts.filter(p => ["Basic", "Detailed", "Style-Focused", "Tempo-Focused"].includes(p.name));
     const creativePrompts = prompts.filter(p => ["Thematic", "Artist Style", "Refinement Prompt"].includes(p.name));
@@ -492,53 +511,97 @@ async function generateMusic(promptName, ids, titleId, tagsId) {
     await _executeGeneration(promptName, payload);
 }
 
-async function pollGenerationStatus(requestId, cardElement) {
-    const statusElement = cardElement.querySelector('.generation-status');
-    const spinnerElement = cardElement.querySelector('.spinner');
-    const progressBar = cardElement.querySelector('.generation-progress-bar');
-    const totalTracks = requestId.split(',').length;
+// --- Generation status events ---
+// The server polls Suno for every outstanding generation in batched calls and
+// pushes status changes over one event stream per API key, instead of each
+// card polling on its own timer.
+const generationCards = new Map(); // request id -> { card, apiKey }
+const generationStreams = new Map(); // api key -> AbortController
+
+function trackGeneration(requestId, cardElement, apiKey) {
+    generationCards.set(requestId, { card: cardElement, apiKey });
+    connectGenerationEvents(apiKey);
+}
+
+function pendingGenerations(apiKey) {
+    return [...generationCards.values()].some(entry => entry.apiKey === apiKey);
+}
+
+async function connectGenerationEvents(apiKey) {
+    if (generationStreams.has(apiKey)) return;
+    const controller = new AbortController();
+    generationStreams.set(apiKey, controller);
 
     try {
-        const apiKey = document.getElementById('apiKey').value;
-        const response = await fetch(`/api/generation-status/${requestId}`, {
-            headers: {
-                'Authorization': `Bearer ${apiKey}`
-            }
+        const response = await fetch('/api/generation-events', {
+            headers: { 'Authorization': `Bearer ${apiKey}` },
+            signal: controller.signal
         });
-        const data = await response.json();
-
-        if (data.error) {
-            throw new Error(data.error);
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.error || 'Could not follow generation status.');
         }
 
-        const completedTracks = data.results ? data.results.length : 0;
-        const progress = totalTracks > 0 ? (completedTracks / totalTracks) * 100 : 0;
-        
-        statusElement.textContent = `Status: ${data.status.title()} (${completedTracks}/${totalTracks} complete)`;
-        progressBar.style.width = `${progress}%`;
-
-        if (data.status === 'completed' && data.results) {
-            spinnerElement.style.display = 'none';
-            displayGeneratedAudio(data.results, cardElement);
-        } else if (data.status === 'failed') {
-            spinnerElement.style.display = 'none';
-            throw new Error(data.message || 'Generation failed.');
-        } else {
-            setTimeout(() => pollGenerationStatus(requestId, cardElement), 5000); // Poll every 5 seconds
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const messages = buffer.split('\n\n');
+            buffer = messages.pop(); // Keep any partial message for the next chunk
+            for (const message of messages) {
+                if (message.startsWith('data:')) {
+                    handleGenerationEvent(JSON.parse(message.substring(5)));
+                }
+            }
         }
-
     } catch (err) {
-        let errorMessage = err.message;
-        // Try to parse a more specific error from the response
-        try {
-            const errorJson = JSON.parse(err.message);
-            if (errorJson.detail) {
-                errorMessage = errorJson.detail;
-            }
-        } catch (e) {
-            // Not a JSON error, use the original message
+        if (err.name !== 'AbortError') {
+            console.warn(`Generation event stream interrupted: ${err.message}`);
         }
-        statusElement.textContent = `Error: ${errorMessage}`;
+    } finally {
+        generationStreams.delete(apiKey);
+        // Reconnect while cards are still waiting; the server replays the current state.
+        if (!controller.signal.aborted && pendingGenerations(apiKey)) {
+            setTimeout(() => connectGenerationEvents(apiKey), 3000);
+        }
+    }
+}
+
+function handleGenerationEvent(data) {
+    const entry = generationCards.get(data.request_id);
+    if (!entry) return;
+
+    updateGenerationCard(entry.card, data);
+    if (data.status === 'completed' || data.status === 'failed') {
+        generationCards.delete(data.request_id);
+        // Close the stream once nothing is left to follow for this key
+        if (!pendingGenerations(entry.apiKey) && generationStreams.has(entry.apiKey)) {
+            generationStreams.get(entry.apiKey).abort();
+        }
+    }
+}
+
+function updateGenerationCard(cardElement, data) {
+    const statusElement = cardElement.querySelector('.generation-status');
+    const spinnerElement = cardElement.querySelector('.spinner');
+    const progressBar = cardElement.querySelector('.generation-progress-bar');
+
+    const completedTracks = data.completed_tracks;
+    const totalTracks = data.total_tracks;
+    const progress = totalTracks > 0 ? (completedTracks / totalTracks) * 100 : 0;
+    const statusLabel = data.status.charAt(0).toUpperCase() + data.status.slice(1);
+
+    statusElement.textContent = `Status: ${statusLabel} (${completedTracks}/${totalTracks} complete)`;
+    progressBar.style.width = `${progress}%`;
+
+    if (data.status === 'completed' && data.results) {
+        spinnerElement.style.display = 'none';
+        displayGeneratedAudio(data.results, cardElement);
+    } else if (data.status === 'failed') {
+        statusElement.textContent = `Error: ${data.message || 'Generation failed.'}`;
         statusElement.classList.add('generation-error');
         spinnerElement.style.display = 'none';
     }
@@ -551,13 +614,16 @@ function displayGeneratedAudio(results, cardElement) {
         const trackElement = document.createElement('div');
         trackElement.className = 'audio-track';
 
-        const audio = new Audio(result.audio_url);
+        // Previews play from the server's audio cache, so replays never refetch the clip
+        const audio = new Audio(result.id
+            ? `/api/download-audio?url=${encodeURIComponent(result.audio_url)}&clip_id=${encodeURIComponent(result.id)}&inline=1`
+            : result.audio_url);
         audio.controls = true;
         
         const downloadBtn = document.createElement('button');
         downloadBtn.className = 'btn btn-secondary';
         downloadBtn.textContent = 'Download';
-        downloadBtn.onclick = () => downloadAudio(result.audio_url, result.title);
+        downloadBtn.onclick = () => downloadAudio(result.audio_url, result.title, result.id);
 
         trackElement.appendChild(audio);
         trackElement.appendChild(downloadBtn);
@@ -566,10 +632,12 @@ function displayGeneratedAudio(results, cardElement) {
     cardElement.appendChild(audioContainer);
 }
 
-async function downloadAudio(audioUrl, title) {
+async function downloadAudio(audioUrl, title, clipId) {
     try {
         const apiKey = document.getElementById('apiKey').value;
-        const response = await fetch(`/api/download-audio?url=${encodeURIComponent(audioUrl)}&title=${encodeURIComponent(title)}`, {
+        // With a clip ID the server answers from its audio cache instead of refetching the file
+        const clipParam = clipId ? `&clip_id=${encodeURIComponent(clipId)}` : '';
+        const response = await fetch(`/api/download-audio?url=${encodeURIComponent(audioUrl)}&title=${encodeURIComponent(title)}${clipParam}`, {
             headers: {
                 'Authorization': `Bearer ${apiKey}`
             }
@@ -696,7 +764,7 @@ async function _executeGeneration(promptName, payload) {
         }
 
         const generationIds = data.map(clip => clip.id).join(',');
-        pollGenerationStatus(generationIds, generationCard);
+        trackGeneration(generationIds, generationCard, apiKey);
 
        fetchCredits(); // Refresh credits after generation
 
@@ -846,7 +914,9 @@ document.addEventListener('DOMContentLoaded', () => {
     addAccountBtn.addEventListener('click', addAccount);
     populateGenres();
     fetchCredits(); // Initial fetch
-    setInterval(fetchCredits, 60000); // Refresh credits every 60 seconds
+    // Refresh credits every 60 seconds, but only while the tab is visible
+    setInterval(() => { if (!document.hidden) fetchCredits(); }, 60000);
+    document.addEventListener('visibilitychange', () => { if (!document.hidden) fetchCredits(); });
 
     // --- API Key Persistence ---
     const apiKeyInput = document.getElementById('apiKey');
@@ -915,28 +985,67 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Loads one page of a history into a container; "Load more" appends the next page
+    async function loadHistoryPage(url, container, renderItem, onSelect, cursor = null) {
+        const response = await fetch(cursor ? `${url}${url.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}` : url);
+        const page = await response.json();
+        if (!response.ok) throw new Error(page.error);
+
+        if (!cursor) container.innerHTML = '';
+        container.querySelector('.history-load-more')?.remove();
+        page.items.forEach(entry => {
+            const wrapper = document.createElement('div');
+            wrapper.innerHTML = renderItem(entry).trim();
+            const element = wrapper.firstChild;
+            element.addEventListener('click', () => onSelect(entry));
+            container.appendChild(element);
+        });
+
+        if (page.next_cursor) {
+            const moreBtn = document.createElement('button');
+            moreBtn.className = 'btn btn-secondary history-load-more';
+            moreBtn.textContent = 'Load more';
+            moreBtn.addEventListener('click', () => {
+                moreBtn.disabled = true;
+                loadHistoryPage(url, container, renderItem, onSelect, page.next_cursor)
+                    .catch(() => { moreBtn.disabled = false; });
+            });
+            container.appendChild(moreBtn);
+        }
+    }
+
+    // Free text matches lyrics and prompts; `genre:`, `mood:`, `key:` and `energy:` terms filter facets
+    function historySearchUrl(query) {
+        const params = new URLSearchParams();
+        const words = [];
+        query.trim().split(/\s+/).filter(Boolean).forEach(term => {
+            const match = term.match(/^(genre|mood|key|energy):(.+)$/i);
+            if (match) {
+                params.append(match[1].toLowerCase(), match[2]);
+            } else {
+                words.push(term);
+            }
+        });
+        if (words.length) params.set('q', words.join(' '));
+        return `/api/history/search?${params}`;
+    }
+
+    historySearchInput.addEventListener('keydown', (e) => {
+        if (e.key === 'Enter') loadHistory();
+    });
+
     async function loadHistory() {
+        const query = historySearchInput.value.trim();
         try {
-            const response = await fetch('/api/history');
-            const history = await response.json();
-            historyContainer.innerHTML = history.map(item => `
+            await loadHistoryPage(query ? historySearchUrl(query) : '/api/history', historyContainer, item => `
                 <div class="history-item" data-id="${item.id}">
                     <div class="history-item-date">${new Date(item.timestamp).toLocaleString()}</div>
                     <div class="history-item-genre">${item.analysis.genre}</div>
                 </div>
-            `).join('');
-
-            // Add event listeners to history items
-            document.querySelectorAll('.history-item').forEach(item => {
-                item.addEventListener('click', () => {
-                    const selected = history.find(h => h.id === item.dataset.id);
-                    if (selected) {
-                        displayResults(selected);
-                        historyPanel.classList.remove('open');
-                    }
-                });
+            `, selected => {
+                displayResults(selected);
+                historyPanel.classList.remove('open');
             });
-
         } catch (err) {
             historyContainer.innerHTML = '<p>Could not load history.</p>';
         }
@@ -944,32 +1053,21 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function loadGenerationHistory() {
         try {
-            const response = await fetch('/api/generation-history');
-            const history = await response.json();
-            generationHistoryContainer.innerHTML = history.map(item => `
+            await loadHistoryPage('/api/generation-history', generationHistoryContainer, item => `
                 <div class="history-item" data-id="${item.id}">
                     <div class="history-item-date">${new Date(item.timestamp).toLocaleString()}</div>
                     <div class="history-item-title">${item.title || 'Untitled'}</div>
                 </div>
-            `).join('');
-
-            // Add event listeners to history items
-            document.querySelectorAll('#generationHistoryContainer .history-item').forEach(item => {
-                item.addEventListener('click', () => {
-                    const selected = history.find(h => h.id === item.dataset.id);
-                    if (selected) {
-                        // We can't fully "load" a generation, but we can show it in the UI
-                        openTab({ currentTarget: document.querySelector('.tab-link[onclick*="sunoGenerations"]') }, 'sunoGenerations');
-                        const generationsContainer = document.getElementById('generationsContainer');
-                        const generationCard = document.createElement('div');
-                        generationCard.className = 'generation-card';
-                        displayGeneratedAudio([selected], generationCard);
-                        generationsContainer.prepend(generationCard);
-                        generationHistoryPanel.classList.remove('open');
-                    }
-                });
+            `, selected => {
+                // We can't fully "load" a generation, but we can show it in the UI
+                openTab({ currentTarget: document.querySelector('.tab-link[onclick*="sunoGenerations"]') }, 'sunoGenerations');
+                const generationsContainer = document.getElementById('generationsContainer');
+                const generationCard = document.createElement('div');
+                generationCard.className = 'generation-card';
+                displayGeneratedAudio([selected], generationCard);
+                generationsContainer.prepend(generationCard);
+                generationHistoryPanel.classList.remove('open');
             });
-
         } catch (err) {
             generationHistoryContainer.innerHTML = '<p>Could not load generation history.</p>';
         }
@@ -1,7 +1,14 @@
 import requests
+from requests.adapters import HTTPAdapter
 import config
 import logging
+import random
+import threading
 import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from metrics import SUNO_REQUEST_DURATION, SUNO_ERRORS, SUNO_RATE_LIMIT_WAIT, SUNO_CIRCUIT_REJECTIONS
+from rate_limiter import RateLimiterRegistry
 from typing import Optional, Dict, Any
 from pydantic import BaseModel, Field, ValidationError, NonNegativeInt
 
@@ -22,131 +29,265 @@ class APIParsingError(SunoError):
     """Raised when API response parsing fails."""
     pass
 
+class SunoRateLimitError(SunoError):
+    """Raised when the API keeps answering 429 or the local rate limit cannot be met in time."""
+    status_code = 429
+
+class SunoUnavailableError(SunoError):
+    """Raised without calling the API while the circuit breaker for the key is open."""
+    status_code = 503
+
+# Every request made with an API key, from any client instance, shares that key's
+# token bucket and circuit breaker.
+RATE_LIMITERS = RateLimiterRegistry(
+    rate=config.SUNO_RATE_LIMIT_PER_SECOND,
+    burst=config.SUNO_RATE_LIMIT_BURST,
+    failure_threshold=config.SUNO_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=config.SUNO_CIRCUIT_RESET_TIMEOUT,
+)
+
+# --- HTTP Transport ---
+
+def _retry_after(response) -> Optional[float]:
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _metric_endpoint(endpoint: str) -> str:
+    """Collapses generation ids in a path so metric labels stay bounded."""
+    prefix = "/api/v1/generate/"
+    if endpoint.startswith(prefix) and endpoint != f"{prefix}credit":
+        return f"{prefix}{{ids}}"
+    return endpoint
+
+def pooled_session(pool_maxsize: int = config.SUNO_HTTP_POOL_SIZE) -> requests.Session:
+    """A Session whose keep-alive connections are reused across calls; size the pool for concurrent polls and downloads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def open_audio_stream(session: requests.Session, audio_url: str, byte_range: Optional[str] = None,
+                      allow_redirects: bool = True) -> requests.Response:
+    """
+    Starts a streaming GET for an audio file, forwarding an HTTP Range header.
+    The body is not read; the caller iterates it and must close the response.
+    """
+    headers = {"Authorization": None, "Accept-Encoding": "identity"}  # Never send the API key; keep lengths exact
+    if byte_range:
+        headers["Range"] = byte_range
+    try:
+        return session.get(audio_url, headers=headers, stream=True, timeout=(10, 60), allow_redirects=allow_redirects)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to open audio stream: {e}")
+        raise SunoError(f"Failed to download audio from {audio_url}") from e
+
+# --- Payloads & Responses ---
+
+def build_generate_payload(prompt_data: Dict[str, Any], callback_url: Optional[str] = None) -> Dict[str, Any]:
+    """Builds the /api/v1/generate request body from the app's prompt data."""
+    is_custom = prompt_data.get('is_custom', False)
+    
+    payload = {
+        "model": "V5",
+        "make_instrumental": prompt_data.get('instrumental', False),
+    }
+
+    if is_custom:
+        payload["title"] = prompt_data.get('title', 'AI Music')
+        payload["tags"] = prompt_data.get('tags', '')
+        payload["prompt"] = prompt_data.get('prompt', '') # Full lyrics for custom mode
+    else:
+        payload["prompt"] = prompt_data.get('prompt', '') # Descriptive prompt for simple mode
+
+    logging.info(f"Generating music with payload: {payload}")
+    if callback_url:
+        payload["callback_url"] = callback_url  # Added after logging; the URL carries a secret token
+    return payload
+
+def summarize_tracks(response_data: Any) -> Dict[str, Any]:
+    """
+    Aggregates the tracks of one generation request into an overall status
+    ('processing', 'completed' or 'failed') plus the completed results.
+    """
+    final_results = {'status': 'processing', 'results': []}
+
+    # Handle cases where the API returns a single error object instead of a list
+    if not isinstance(response_data, list):
+        if isinstance(response_data, dict) and response_data.get('detail'):
+            logging.error(f"Suno API returned an error: {response_data['detail']}")
+            final_results['status'] = 'failed'
+            final_results['message'] = response_data['detail']
+            return final_results
+        # If it's not an error, wrap it in a list for consistent processing
+        response_data = [response_data]
+
+    statuses = [track.get('status') for track in response_data]
+
+    # 1. Check for failure: if any track has failed, the whole job is failed.
+    if any(s in ['error', 'failed', 'stalled'] for s in statuses):
+        final_results['status'] = 'failed'
+        failed_track = next((t for t in response_data if t.get('status') in ['error', 'failed', 'stalled']), None)
+        if failed_track:
+            final_results['message'] = failed_track.get('error_message', f"A track entered status: {failed_track.get('status')}")
+    
+    # 2. Check for completion: if all tracks are complete.
+    elif all(s == 'complete' for s in statuses):
+        final_results['status'] = 'completed'
+
+    # 3. Otherwise, it's still processing. The status is already 'processing'.
+
+    # Always populate results with any tracks that have completed so far.
+    for track in response_data:
+        if track.get('status') == 'complete':
+            final_results['results'].append({
+                'id': track.get('id'),
+                'audio_url': track.get('audio_url'),
+                'title': track.get('title'),
+                'is_instrumental': track.get('metadata', {}).get('make_instrumental', False),
+            })
+    
+    return final_results
+
+
 # --- Data Models ---
 
 class SunoClient:
     """A client for interacting with the official Suno API."""
 
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.sunoapi.org"):
+    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.sunoapi.org",
+                 pool_maxsize: int = config.SUNO_HTTP_POOL_SIZE):
         if not api_key:
             raise SunoAuthError("API key is required for authentication.")
         self.api_key = api_key
         self.base_url = base_url
-        self.session = requests.Session()
+        self.session = pooled_session(pool_maxsize)
         self.session.headers.update({
             "Authorization": f"Bearer {self.api_key}"
         })
+        self.limiter = RATE_LIMITERS.get(api_key)
+
+    def close(self):
+        """Closes the pooled connections of this client."""
+        self.session.close()
 
     def _request(self, method: str, endpoint: str, **kwargs) -> Any:
-        """Makes a request to the Suno API with exponential backoff."""
+        """
+        Makes a request to the Suno API through the key's shared rate limiter.
+        429s, 503s and network errors are retried with jittered exponential
+        backoff (honouring Retry-After), and the key's circuit breaker fails
+        fast while the API keeps erroring.
+        """
         url = f"{self.base_url}{endpoint}"
         max_retries = 5
         initial_delay = 1.0
         backoff_factor = 2.0
+        max_delay = 30.0
+        metric_endpoint = _metric_endpoint(endpoint)
+        breaker = self.limiter.breaker
 
         for attempt in range(max_retries):
+            # Full jitter keeps clients that failed together from retrying in lockstep
+            delay = random.uniform(0, min(max_delay, initial_delay * (backoff_factor ** attempt)))
+
+            if not breaker.allow():
+                SUNO_CIRCUIT_REJECTIONS.inc(endpoint=metric_endpoint)
+                raise SunoUnavailableError(
+                    f"Suno API is failing; not retrying for another {breaker.retry_in():.0f}s.")
             try:
-                response = self.session.request(method, url, timeout=60, **kwargs)
-                
+                waited = self.limiter.bucket.acquire(timeout=config.SUNO_RATE_LIMIT_MAX_WAIT)
+            except TimeoutError as e:
+                breaker.release_trial()  # Nothing was sent
+                raise SunoRateLimitError("Rate limit exceeded. Please try again later.") from e
+            SUNO_RATE_LIMIT_WAIT.observe(waited)
+
+            try:
+                start = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, timeout=60, **kwargs)
+                except requests.exceptions.RequestException:
+                    SUNO_ERRORS.inc(endpoint=metric_endpoint, status='network')
+                    raise
+                finally:
+                    SUNO_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, endpoint=metric_endpoint)
+                if response.status_code >= 400:
+                    SUNO_ERRORS.inc(endpoint=metric_endpoint, status=response.status_code)
+
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()  # Includes 429: the API is up, we are just too fast
+
                 if response.status_code == 200:
                     if 'application/json' in response.headers.get('Content-Type', ''):
                         return response.json()
                     return response.content
-                
-                elif response.status_code == 503:
-                    delay = initial_delay * (backoff_factor ** attempt)
-                    logging.warning(f"Attempt {attempt + 1}: Service unavailable (503). Retrying in {delay:.2f}s...")
-                    time.sleep(delay)
-                    continue
+
+                elif response.status_code in (429, 503):
+                    retry_after = _retry_after(response)
+                    if retry_after is not None:
+                        delay = retry_after + random.uniform(0, initial_delay)
+                    if response.status_code == 429:
+                        # Hold back every request for this key, not just this one
+                        self.limiter.bucket.pause(delay)
+                    if attempt + 1 < max_retries:
+                        logging.warning(f"Attempt {attempt + 1}: {endpoint} returned {response.status_code}. "
+                                        f"Retrying in {delay:.2f}s...")
+                        if response.status_code == 503:
+                            time.sleep(delay)
+                        continue
+                    if response.status_code == 429:
+                        raise SunoRateLimitError("Rate limit exceeded. Please try again later.")
 
                 response.raise_for_status() # Raise HTTPError for other bad responses (4xx or 5xx)
 
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 401:
                     raise SunoAuthError("Unauthorized access. Check your API key.") from e
-                if e.response.status_code == 429:
-                    raise SunoError("Rate limit exceeded. Please try again later.") from e
                 logging.error(f"HTTP Error Response: {e.response.text}")
                 raise SunoError(f"HTTP Error: {e.response.status_code} {e.response.reason}") from e
-            
+
             except requests.exceptions.RequestException as e:
-                delay = initial_delay * (backoff_factor ** attempt)
+                breaker.record_failure()
                 logging.warning(f"Network connection error on attempt {attempt + 1}. Retrying in {delay:.2f} seconds...")
                 time.sleep(delay)
                 continue
-        
+
         raise SunoError(f"Request failed after {max_retries} attempts.")
 
-    def generate_music(self, prompt_data: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_music(self, prompt_data: Dict[str, Any], callback_url: Optional[str] = None) -> Dict[str, Any]:
         """
-        Generates music using the Suno API v1.
+        Generates music using the Suno API v1. When `callback_url` is given, Suno
+        POSTs the clips there as they finish.
         """
         endpoint = "/api/v1/generate"
-        
-        is_custom = prompt_data.get('is_custom', False)
-        
-        payload = {
-            "model": "V5",
-            "make_instrumental": prompt_data.get('instrumental', False),
-        }
-
-        if is_custom:
-            payload["title"] = prompt_data.get('title', 'AI Music')
-            payload["tags"] = prompt_data.get('tags', '')
-            payload["prompt"] = prompt_data.get('prompt', '') # Full lyrics for custom mode
-        else:
-            payload["prompt"] = prompt_data.get('prompt', '') # Descriptive prompt for simple mode
-
-        logging.info(f"Generating music with payload: {payload}")
-        return self._request("POST", endpoint, json=payload)
+        return self._request("POST", endpoint, json=build_generate_payload(prompt_data, callback_url))
 
-    def check_generation_status(self, generation_ids: list[str]) -> Dict[str, Any]:
+    def fetch_generation_tracks(self, generation_ids: list[str]) -> Any:
         """
-        Checks the status of a music generation request using generation IDs.
+        Returns the raw track objects for one or more generation IDs in a single
+        request (or the API's error object, e.g. {'detail': ...}).
         """
         ids_param = ",".join(generation_ids)
         endpoint = f"/api/v1/generate/{ids_param}"
         logging.info(f"Checking generation status for IDs: {ids_param}")
-        response_data = self._request("GET", endpoint)
-
-        final_results = {'status': 'processing', 'results': []}
-
-        # Handle cases where the API returns a single error object instead of a list
-        if not isinstance(response_data, list):
-            if isinstance(response_data, dict) and response_data.get('detail'):
-                logging.error(f"Suno API returned an error: {response_data['detail']}")
-                final_results['status'] = 'failed'
-                final_results['message'] = response_data['detail']
-                return final_results
-            # If it's not an error, wrap it in a list for consistent processing
-            response_data = [response_data]
-
-        statuses = [track.get('status') for track in response_data]
+        return self._request("GET", endpoint)
 
-        # 1. Check for failure: if any track has failed, the whole job is failed.
-        if any(s in ['error', 'failed', 'stalled'] for s in statuses):
-            final_results['status'] = 'failed'
-            failed_track = next((t for t in response_data if t.get('status') in ['error', 'failed', 'stalled']), None)
-            if failed_track:
-                final_results['message'] = failed_track.get('error_message', f"A track entered status: {failed_track.get('status')}")
-        
-        # 2. Check for completion: if all tracks are complete.
-        elif all(s == 'complete' for s in statuses):
-            final_results['status'] = 'completed'
-
-        # 3. Otherwise, it's still processing. The status is already 'processing'.
-
-        # Always populate results with any tracks that have completed so far.
-        for track in response_data:
-            if track.get('status') == 'complete':
-                final_results['results'].append({
-                    'id': track.get('id'),
-                    'audio_url': track.get('audio_url'),
-                    'title': track.get('title'),
-                    'is_instrumental': track.get('metadata', {}).get('make_instrumental', False),
-                })
-        
-        return final_results
+    def check_generation_status(self, generation_ids: list[str]) -> Dict[str, Any]:
+        """
+        Checks the status of a music generation request using generation IDs.
+        """
+        return summarize_tracks(self.fetch_generation_tracks(generation_ids))
 
     def get_credits(self) -> Dict[str, Any]:
         """
@@ -164,9 +305,59 @@ class SunoClient:
         """Downloads audio content from a given URL."""
         logging.info(f"Downloading audio from: {audio_url}")
         try:
-            response = requests.get(audio_url, timeout=60)
+            # Reuse the pooled connections, but never send the API key to the audio host
+            response = self.session.get(audio_url, timeout=60, headers={"Authorization": None})
             response.raise_for_status()
             return response.content
         except requests.exceptions.RequestException as e:
             logging.error(f"Failed to download audio: {e}")
-            raise SunoError(f"Failed to download audio from {audio_url}") from e
\ No newline at end of file
+            raise SunoError(f"Failed to download audio from {audio_url}") from e
+
+
+class SunoClientPool:
+    """
+    Thread-safe pool of SunoClient instances keyed by API key and base URL, so
+    repeated calls (e.g. status polls every few seconds) reuse warm keep-alive
+    connections instead of a new session and TLS handshake per request.
+    Clients idle for longer than `idle_timeout` seconds are closed, and the
+    least recently used client is dropped when `max_clients` is exceeded.
+    """
+
+    def __init__(self, idle_timeout: float = config.SUNO_CLIENT_IDLE_TIMEOUT, max_clients: int = 64):
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self._clients = OrderedDict()  # (api_key, base_url) -> (client, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str, base_url: Optional[str] = None) -> SunoClient:
+        """Returns the pooled client for an API key, creating it on first use."""
+        base_url = base_url or config.SUNO_API_URL
+        key = (api_key, base_url)
+        now = time.monotonic()
+        with self._lock:
+            expired = self._evict_idle(now)
+            entry = self._clients.pop(key, None)
+            client = entry[0] if entry else SunoClient(api_key=api_key, base_url=base_url)
+            self._clients[key] = (client, now)
+            while len(self._clients) > self.max_clients:
+                _, (oldest, _) = self._clients.popitem(last=False)
+                expired.append(oldest)
+        for stale in expired:
+            stale.close()
+        return client
+
+    def discard(self, api_key: str):
+        """Closes and removes every pooled client for an API key (e.g. when its account is removed)."""
+        with self._lock:
+            keys = [key for key in self._clients if key[0] == api_key]
+            removed = [self._clients.pop(key)[0] for key in keys]
+        for client in removed:
+            client.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+    def _evict_idle(self, now):
+        expired = [key for key, (_, last_used) in self._clients.items() if now - last_used > self.idle_timeout]
+        return [self._clients.pop(key)[0] for key in expired]